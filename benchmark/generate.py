@@ -0,0 +1,249 @@
+"""
+Copyright (C) 2018 IAIK TU Graz (data@iaik.tugraz.at)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+@version 1.2
+
+"""
+
+import os
+import sys
+import gzip
+import pickle
+import random
+import argparse
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from datastub.DataFS import DataFS
+from datastub.IpInfoShort import IpInfoShort, IP_INFO_FILE
+from datastub.leaks import CallHistory, Context, DataLeak, CFLeak, DataLeakEntry, NSLeak, NSPType, EvidenceEntry, \
+    EvidenceSource
+
+from datagui.package.asmindex import AsmIndex, ASM_INDEX_SUFFIX
+
+FUNCTION_SIZE = 0x100
+INSTRUCTION_SIZE = 4
+# pickle.dump recurses for each level of the call hierarchy, deep chains need a larger stack
+PICKLE_STACK_SIZE = 1 << 30
+PICKLE_RECURSION_LIMIT = 1000000
+
+
+class Image:
+    """A fake binary with its symbols, objdump and source file."""
+
+    def __init__(self, index, functions):
+        self.dynamic = index > 0
+        if self.dynamic:
+            self.name = "/bench/lib/lib{}.so".format(index)
+            self.lower = 0x7f0000000000 + index * 0x10000000
+            self.src_path = "/bench/src/lib{}.c".format(index)
+        else:
+            self.name = "/bench/bin/app"
+            self.lower = 0x400000
+            self.src_path = "/bench/src/app.c"
+        self.upper = self.lower + 0x1000 + functions * FUNCTION_SIZE
+        self.functions = [self.lower + 0x1000 + i * FUNCTION_SIZE for i in range(functions)]
+        self.asm_path = self.name + ".asm"
+
+    def getLocalIp(self, ip):
+        return ip - self.lower if self.dynamic else ip
+
+    def instructions(self, function):
+        return range(function, function + FUNCTION_SIZE, INSTRUCTION_SIZE)
+
+
+def createIpInfo(image, ip_info):
+    """Create objdump and source file of image and fill ip_info with the line of each instruction."""
+
+    asm_lines = ["", "{}:     file format elf64-x86-64".format(image.name), "", "Disassembly of section .text:", ""]
+    src_lines = []
+    for i, function in enumerate(image.functions):
+        asm_lines.append("{:016x} <func{}>:".format(image.getLocalIp(function), i))
+        src_lines.append("int func{}(void) {{".format(i))
+        for ip in image.instructions(function):
+            src_lines.append("    x = {};".format(ip - function))
+            ip_info[ip] = IpInfoShort(image.asm_path, len(asm_lines), image.src_path, len(src_lines))
+            asm_lines.append("  {:x}:\t90 90 90 90          \tnop".format(image.getLocalIp(ip)))
+        src_lines.append("}")
+        asm_lines.append("")
+    return asm_lines, src_lines
+
+
+def createSymbols(images):
+    lines = []
+    for image in images:
+        lines += ["Image:", image.name, "dynamic" if image.dynamic else "static",
+                  "{:x}:{:x}".format(image.lower, image.upper)]
+        for i, function in enumerate(image.functions):
+            lines.append("{:x}:{:x}:func{}:t".format(function, FUNCTION_SIZE, i))
+    return "\n".join(lines) + "\n"
+
+
+def createLeak(rnd, ip, evidence):
+    # The kind of leak must not depend on the context, the GUI looks up leaks of the same ip in all contexts
+    leak = DataLeak(ip) if (ip // INSTRUCTION_SIZE) % 2 == 0 else CFLeak(ip)
+    if isinstance(leak, DataLeak):
+        for _ in range(max(evidence // 4, 1)):
+            leak.append(DataLeakEntry(rnd.randrange(1 << 32)))
+    if rnd.random() < 0.3:
+        leak.status.nsperformed = True
+        leak.status.nsleak.add(NSLeak(NSPType.Type1a, ip, rnd.random(), 0.5, 0.99, True))
+    if evidence > 0:
+        leak.add_evidence(EvidenceEntry([rnd.randrange(1 << 32) for _ in range(evidence)], 0, EvidenceSource.Generic))
+    return leak
+
+
+def createCallHierarchy(rnd, images, depth, fanout, leaks, evidence):
+    """Create a call hierarchy with up to fanout children per node and leaks leaks per node.
+
+    Returns:
+        A tuple (root, number of nodes).
+    """
+
+    functions = [function for image in images for function in image.functions]
+    root = CallHistory()
+    top = Context(0, images[0].functions[0])
+    main = CallHistory(top, root)
+    root.children[top] = main
+    count = 2
+    stack = [(main, depth)]
+    while stack:
+        node, level = stack.pop()
+        if level == 0:
+            continue
+        for _ in range(fanout):
+            callee = rnd.choice(functions)
+            caller = node.ctxt.callee + INSTRUCTION_SIZE * rnd.randrange(FUNCTION_SIZE // INSTRUCTION_SIZE)
+            ctxt = Context(caller, callee)
+            if ctxt in node.children:
+                continue
+            child = CallHistory(ctxt, node)
+            node.children[ctxt] = child
+            count += 1
+            for _ in range(leaks):
+                ip = callee + INSTRUCTION_SIZE * rnd.randrange(FUNCTION_SIZE // INSTRUCTION_SIZE)
+                child.consume_leak(createLeak(rnd, ip, evidence))
+            stack.append((child, level - 1))
+    return root, count
+
+
+def dumpPickle(obj, path):
+    """Write obj as gzip pickle to path in a thread with a large stack."""
+
+    errors = []
+
+    def dump():
+        try:
+            with gzip.GzipFile(path, 'wb') as f:
+                pickle.dump(obj, f)
+        except Exception as e:
+            errors.append(e)
+
+    recursion_limit = sys.getrecursionlimit()
+    stack_size = threading.stack_size(PICKLE_STACK_SIZE)
+    sys.setrecursionlimit(max(recursion_limit, PICKLE_RECURSION_LIMIT))
+    try:
+        thread = threading.Thread(target=dump)
+        thread.start()
+        thread.join()
+    finally:
+        threading.stack_size(stack_size)
+        sys.setrecursionlimit(recursion_limit)
+    if errors:
+        raise errors[0]
+
+
+def generate(out_dir, depth=4, fanout=3, leaks=3, evidence=8, functions=50, libraries=1, seed=1, asm_index=True):
+    """Write result.pickle and framework.zip of a synthetic analysis run to out_dir.
+
+    Args:
+        out_dir: Output directory, created if missing.
+        depth: Depth of the call hierarchy below main.
+        fanout: Maximum number of callees of each call hierarchy node.
+        leaks: Number of leaks reported in each call hierarchy node.
+        evidence: Number of evidence values (and data leak entries) of each leak.
+        functions: Number of functions per binary.
+        libraries: Number of dynamic libraries in addition to the main binary.
+        seed: Random seed; the same arguments always create the same files.
+        asm_index: Store an AsmIndex for each objdump in framework.zip.
+
+    Returns:
+        A tuple (pickle path, zip path, number of call hierarchy nodes).
+    """
+
+    rnd = random.Random(seed)
+    out_dir = os.path.abspath(out_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    images = [Image(i, functions) for i in range(libraries + 1)]
+
+    zip_path = os.path.join(out_dir, "framework.zip")
+    pickle_path = os.path.join(out_dir, "result.pickle")
+    for path in os.listdir(out_dir):
+        if path.startswith("framework.zip") or path.startswith("result."):
+            os.remove(os.path.join(out_dir, path))
+
+    ip_info = {}
+    datafs = DataFS(zip_path, write=True)
+    for image in images:
+        asm_lines, src_lines = createIpInfo(image, ip_info)
+        with datafs.create_file(image.asm_path) as f:
+            f.write("\n".join(asm_lines).encode('utf-8'))
+        if asm_index:
+            with datafs.create_file(image.asm_path + ASM_INDEX_SUFFIX) as f:
+                f.write(AsmIndex.parse(asm_lines).toBytes())
+        with datafs.create_file(image.src_path) as f:
+            f.write("\n".join(src_lines).encode('utf-8'))
+    with datafs.create_file(IP_INFO_FILE) as f:
+        pickle.dump(ip_info, f)
+    with datafs.create_file("allsyms.txt") as f:
+        f.write(createSymbols(images).encode('utf-8'))
+    datafs.close()
+
+    call_hierarchy, count = createCallHierarchy(rnd, images, depth, fanout, leaks, evidence)
+    dumpPickle(call_hierarchy, pickle_path)
+    return pickle_path, zip_path, count
+
+
+def addArguments(parser):
+    parser.add_argument("--depth", type=int, default=4, help="depth of the call hierarchy")
+    parser.add_argument("--fanout", type=int, default=3, help="callees per call hierarchy node")
+    parser.add_argument("--leaks", type=int, default=3, help="leaks per call hierarchy node")
+    parser.add_argument("--evidence", type=int, default=8, help="evidence values per leak")
+    parser.add_argument("--functions", type=int, default=50, help="functions per binary")
+    parser.add_argument("--libraries", type=int, default=1, help="number of dynamic libraries")
+    parser.add_argument("--seed", type=int, default=1, help="random seed")
+    parser.add_argument("--no-asm-index", dest="asm_index", action="store_false",
+                        help="create a framework.zip without asm indexes")
+
+
+def generateFromArguments(out_dir, args):
+    return generate(out_dir, args.depth, args.fanout, args.leaks, args.evidence, args.functions, args.libraries,
+                    args.seed, args.asm_index)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic DATA result for benchmarking the GUI.")
+    parser.add_argument("out_dir", help="output directory for result.pickle and framework.zip")
+    addArguments(parser)
+    args = parser.parse_args()
+    pickle_path, zip_path, count = generateFromArguments(args.out_dir, args)
+    print("Generated {} call hierarchy nodes".format(count))
+    print("  {}\n  {}".format(pickle_path, zip_path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,478 @@
+"""
+Copyright (C) 2018 IAIK TU Graz (data@iaik.tugraz.at)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+@version 1.2
+
+"""
+
+import gc
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import tracemalloc
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from PyQt5.QtCore import Qt, QModelIndex
+from PyQt5.QtGui import QStandardItem
+from PyQt5.QtWidgets import QApplication
+
+from datagui.package import utils
+from datagui.package.autosave import getAutosavePath, loadAutosave
+from datagui.package.cache import getCachePath
+from datagui.package.symbols import getSymbolCachePath
+from datagui.package.loader import ResultLoader, flatten
+from datagui.package.model.CallHierarchyModel import CallHierarchyItem
+from datagui.package.model.LeakModel import LeakItem
+from datagui.package.utils import LeakFlags
+
+import generate
+
+# Roles requested by the call view for each visible cell
+VIEW_ROLES = (Qt.DisplayRole, Qt.DecorationRole, Qt.ToolTipRole, Qt.ForegroundRole, Qt.TextAlignmentRole)
+
+
+class LegacyTreeItem(QStandardItem):
+    """Layout of the tree items while they were QStandardItems, for comparison."""
+
+    def __init__(self, name, obj=None, parent=None):
+        super(LegacyTreeItem, self).__init__()
+        self.parent_item = parent
+        self.name = name
+        self.obj = obj
+        self.child_items = []
+        self.row_nr = 0
+        self.id = 0
+        self.fetched = False
+
+    def appendChild(self, item):
+        item.row_nr = len(self.child_items)
+        self.child_items.append(item)
+
+
+class LegacyLeakItem(QStandardItem):
+    def __init__(self, name, leak=None, parent=None):
+        super(LegacyLeakItem, self).__init__()
+        self.name = name
+        self.leak = leak
+        self.parent_item = parent
+        self.high_prio_flag = -1
+
+
+class Context:
+    """State shared by all benchmarks of one run."""
+
+    def __init__(self, app, pickle_path, zip_path, repeat):
+        self.app = app
+        self.pickle_path = pickle_path
+        self.zip_path = zip_path
+        self.repeat = repeat
+        self.window = None
+
+
+def abort(msg):
+    print(msg)
+    os._exit(1)
+
+
+def removeCaches(ctx):
+    for path in (getCachePath(ctx.pickle_path), getSymbolCachePath(ctx.zip_path)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def loadSynchronously(ctx):
+    """Run the loader in the calling thread and return its result."""
+
+    loader = ResultLoader(ctx.pickle_path, ctx.zip_path)
+    results = []
+    loader.loaded.connect(results.append, Qt.DirectConnection)
+    loader.failed.connect(lambda code, msg: results.append(RuntimeError(msg)), Qt.DirectConnection)
+    loader.run()
+    if not results or isinstance(results[0], Exception):
+        raise RuntimeError("Loading failed: {}".format(results[0] if results else "canceled"))
+    return results[0]
+
+
+def openWindow(ctx):
+    """Open the files in the main window and wait until all views are built."""
+
+    if ctx.window is None:
+        from datagui.package.ui.MainWindow import MainWindow
+        sys.argv = [sys.argv[0], ctx.pickle_path, ctx.zip_path]
+        ctx.window = MainWindow()
+        # Fail instead of waiting for the assert dialog
+        utils.register_assert_handler(abort)
+    else:
+        ctx.window.unsaved_changes = False
+        ctx.window.loadFiles(ctx.pickle_path, ctx.zip_path)
+    while ctx.window.loader is not None:
+        ctx.app.processEvents()
+        time.sleep(0.001)
+    ctx.app.processEvents()
+    if ctx.window.call_hierarchy is None:
+        raise RuntimeError("Opening {} failed".format(ctx.pickle_path))
+    return ctx.window
+
+
+def getResidentMemory():
+    """Resident set size of this process in bytes, or None if it is unknown."""
+
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def measureMemory(create):
+    """Memory of the objects returned by create.
+
+    tracemalloc only sees allocations of the Python interpreter, the
+    resident set size also covers memory allocated by Qt.
+
+    Returns:
+        A tuple (traced bytes, resident bytes or None).
+    """
+
+    gc.collect()
+    rss = getResidentMemory()
+    tracemalloc.start()
+    objs = create()
+    traced = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    if rss is not None:
+        rss = getResidentMemory() - rss
+    del objs
+    gc.collect()
+    return traced, rss
+
+
+def iterIndexes(model, parent=QModelIndex()):
+    """Iterate over all indexes of column 0 of a tree model."""
+
+    stack = [parent]
+    while stack:
+        parent = stack.pop()
+        for row in range(model.rowCount(parent)):
+            index = model.index(row, 0, parent)
+            yield index
+            stack.append(index)
+
+
+# # # # # # # #
+# BENCHMARKS  #
+# # # # # # # #
+# Each benchmark returns a dict of measurements.
+
+
+def benchLoadCold(ctx):
+    """Loader without any sidecar caches."""
+
+    removeCaches(ctx)
+    start = time.perf_counter()
+    loadSynchronously(ctx)
+    return {'wall_s': time.perf_counter() - start}
+
+
+def benchOpenCold(ctx):
+    """Loading and building all views, without any sidecar caches."""
+
+    removeCaches(ctx)
+    start = time.perf_counter()
+    openWindow(ctx)
+    return {'wall_s': time.perf_counter() - start}
+
+
+def benchLoadWarm(ctx):
+    """Loader with the sidecar caches of the previous run."""
+
+    start = time.perf_counter()
+    loadSynchronously(ctx)
+    return {'wall_s': time.perf_counter() - start}
+
+
+def benchOpenWarm(ctx):
+    """Loading and building all views with the sidecar caches of the previous run."""
+
+    start = time.perf_counter()
+    openWindow(ctx)
+    return {'wall_s': time.perf_counter() - start}
+
+
+def benchModelData(ctx):
+    """CallHierarchyModel.data for all cells and roles the call view requests."""
+
+    model = openWindow(ctx).call_model
+    indexes = list(iterIndexes(model))
+    columns = model.columnCount(QModelIndex())
+    calls = 0
+    start = time.perf_counter()
+    for index in indexes:
+        for column in range(columns):
+            cell = index.sibling(index.row(), column)
+            for role in VIEW_ROLES:
+                model.data(cell, role)
+                calls += 1
+    wall = time.perf_counter() - start
+    return {'wall_s': wall, 'calls': calls, 'calls_per_s': calls / wall if wall else 0.0}
+
+
+def benchFilterToggle(ctx):
+    """Toggling each flag filter off and on again with a call item selected."""
+
+    window = openWindow(ctx)
+    index = window.call_model.index(0, 0, window.call_model.index(0, 0, QModelIndex()))
+    window.call_view.setCurrentIndex(index)
+    window.callClicked(index)
+    buttons = (window.btn_filter_0, window.btn_filter_1, window.btn_filter_2, window.btn_filter_3)
+    toggles = 0
+    start = time.perf_counter()
+    for button in buttons:
+        for _ in range(2):
+            button.setChecked(not button.isChecked())
+            window.updateFilter()
+            toggles += 1
+    ctx.app.processEvents()
+    wall = time.perf_counter() - start
+    return {'wall_s': wall, 'toggles': toggles, 'per_toggle_s': wall / toggles}
+
+
+def benchMarkAll(ctx):
+    """Marking all leaks below the topmost call item and below the topmost library item."""
+
+    window = openWindow(ctx)
+    leaks = sum(len(node.dataleaks) + len(node.cfleaks) for node in window.call_model.iterNodes())
+    flags = (LeakFlags.LEAK, LeakFlags.NOLEAK)
+    results = {'leaks': leaks}
+    views = (
+        ("call", window.call_view, window.call_model, True),
+        ("lib", window.lib_view, window.lib_model, False),
+    )
+    total = time.perf_counter()
+    for name, view, model, call_view in views:
+        view.setCurrentIndex(model.index(0, 0, QModelIndex()))
+        start = time.perf_counter()
+        for flag in flags:
+            window.markAll(flag, None, call_view)
+        ctx.app.processEvents()
+        results['per_' + name + '_s'] = (time.perf_counter() - start) / len(flags)
+    results['wall_s'] = time.perf_counter() - total
+    window.unsaved_changes = False
+    return results
+
+
+def benchWalks(ctx):
+    """Walks over the whole call hierarchy: flattening, subtree summaries, node iteration and collapsing."""
+
+    window = openWindow(ctx)
+    model = window.call_model
+    results = {}
+    start = time.perf_counter()
+    walks = (
+        ("flatten", lambda: flatten(window.call_hierarchy)),
+        ("summaries", lambda: model.computeSubtreeSummaries(model.root_item.obj, refresh=True)),
+        ("nodes", lambda: sum(1 for _ in model.iterNodes())),
+        ("collapse", window.collapseCallHierarchy),
+    )
+    for name, walk in walks:
+        walk_start = time.perf_counter()
+        walk()
+        results[name + '_s'] = time.perf_counter() - walk_start
+    results['wall_s'] = time.perf_counter() - start
+    results['nodes'] = sum(1 for _ in model.iterNodes())
+    return results
+
+
+def benchSave(ctx):
+    """Saving a changed leak to the journal, replaying the journal and compacting it into the pickle.
+
+    Works on a copy of the pickle, such that the other benchmarks are not affected.
+    """
+
+    tmp_dir = tempfile.mkdtemp(prefix="datagui-save-")
+    try:
+        save_ctx = Context(ctx.app, os.path.join(tmp_dir, os.path.basename(ctx.pickle_path)), ctx.zip_path, 1)
+        shutil.copyfile(ctx.pickle_path, save_ctx.pickle_path)
+        save_ctx.window = ctx.window
+        window = ctx.window = openWindow(save_ctx)
+        leak = next(leaks[k] for node in window.call_model.iterNodes() for leaks in (node.dataleaks, node.cfleaks)
+                    for k in leaks)
+        leak.meta.flag = LeakFlags.LEAK
+        leak.meta.comment = "benchmark"
+        results = {}
+        total = time.perf_counter()
+        start = time.perf_counter()
+        window.saveExistingCallHierarchy()
+        results['journal_s'] = time.perf_counter() - start
+        start = time.perf_counter()
+        window.journal.replay(window.call_model.annotations)
+        results['replay_s'] = time.perf_counter() - start
+        start = time.perf_counter()
+        window.compactCallHierarchy()
+        # Deep call hierarchies exceed the recursion limit of pickle, the journal is kept then
+        results['compact_s'] = time.perf_counter() - start if not os.path.exists(window.journal.path) else float('nan')
+        results['wall_s'] = time.perf_counter() - total
+    finally:
+        shutil.rmtree(tmp_dir)
+    return results
+
+
+def benchAutosave(ctx):
+    """Autosaving all leaks after marking them, the time the GUI thread is blocked and restoring the autosave.
+
+    Works on a copy of the pickle, such that the other benchmarks are not affected.
+    """
+
+    tmp_dir = tempfile.mkdtemp(prefix="datagui-autosave-")
+    try:
+        autosave_ctx = Context(ctx.app, os.path.join(tmp_dir, os.path.basename(ctx.pickle_path)), ctx.zip_path, 1)
+        shutil.copyfile(ctx.pickle_path, autosave_ctx.pickle_path)
+        autosave_ctx.window = ctx.window
+        window = ctx.window = openWindow(autosave_ctx)
+        window.call_view.setCurrentIndex(window.call_model.index(0, 0, QModelIndex()))
+        window.markAll(LeakFlags.LEAK, "benchmark", True)
+        ctx.app.processEvents()
+        results = {'changes': len(window.call_model.annotations.changes)}
+        total = time.perf_counter()
+        start = time.perf_counter()
+        window.autosave()
+        results['snapshot_s'] = time.perf_counter() - start
+        # Longest time the event loop is blocked while the autosave is written
+        stall = 0.0
+        while window.autosave_writer is not None:
+            start = time.perf_counter()
+            ctx.app.processEvents()
+            stall = max(stall, time.perf_counter() - start)
+            time.sleep(0.001)
+        results['write_s'] = time.perf_counter() - total
+        results['max_stall_s'] = stall
+        start = time.perf_counter()
+        loadAutosave(getAutosavePath(autosave_ctx.pickle_path), window.journal.pickle_digest, window.journal.end or 0,
+                     window.call_model.annotations)
+        results['restore_s'] = time.perf_counter() - start
+        results['wall_s'] = time.perf_counter() - total
+        window.discardAutosave()
+        window.unsaved_changes = False
+    finally:
+        shutil.rmtree(tmp_dir)
+    return results
+
+
+def benchItemMemory(ctx):
+    """Memory of one tree item per call hierarchy node and one leak item per leak, compared to QStandardItems."""
+
+    window = openWindow(ctx)
+    nodes = list(window.call_model.iterNodes())
+    leaks = [leak for node in nodes for leak in list(node.dataleaks) + list(node.cfleaks)]
+
+    def createTree(item_class):
+        items = {}
+        for node in nodes:
+            parent = items.get(id(node.parent))
+            item = item_class("", node, parent)
+            if parent is not None:
+                parent.appendChild(item)
+            items[id(node)] = item
+        return items
+
+    def createLeaks(item_class):
+        return [item_class("", leak) for leak in leaks]
+
+    results = {'items': len(nodes) + len(leaks)}
+    start = time.perf_counter()
+    # The legacy classes come last, so they cannot profit from memory freed by the other ones
+    for name, tree_class, leak_class in (("slots", CallHierarchyItem, LeakItem),
+                                         ("legacy", LegacyTreeItem, LegacyLeakItem)):
+        traced, rss = measureMemory(lambda: (createTree(tree_class), createLeaks(leak_class)))
+        results[name + '_bytes_per_item'] = traced / results['items']
+        if rss is not None:
+            results[name + '_rss_per_item'] = rss / results['items']
+    results['wall_s'] = time.perf_counter() - start
+    return results
+
+
+BENCHMARKS = [
+    ("load_cold", benchLoadCold),
+    ("load_warm", benchLoadWarm),
+    ("open_cold", benchOpenCold),
+    ("open_warm", benchOpenWarm),
+    ("model_data", benchModelData),
+    ("filter_toggle", benchFilterToggle),
+    ("mark_all", benchMarkAll),
+    ("walks", benchWalks),
+    ("save", benchSave),
+    ("autosave", benchAutosave),
+    ("item_memory", benchItemMemory),
+]
+
+
+def runBenchmarks(ctx, names):
+    results = {}
+    for name, bench in BENCHMARKS:
+        if names and name not in names:
+            continue
+        runs = [bench(ctx) for _ in range(ctx.repeat)]
+        best = min(runs, key=lambda run: run['wall_s'])
+        results[name] = best
+        details = ", ".join("{}={:.4g}".format(k, v) for k, v in sorted(best.items()) if k != 'wall_s')
+        print("{:<16} {:>10.4f} s  {}".format(name, best['wall_s'], details))
+        sys.stdout.flush()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless benchmarks of the GUI data paths.")
+    parser.add_argument("--data", help="directory to generate the synthetic result into (default: temporary)")
+    parser.add_argument("--pickle", help="benchmark an existing result pickle instead of a synthetic one")
+    parser.add_argument("--zip", help="framework.zip belonging to --pickle")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per benchmark, the fastest run is reported")
+    parser.add_argument("--only", default="", help="comma separated list of benchmarks to run")
+    parser.add_argument("--json", help="write the results to this file")
+    generate.addArguments(parser)
+    args = parser.parse_args()
+
+    app = QApplication([sys.argv[0]])
+    utils.register_assert_handler(abort)
+    # Autosaves are measured explicitly
+    utils.autosave_interval = 0
+
+    if args.pickle:
+        if not args.zip:
+            parser.error("--pickle requires --zip")
+        pickle_path, zip_path = args.pickle, args.zip
+    else:
+        out_dir = args.data or tempfile.mkdtemp(prefix="datagui-bench-")
+        start = time.perf_counter()
+        pickle_path, zip_path, count = generate.generateFromArguments(out_dir, args)
+        print("Generated {} call hierarchy nodes in {:.2f} s ({})".format(count, time.perf_counter() - start,
+                                                                          out_dir))
+
+    ctx = Context(app, pickle_path, zip_path, args.repeat)
+    results = runBenchmarks(ctx, [name for name in args.only.split(",") if name])
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'pickle': pickle_path, 'zip': zip_path, 'arguments': vars(args), 'results': results}, f,
+                      indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -18,12 +18,84 @@ along with this program. If not, see <https://www.gnu.org/licenses/>.
 
 """
 
+import argparse
 import sys
 from PyQt5.QtWidgets import QApplication
+from datagui.package import utils
 from datagui.package.ui.MainWindow import MainWindow
+from datagui.package.asmindex import addAsmIndexes
+from datagui.package.snapshot import convertPickle
+from datagui.package.profiler import profiler, enableFromEnvironment, DEFAULT_PROFILE_PATH
+
+
+def parseCount(value):
+    """Parse a non-negative integer argument."""
+
+    try:
+        number = int(value)
+    except ValueError:
+        number = -1
+    if number < 0:
+        raise argparse.ArgumentTypeError("invalid value: '{}'".format(value))
+    return number
+
+
+def parseExpandDepth(value):
+    return utils.EXPAND_LEAKS if value == "leaks" else parseCount(value)
+
+
+def parseArguments(argv):
+    """Parse the command line, exits with a usage message on invalid arguments."""
+
+    parser = argparse.ArgumentParser(prog="datagui", description="Analyze the leaks found by DATA.")
+    parser.add_argument("pickle", nargs="?", help="result .pickle or .snapshot to open")
+    parser.add_argument("zip", nargs="?", help="framework.zip belonging to the pickle")
+    parser.add_argument("--index", metavar="ZIP", help="add the asm indexes to a framework.zip and exit")
+    parser.add_argument("--convert", nargs="+", metavar="PATH",
+                        help="convert a pickle into a snapshot (PICKLE [SNAPSHOT]) and exit")
+    parser.add_argument("--profile", metavar="REPORT",
+                        help="profile the GUI and write the report on exit (default: {})".format(DEFAULT_PROFILE_PATH))
+    parser.add_argument("--profile-memory", action="store_true", help="also trace the peak memory when profiling")
+    parser.add_argument("--expand", type=parseExpandDepth, metavar="DEPTH|leaks",
+                        help="levels of the call hierarchy expanded on startup, or all paths leading to leaks")
+    parser.add_argument("--autosave", type=parseCount, metavar="SECONDS",
+                        help="interval of autosaving unsaved changes, 0 disables it")
+    # A bare --profile must not take the pickle as its report path
+    args = parser.parse_args(["--profile=" + DEFAULT_PROFILE_PATH if arg == "--profile" else arg for arg in argv])
+
+    if args.convert is not None and len(args.convert) > 2:
+        parser.error("--convert expects PICKLE [SNAPSHOT]")
+    if (args.index is not None or args.convert is not None) and args.pickle is not None:
+        parser.error("--index and --convert do not open a pickle")
+    if args.pickle is not None and args.zip is None:
+        parser.error("the pickle needs its framework.zip")
+    return args
 
 
 def main():
+    args = parseArguments(sys.argv[1:])
+
+    if args.index is not None:
+        count = addAsmIndexes(args.index)
+        print("Added {} asm index(es) to {}".format(count, args.index))
+        sys.exit(0)
+
+    if args.convert is not None:
+        snapshot_path = convertPickle(*args.convert)
+        print("Converted {} to {}".format(args.convert[0], snapshot_path))
+        sys.exit(0)
+
+    if args.profile is not None or args.profile_memory:
+        profiler.enable(args.profile or DEFAULT_PROFILE_PATH, args.profile_memory)
+    else:
+        enableFromEnvironment()
+    if args.expand is not None:
+        utils.expand_depth = args.expand
+    if args.autosave is not None:
+        utils.autosave_interval = args.autosave
+
+    # MainWindow opens the files given as its arguments
+    sys.argv = sys.argv[:1] + ([args.pickle, args.zip] if args.pickle is not None else [])
     app = QApplication(sys.argv)
     MainWindow()
     sys.exit(app.exec_())
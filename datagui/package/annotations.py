@@ -0,0 +1,164 @@
+"""
+Copyright (C) 2018 IAIK TU Graz (data@iaik.tugraz.at)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+@version 1.2
+
+"""
+
+import time
+from array import array
+from datastub.leaks import DataLeak
+
+from datagui.package.utils import LeakFlags, LeakMetaInfo
+
+
+class AnnotationStore:
+    """Flags and comments of all leak occurrences, stored in columns.
+
+    Each leak in each call context gets a dense slot. The flag column is a
+    bytearray of flag - LeakFlags.NONE. Comments are only stored for slots
+    with a non-empty comment. LeakMetaInfo objects added to the store read
+    and write their slot, so leak.meta keeps working as before.
+
+    Changed slots are remembered until they are written, see Journal.append.
+    """
+
+    def __init__(self):
+        self.flags = bytearray()
+        self.comments = {}  # comments[slot] -> comment, if not empty
+        self.ips = array('Q')  # Leak of each slot, see isLeak
+        self.dataleak = bytearray()
+        self.changes = {}  # changes[slot] -> time of the last change not written yet, see takeChanges
+        self.node_ranges = {}  # node_ranges[id(CallHistory)] -> (first slot, first cf leak slot, end)
+        self.occurrences = {}  # occurrences[getLeakKey(leak)] -> list of (CallHistory, slot), see getOccurrences
+
+    # # # # # # # # #
+    # MY FUNCTIONS  #
+    # # # # # # # # #
+
+    def addMeta(self, meta):
+        """Move the values of meta into a new slot and bind meta to it.
+
+        Returns:
+            The slot of meta.
+        """
+        assert isinstance(meta, LeakMetaInfo)
+        if meta.store is self:
+            return meta.slot
+        flag, comment = meta.flag, meta.comment
+        slot = len(self.flags)
+        self.flags.append(flag - LeakFlags.NONE)
+        if comment:
+            self.comments[slot] = comment
+        meta.store = self
+        meta.slot = slot
+        return slot
+
+    def addNode(self, call_hierarchy):
+        """Add the leaks of a CallHistory node to consecutive slots, data leaks first.
+
+        Leaks without meta information get a new LeakMetaInfo.
+        """
+        start = len(self.flags)
+        mid = start
+        for leaks in (call_hierarchy.dataleaks, call_hierarchy.cfleaks):
+            for k in leaks:
+                leak = leaks[k]
+                if leak.meta is None:
+                    leak.meta = LeakMetaInfo()
+                slot = self.addMeta(leak.meta)
+                self.ips.append(leak.ip)
+                self.dataleak.append(leaks is call_hierarchy.dataleaks)
+                self.occurrences.setdefault(self.getLeakKey(leak), []).append((call_hierarchy, slot))
+            if leaks is call_hierarchy.dataleaks:
+                mid = len(self.flags)
+        self.node_ranges[id(call_hierarchy)] = (start, mid, len(self.flags))
+
+    def getNodeRange(self, call_hierarchy):
+        """Get the slots of a node as tuple (first slot, first cf leak slot, end), or None if it was not added."""
+        return self.node_ranges.get(id(call_hierarchy))
+
+    @staticmethod
+    def getLeakKey(leak):
+        return leak.ip, isinstance(leak, DataLeak)
+
+    def getOccurrences(self, leak):
+        """Get all occurrences of a leak in the call hierarchy, e.g. of a leak of the library hierarchy.
+
+        Returns:
+            A list of tuples (CallHistory, slot).
+        """
+        return self.occurrences.get(self.getLeakKey(leak), [])
+
+    def isLeak(self, slot, ip, is_dataleak):
+        """Check whether slot holds a data leak (or cf leak) at ip, e.g. when replaying a journal."""
+        return 0 <= slot < len(self.flags) and self.ips[slot] == ip and self.dataleak[slot] == is_dataleak
+
+    def copy(self):
+        """Copy flags, comments and changes, e.g., to write them in another thread.
+
+        Only the columns which change after loading are copied, the others
+        are shared with this store.
+        """
+        store = AnnotationStore()
+        store.flags = bytearray(self.flags)
+        store.comments = self.comments.copy()
+        store.node_ranges = self.node_ranges
+        store.occurrences = self.occurrences
+        store.ips = self.ips
+        store.dataleak = self.dataleak
+        store.changes = self.changes.copy()
+        return store
+
+    def takeChanges(self):
+        """Get the slots changed since the last call and forget them.
+
+        Returns:
+            A dict mapping each changed slot to the time of its last change.
+        """
+        changes, self.changes = self.changes, {}
+        return changes
+
+    def getFlag(self, slot):
+        return self.flags[slot] + LeakFlags.NONE
+
+    def setFlag(self, slot, flag):
+        self.flags[slot] = flag - LeakFlags.NONE
+        self.changes[slot] = time.time()
+
+    def setFlags(self, slots, flag):
+        """Set the flag of many slots at once."""
+        value = flag - LeakFlags.NONE
+        now = time.time()
+        for slot in slots:
+            self.flags[slot] = value
+            self.changes[slot] = now
+
+    def getComment(self, slot):
+        return self.comments.get(slot, "")
+
+    def setComment(self, slot, comment):
+        self.setComments((slot,), comment)
+
+    def setComments(self, slots, comment):
+        """Set the comment of many slots at once."""
+        now = time.time()
+        for slot in slots:
+            if comment:
+                self.comments[slot] = comment
+            else:
+                self.comments.pop(slot, None)
+            self.changes[slot] = now
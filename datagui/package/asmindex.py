@@ -0,0 +1,150 @@
+"""
+Copyright (C) 2018 IAIK TU Graz (data@iaik.tugraz.at)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+@version 1.2
+
+"""
+
+import re
+import struct
+import zipfile
+from array import array
+from bisect import bisect_left
+
+from datagui.package.utils import debug, packArrays, unpackArrays, unpackHeader
+
+# Stored next to each objdump in framework.zip, e.g., 'libc.so.6.asm.idx'
+ASM_INDEX_SUFFIX = ".idx"
+ASM_INDEX_MAGIC = b"DATAASMI"
+ASM_INDEX_VERSION = 1
+
+# Instruction lines look like '  4004d6:\t55  \tpush   %rbp'
+_insn_re = re.compile(r"^\s*([0-9a-f]+):\t")
+_header = struct.Struct("<8sII")  # magic, version, number of entries
+_typecodes = ('Q', 'I', 'H')  # addresses, line numbers, columns
+
+
+class AsmIndex:
+    """Maps the instruction addresses of an objdump to the line and column they are printed at.
+
+    The index is built in a single pass over the objdump and is meant to
+    replace datastub.export.getAsmFileInfo, which scans the whole dump for
+    every single ip. Only instruction lines are indexed, i.e. lines starting
+    with the hex address followed by ':' and a tab. Entries are kept in
+    parallel arrays sorted by address.
+    """
+
+    def __init__(self, addrs=None, lines=None, columns=None):
+        self.addrs = addrs if addrs is not None else array(_typecodes[0])
+        self.lines = lines if lines is not None else array(_typecodes[1])
+        self.columns = columns if columns is not None else array(_typecodes[2])
+
+    def __len__(self):
+        return len(self.addrs)
+
+    @classmethod
+    def parse(cls, asm_lines):
+        """Build the index from the lines of an objdump.
+
+        The lines must be split at '\\n' only. str.splitlines also splits at
+        form feeds and other separators, which shifts the line numbers.
+        If an address is printed multiple times, its first line is used.
+        """
+
+        entries = {}
+        for line_nr, line in enumerate(asm_lines):
+            m = _insn_re.match(line)
+            if m is None:
+                continue
+            addr = int(m.group(1), 16)
+            if addr not in entries:
+                entries[addr] = (line_nr, m.start(1))
+
+        index = cls()
+        for addr in sorted(entries):
+            line_nr, column = entries[addr]
+            index.addrs.append(addr)
+            index.lines.append(line_nr)
+            index.columns.append(min(column, 0xffff))
+        return index
+
+    def lookup(self, addr):
+        """Return a tuple (line_nr, column) of a local address or None if it is not part of the objdump."""
+
+        i = bisect_left(self.addrs, addr)
+        if i < len(self.addrs) and self.addrs[i] == addr:
+            return self.lines[i], self.columns[i]
+        return None
+
+    def getLine(self, addr):
+        """Return the line of the instruction at addr or -1.
+
+        Unlike datastub.export.getAsmFileInfo, which returns the first line
+        containing 'addr:' anywhere, only the instruction line of addr matches.
+        """
+
+        entry = self.lookup(addr)
+        return -1 if entry is None else entry[0]
+
+    def toBytes(self):
+        return _header.pack(ASM_INDEX_MAGIC, ASM_INDEX_VERSION, len(self.addrs)) + \
+            packArrays((self.addrs, self.lines, self.columns))
+
+    @classmethod
+    def fromBytes(cls, data):
+        fields = unpackHeader(_header, data, ASM_INDEX_MAGIC, ASM_INDEX_VERSION)
+        if fields is None:
+            raise ValueError("Unsupported asm index")
+        arrays, _ = unpackArrays(data, _header.size, _typecodes, fields[0])
+        return cls(*arrays)
+
+
+def loadAsmIndex(datafs, asm_file_path):
+    """Load the index of an objdump from framework.zip.
+
+    Returns:
+        The AsmIndex or None if the zip does not contain an index for this objdump.
+    """
+
+    try:
+        with datafs.get_binfile(asm_file_path + ASM_INDEX_SUFFIX) as f:
+            return AsmIndex.fromBytes(f.read())
+    except Exception as e:
+        debug(1, "[AsmIndex] No index for %s: %s", (asm_file_path, str(e)))
+        return None
+
+
+def addAsmIndexes(zip_path):
+    """Add an index to each objdump of framework.zip that does not have one yet.
+
+    Returns:
+        The number of indexes added.
+    """
+
+    with zipfile.ZipFile(zip_path) as z:
+        names = set(z.namelist())
+        asm_names = [name for name in sorted(names) if name.endswith(".asm") and name + ASM_INDEX_SUFFIX not in names]
+        indexes = []
+        for name in asm_names:
+            asm_dump = z.read(name).decode('utf-8', errors='replace')
+            indexes.append((name + ASM_INDEX_SUFFIX, AsmIndex.parse(asm_dump.split('\n')).toBytes()))
+            debug(1, "[AsmIndex] Indexed %s", name)
+
+    if indexes:
+        with zipfile.ZipFile(zip_path, 'a', zipfile.ZIP_DEFLATED) as z:
+            for name, data in indexes:
+                z.writestr(name, data)
+    return len(indexes)
@@ -0,0 +1,110 @@
+"""
+Copyright (C) 2018 IAIK TU Graz (data@iaik.tugraz.at)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+@version 1.2
+
+"""
+
+import os
+import struct
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from datagui.package.journal import packRecords, applyRecords
+from datagui.package.utils import debug, atomicWrite, unpackHeader
+
+# Autosave layout:
+#   header
+#   journal records of all changes not saved to the journal yet
+# The autosave is rewritten completely each time and only applies on top
+# of the journal it was written for.
+
+AUTOSAVE_SUFFIX = ".autosave"
+AUTOSAVE_MAGIC = b"DATAGUI-AUTOSAVE"
+AUTOSAVE_VERSION = 1
+
+_header = struct.Struct("<16sI20sQ")  # magic, version, pickle digest, length of the journal
+
+
+def getAutosavePath(pickle_path):
+    return pickle_path + AUTOSAVE_SUFFIX
+
+
+def storeAutosave(path, pickle_digest, journal_end, store):
+    """Write the unsaved changes of store to path.
+
+    Args:
+        path: Path of the autosave, see getAutosavePath
+        pickle_digest: Digest of the pickle, see Journal
+        journal_end: Length of the journal the changes apply on top of, see Journal.end
+        store: AnnotationStore with the unsaved changes, e.g., a copy
+    """
+    with atomicWrite(path, sync=True) as f:
+        f.write(_header.pack(AUTOSAVE_MAGIC, AUTOSAVE_VERSION, pickle_digest, journal_end))
+        f.write(packRecords(store, store.changes))
+    debug(1, "[Autosave] Stored %d changes in %s", (len(store.changes), path))
+
+
+def loadAutosave(path, pickle_digest, journal_end, store):
+    """Apply the changes of the autosave at path to store, e.g., after a crash.
+
+    The changes stay unsaved changes of store.
+
+    Returns:
+        The number of applied changes, 0 if there is no matching autosave.
+    """
+    if not os.path.isfile(path):
+        return 0
+    with open(path, 'rb') as f:
+        data = f.read()
+    fields = unpackHeader(_header, data, AUTOSAVE_MAGIC, AUTOSAVE_VERSION)
+    if fields is None:
+        debug(0, "[Autosave] Ignoring outdated or truncated autosave %s", path)
+        return 0
+    autosave_pickle_digest, autosave_journal_end = fields
+    if autosave_pickle_digest != pickle_digest or autosave_journal_end != journal_end:
+        debug(0, "[Autosave] Ignoring autosave %s, which does not match the pickle and journal", path)
+        return 0
+    count, _ = applyRecords(store, data, _header.size)
+    debug(1, "[Autosave] Restored %d changes of %s", (count, path))
+    return count
+
+
+def removeAutosave(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+class AutosaveWriter(QThread):
+    """Write an autosave in a background thread, see storeAutosave.
+
+    The store must not be modified while writing, so pass a copy.
+    """
+
+    failed = pyqtSignal(str)
+
+    def __init__(self, path, pickle_digest, journal_end, store):
+        super(AutosaveWriter, self).__init__()
+        self.path = path
+        self.pickle_digest = pickle_digest
+        self.journal_end = journal_end
+        self.store = store
+
+    def run(self):
+        try:
+            storeAutosave(self.path, self.pickle_digest, self.journal_end, self.store)
+        except Exception as e:
+            debug(0, "[Autosave] Unable to write %s: %s", (self.path, str(e)))
+            self.failed.emit(str(e))
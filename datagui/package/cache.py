@@ -0,0 +1,187 @@
+"""
+Copyright (C) 2018 IAIK TU Graz (data@iaik.tugraz.at)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+@version 1.2
+
+"""
+
+import os
+import gzip
+import struct
+import hashlib
+import zipfile
+from array import array
+
+from datagui.package.utils import debug, atomicWrite, packArrays, unpackArrays, unpackHeader
+
+# Increment whenever the layout of the cached navigation indexes changes
+CACHE_VERSION = 2
+CACHE_MAGIC = b"DATAGUI-NAVCACHE"
+CACHE_SUFFIX = ".navcache"
+
+# Cache layout:
+#   header
+#   gzip compressed:
+#     number of entries of each table
+#     tables, in the order of _schema
+#     utf-8 strings, whose lengths are stored in the table string_lengths
+
+_header = struct.Struct("<16sI20s20s")  # magic, version, pickle digest, zip digest
+
+
+def _fileTables(prefix):
+    """Tables of the file registry of a ZoomTabView, see ZoomTabView.exportFiles."""
+
+    return (
+        # One entry per registered file
+        (prefix + 'paths', 'I'), (prefix + 'load_paths', 'I'),
+        # One entry per marker
+        (prefix + 'marker_files', 'I'), (prefix + 'marker_keys', 'Q'), (prefix + 'marker_lines', 'i'),
+        (prefix + 'marker_flags', 'b'),
+        # One entry per indicator
+        (prefix + 'indicator_files', 'I'), (prefix + 'indicator_lines', 'i'), (prefix + 'indicator_columns', 'i'),
+        (prefix + 'indicator_lengths', 'i'), (prefix + 'indicator_texts', 'i'),
+        # One entry per line mapped to an ip, i.e., utils.asm_map or utils.src_map
+        (prefix + 'map_files', 'I'), (prefix + 'map_lines', 'i'), (prefix + 'map_ips', 'Q'),
+    )
+
+
+_schema = (
+    # One entry per ip of utils.info_map
+    ('ips', 'Q'), ('asm_file_indexes', 'i'), ('asm_line_nrs', 'i'), ('src_file_indexes', 'i'), ('src_line_nrs', 'i'),
+    ('fl_positions', 'i'), ('call_counts', 'I'),
+    # Call hierarchy positions of the nodes of all ips, call_counts[i] entries per ip
+    ('call_positions', 'I'),
+    ('string_lengths', 'I'),
+) + _fileTables('asm_') + _fileTables('src_')
+
+
+class NavigationTables:
+    """Navigation indexes of a pickle and zip file, kept in arrays.
+
+    Tables are accessed by their name, see _schema. Tree items and call
+    hierarchy nodes are referenced by their position, strings like file
+    paths by their id, see addString.
+    """
+
+    def __init__(self):
+        self.tables = {name: array(typecode) for name, typecode in _schema}
+        self.strings = []
+        self.string_ids = {}  # string_ids[string] -> id
+
+    def __getitem__(self, name):
+        return self.tables[name]
+
+    def addString(self, string):
+        string_id = self.string_ids.get(string)
+        if string_id is None:
+            string_id = self.string_ids[string] = len(self.strings)
+            self.strings.append(string)
+        return string_id
+
+    def getString(self, string_id):
+        return self.strings[string_id]
+
+    def toBytes(self):
+        encoded = [string.encode('utf-8') for string in self.strings]
+        self.tables['string_lengths'] = array('I', [len(data) for data in encoded])
+        counts = array('Q', [len(self.tables[name]) for name, _ in _schema])
+        return packArrays([counts]) + packArrays(self.tables[name] for name, _ in _schema) + b"".join(encoded)
+
+    @classmethod
+    def fromBytes(cls, data, offset):
+        """Counterpart of toBytes.
+
+        Raises:
+            ValueError: data is truncated.
+        """
+
+        navigation = cls()
+        (counts,), offset = unpackArrays(data, offset, 'Q', len(_schema))
+        for (name, typecode), count in zip(_schema, counts):
+            (navigation.tables[name],), offset = unpackArrays(data, offset, typecode, count)
+        for length in navigation.tables['string_lengths']:
+            if offset + length > len(data):
+                raise ValueError("Truncated strings")
+            navigation.strings.append(data[offset:offset + length].decode('utf-8'))
+            offset += length
+        return navigation
+
+
+def getCachePath(pickle_path):
+    return pickle_path + CACHE_SUFFIX
+
+
+def zipDigest(zip_path):
+    """Return a digest of the content of a zip file.
+
+    Instead of hashing the whole file, only the CRC32 and size of each
+    member are hashed, which zip already stores in its central directory.
+    """
+
+    sha = hashlib.sha1()
+    with zipfile.ZipFile(zip_path) as z:
+        for info in sorted(z.infolist(), key=lambda i: i.filename):
+            sha.update(info.filename.encode('utf-8'))
+            sha.update(struct.pack("<IQ", info.CRC, info.file_size))
+    return sha.digest()
+
+
+def loadCache(pickle_path, pickle_digest, zip_digest, fileobj_wrapper=None):
+    """Load the navigation indexes stored next to pickle_path.
+
+    Args:
+        pickle_path: Path of the result pickle.
+        pickle_digest: SHA1 digest of the result pickle.
+        zip_digest: Digest of the framework zip, see zipDigest.
+        fileobj_wrapper: Optional callable wrapping the opened cache file, e.g., for progress reports.
+
+    Returns:
+        The cached NavigationTables if the cache matches both digests, None otherwise.
+    """
+
+    path = getCachePath(pickle_path)
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'rb') as f:
+        fields = unpackHeader(_header, f.read(_header.size), CACHE_MAGIC, CACHE_VERSION)
+        if fields is None:
+            debug(1, "[Cache] Outdated or truncated cache file %s", path)
+            return None
+        cached_pickle_digest, cached_zip_digest = fields
+        if cached_pickle_digest != pickle_digest or cached_zip_digest != zip_digest:
+            debug(1, "[Cache] Cache file %s does not match pickle/zip", path)
+            return None
+        if fileobj_wrapper:
+            f = fileobj_wrapper(f, os.path.getsize(path))
+        with gzip.GzipFile(fileobj=f) as payload:
+            return NavigationTables.fromBytes(payload.read(), 0)
+
+
+def storeCache(pickle_path, pickle_digest, zip_digest, navigation):
+    """Store the NavigationTables next to pickle_path."""
+
+    path = getCachePath(pickle_path)
+    try:
+        with atomicWrite(path) as f:
+            f.write(_header.pack(CACHE_MAGIC, CACHE_VERSION, pickle_digest, zip_digest))
+            with gzip.GzipFile(fileobj=f, mode='wb', compresslevel=1) as payload:
+                payload.write(navigation.toBytes())
+    except Exception as e:
+        debug(0, "[Cache] Unable to write cache file %s: %s", (path, str(e)))
+        return False
+    debug(1, "[Cache] Stored %s", path)
+    return True
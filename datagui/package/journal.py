@@ -0,0 +1,168 @@
+"""
+Copyright (C) 2018 IAIK TU Graz (data@iaik.tugraz.at)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+@version 1.2
+
+"""
+
+import os
+import struct
+
+from datagui.package.utils import LeakFlags, debug, unpackHeader
+
+# Journal layout:
+#   header
+#   one record per changed leak occurrence, followed by its utf-8 comment
+# Records are only appended. A later record of the same slot overrides
+# earlier ones, such that the journal can be replayed from the start.
+
+JOURNAL_SUFFIX = ".journal"
+JOURNAL_MAGIC = b"DATAGUI-JOURNAL\0"
+JOURNAL_VERSION = 1
+
+_header = struct.Struct("<16sI20s")  # magic, version, digest of the pickle the records apply to
+_record = struct.Struct("<QQBBdI")  # slot, ip, is data leak, flag, time of change, length of comment
+
+
+def getJournalPath(pickle_path):
+    return pickle_path + JOURNAL_SUFFIX
+
+
+def packRecords(store, changes):
+    """Pack a record with the current flag and comment of each changed slot of store.
+
+    Args:
+        store: AnnotationStore, or a copy of it, see AnnotationStore.copy
+        changes: Dict mapping each changed slot to the time of its last change, see AnnotationStore.takeChanges
+
+    Returns:
+        The records as bytes.
+    """
+    records = []
+    for slot, timestamp in sorted(changes.items()):
+        comment = store.getComment(slot).encode('utf-8')
+        records.append(_record.pack(slot, store.ips[slot], store.dataleak[slot], store.getFlag(slot), timestamp,
+                                    len(comment)))
+        records.append(comment)
+    return b"".join(records)
+
+
+def applyRecords(store, data, offset):
+    """Apply the records in data from offset on to store.
+
+    Applying stops at the first incomplete or mismatching record.
+
+    Returns:
+        A tuple (number of applied records, offset after the last applied record).
+    """
+    count = 0
+    while offset + _record.size <= len(data):
+        slot, ip, is_dataleak, flag, _, length = _record.unpack_from(data, offset)
+        end = offset + _record.size + length
+        if end > len(data) or not LeakFlags.NONE <= flag <= LeakFlags.LEAK or \
+                not store.isLeak(slot, ip, is_dataleak):
+            break
+        try:
+            comment = data[offset + _record.size:end].decode('utf-8')
+        except UnicodeDecodeError:
+            break
+        store.setFlag(slot, flag)
+        store.setComment(slot, comment)
+        offset = end
+        count += 1
+    return count, offset
+
+
+class Journal:
+    """Append-only log of the flags and comments changed since the pickle was written.
+
+    Saving appends one record per changed leak occurrence instead of
+    rewriting the whole pickle. Records address the slots of an
+    AnnotationStore, which only match the pickle they were created for.
+    Therefore, the journal is bound to the digest of its pickle and
+    ignored if the pickle changed. Writing the pickle again compacts the
+    journal, see MainWindow.storeCallHierarchy.
+    """
+
+    def __init__(self, pickle_path, pickle_digest):
+        self.path = getJournalPath(pickle_path)
+        self.pickle_digest = pickle_digest
+        self.end = None  # Offset after the last valid record, None if the journal has to be created
+
+    # # # # # # # # #
+    # MY FUNCTIONS  #
+    # # # # # # # # #
+
+    def replay(self, store):
+        """Apply the records of the journal to store.
+
+        Replaying stops at the first incomplete or mismatching record,
+        e.g., after a crash while appending. The next append overwrites it.
+
+        Returns:
+            The number of applied records.
+        """
+        self.end = None
+        if not os.path.isfile(self.path):
+            return 0
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        fields = unpackHeader(_header, data, JOURNAL_MAGIC, JOURNAL_VERSION)
+        if fields is None:
+            debug(0, "[Journal] Ignoring outdated or truncated journal %s", self.path)
+            return 0
+        if fields[0] != self.pickle_digest:
+            debug(0, "[Journal] Ignoring journal %s, which does not match the pickle", self.path)
+            return 0
+
+        count, offset = applyRecords(store, data, _header.size)
+        if offset < len(data):
+            debug(0, "[Journal] Ignoring invalid records at offset %d of %s", (offset, self.path))
+        # The replayed changes are already part of the journal
+        store.takeChanges()
+        self.end = offset
+        debug(1, "[Journal] Replayed %d records of %s", (count, self.path))
+        return count
+
+    def append(self, store):
+        """Append a record for each slot of store changed since the last append.
+
+        Returns:
+            The number of appended records.
+        """
+        if not store.changes:
+            return 0
+        records = packRecords(store, store.changes)
+        if self.end is None:
+            with open(self.path, 'wb') as f:
+                f.write(_header.pack(JOURNAL_MAGIC, JOURNAL_VERSION, self.pickle_digest))
+                self.end = f.tell()
+        with open(self.path, 'r+b') as f:
+            f.seek(self.end)
+            f.write(records)
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+            self.end = f.tell()
+        count = len(store.takeChanges())
+        debug(1, "[Journal] Appended %d records to %s", (count, self.path))
+        return count
+
+    def remove(self):
+        """Remove the journal, e.g., after its changes were written to the pickle."""
+        self.end = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,344 @@
+"""
+Copyright (C) 2018 IAIK TU Graz (data@iaik.tugraz.at)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+@version 1.2
+
+"""
+
+import os
+import copy
+import gzip
+import hashlib
+import traceback
+from PyQt5.QtCore import QThread, pyqtSignal
+from datastub.DataFS import DataFS
+from datastub.SymbolInfo import SymbolInfo, Symbol, Image
+from datastub.IpInfoShort import IP_INFO_FILE
+from datastub.export import MyUnpickler
+from datastub.leaks import LibHierarchy, Library, FunctionLeak, MergeMap, DataLeak, CFLeak
+from datastub.utils import sorted_keys
+
+from datagui.package import cache
+from datagui.package.asmindex import loadAsmIndex
+from datagui.package.symbols import loadSymbolIndex
+from datagui.package.snapshot import Snapshot, isSnapshot
+from datagui.package.profiler import profiler
+from datagui.package.traversal import iterPreOrder
+from datagui.package.utils import ErrorCode, debug
+
+
+class LoadCancelled(Exception):
+    pass
+
+
+class LoadError(Exception):
+    def __init__(self, error_code, msg):
+        super(LoadError, self).__init__(msg)
+        self.error_code = error_code
+
+
+class LoadResult:
+    """Everything the GUI needs from a pickle/zip pair, handed over in one step."""
+
+    def __init__(self, pickle_path, zip_path):
+        self.pickle_path = pickle_path
+        self.zip_path = zip_path
+        self.datafs = None
+        self.symbol_index = None  # SymbolIndex of the zip, installed by MainWindow.filesLoaded
+        self.call_hierarchy = None
+        self.lib_hierarchy = None
+        self.short_info_map = None
+        self.asm_indexes = {}  # asm_indexes[asm_file_path] -> AsmIndex
+        self.pickle_digest = None
+        self.is_snapshot = False
+        self.zip_digest = None
+        self.navigation = None  # Cached NavigationTables, None if they need to be rebuilt
+
+
+class ProgressFile:
+    """File wrapper that reports read progress and aborts reading on cancel."""
+
+    def __init__(self, fileobj, size, callback, hasher=None):
+        self.fileobj = fileobj
+        self.size = max(size, 1)
+        self.callback = callback
+        self.hasher = hasher
+        self.pos = 0
+
+    def read(self, *args):
+        return self.update(self.fileobj.read(*args))
+
+    def readline(self, *args):
+        return self.update(self.fileobj.readline(*args))
+
+    def update(self, data):
+        if self.hasher:
+            self.hasher.update(data)
+        self.pos += len(data)
+        self.callback(min(self.pos / self.size, 1.0))
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self.fileobj, name)
+
+
+def copyLeak(leak):
+    """Copy a leak for LibHierarchy.merge.
+
+    Merging modifies the entries, the status and the evidence list of the
+    first leak of each ip. Only these are copied, the evidence entries are
+    shared with the call hierarchy, which is a lot cheaper than copy.deepcopy.
+    """
+
+    clone = copy.copy(leak)
+    clone.entries = copy.copy(leak.entries)
+    clone.entries.mymap = {}
+    for entry in leak.entries:
+        entry = copy.copy(entry)
+        clone.entries.mymap[entry] = entry
+    clone.status = copy.copy(leak.status)
+    clone.evidence = list(leak.evidence)
+    clone.meta = copy.copy(leak.meta)
+    return clone
+
+
+def createFunctionLeak(leak, lookup):
+    """Same as FunctionLeak(leak), but the symbol of leak.ip comes from lookup instead of SymbolInfo.lookup."""
+
+    fleak = FunctionLeak.__new__(FunctionLeak)
+    fleak.dataleaks = MergeMap(DataLeak)
+    fleak.cfleaks = MergeMap(CFLeak)
+    fleak.sym = lookup(leak.ip)
+    if fleak.sym is None:
+        img = Image("Unknown", 0, 0, False)
+        fleak.sym = Symbol(0, 0, "UnknownSym", img, '')
+    fleak.fentry = fleak.sym.addr
+    fleak.append(leak)
+    return fleak
+
+
+def flatten(call_hierarchy, callback=None, lookup=None):
+    """Create the LibHierarchy of a call hierarchy.
+
+    Same result as CallHistory.flatten(), but walks the call hierarchy
+    iteratively and reports the fraction of processed nodes to callback.
+    Symbols are looked up with lookup, SymbolInfo.lookup by default.
+    """
+
+    if lookup is None:
+        lookup = SymbolInfo.lookup
+
+    total = sum(1 for _ in iterPreOrder(call_hierarchy, lambda node: list(node.children.values())))
+
+    flat = LibHierarchy()
+    done = 0
+    for node in iterPreOrder(call_hierarchy, lambda node: [node.children[k] for k in sorted_keys(node.children)]):
+        for leak in sorted_keys(node.dataleaks):
+            flat.entries.merge(Library(createFunctionLeak(copyLeak(leak), lookup)))
+        for leak in sorted_keys(node.cfleaks):
+            flat.entries.merge(Library(createFunctionLeak(copyLeak(leak), lookup)))
+        done += 1
+        if callback:
+            callback(done / total)
+    return flat
+
+
+def pickleDigest(path):
+    """Digest of a result pickle or snapshot, the same as ResultLoader computes while loading it."""
+
+    if isSnapshot(path):
+        snapshot = Snapshot(path)
+        snapshot.close()
+        return snapshot.digest
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for data in iter(lambda: f.read(1 << 20), b""):
+            sha.update(data)
+    return sha.digest()
+
+
+class ResultLoader(QThread):
+    """Load a pickle and framework.zip in a background thread.
+
+    Loading is split into stages, each reporting its progress via the
+    progress signal. The result is delivered via the loaded signal.
+    Loading can be aborted at any time with cancel().
+    """
+
+    # (stage description, stage weight in percent)
+    STAGES = [
+        ("Decompressing and unpickling leak results", 50),
+        ("Loading symbols", 10),
+        ("Loading cached indexes", 10),
+        ("Loading ip information and asm indexes", 10),
+        ("Flattening call hierarchy", 20),
+    ]
+
+    progress = pyqtSignal(str, int)  # stage description, overall progress in percent
+    loaded = pyqtSignal(object)  # LoadResult
+    failed = pyqtSignal(int, str)  # ErrorCode, message
+    canceled = pyqtSignal()
+
+    def __init__(self, pickle_path, zip_path):
+        super(ResultLoader, self).__init__()
+        self.result = LoadResult(pickle_path, zip_path)
+        self.cancelled = False
+        self.stage = 0
+        self.percent = -1
+
+    def cancel(self):
+        self.cancelled = True
+
+    def checkCancelled(self):
+        if self.cancelled:
+            raise LoadCancelled()
+
+    def setStage(self, stage):
+        self.stage = stage
+        self.reportProgress(0.0)
+
+    def reportProgress(self, fraction):
+        """Report fraction in [0, 1] of the current stage."""
+
+        self.checkCancelled()
+        percent = sum(weight for _, weight in self.STAGES[:self.stage])
+        percent += int(self.STAGES[self.stage][1] * fraction)
+        if percent != self.percent:
+            self.percent = percent
+            self.progress.emit(self.STAGES[self.stage][0], percent)
+
+    def run(self):
+        try:
+            with profiler.stage("loadpickle"):
+                self.loadPickle()
+            with profiler.stage("setupSymbolInfo"):
+                self.loadSymbols()
+            with profiler.stage("loadCache"):
+                self.loadCache()
+            if self.result.navigation is None:
+                with profiler.stage("loadIpInfo"):
+                    self.loadIpInfo()
+            with profiler.stage("flatten"):
+                self.setStage(4)
+                self.result.lib_hierarchy = flatten(self.result.call_hierarchy, self.reportProgress,
+                                                    self.result.symbol_index.lookup)
+            self.checkCancelled()
+        except LoadCancelled:
+            debug(1, "[Loader] Canceled")
+            self.canceled.emit()
+            return
+        except LoadError as e:
+            debug(1, "[Loader] %s", str(e))
+            self.failed.emit(e.error_code, str(e))
+            return
+        except Exception as e:
+            debug(1, "[Loader] Exception: %s", traceback.format_exc())
+            self.failed.emit(ErrorCode.CANNOT_LOAD_PICKLE, "Unable to load files: " + str(e))
+            return
+        self.loaded.emit(self.result)
+
+    def loadPickle(self):
+        self.setStage(0)
+        path = self.result.pickle_path
+        if not os.path.isfile(path):
+            raise LoadError(ErrorCode.INVALID_PICKLE, "Please enter a valid pickle file path (mandatory)")
+        if isSnapshot(path):
+            self.loadSnapshot()
+            return
+        sha = hashlib.sha1()
+        try:
+            with open(path, 'rb') as raw:
+                progress_file = ProgressFile(raw, os.path.getsize(path), self.reportProgress, sha)
+                with gzip.GzipFile(fileobj=progress_file) as f:
+                    call_hierarchy = MyUnpickler(f, encoding='latin1').load()
+                # Hash the remainder not consumed by the unpickler
+                while progress_file.read(1 << 20):
+                    pass
+        except LoadCancelled:
+            raise
+        except Exception as e:
+            raise LoadError(ErrorCode.CANNOT_LOAD_PICKLE, "Unable to load pickle file: " + str(e))
+        if not call_hierarchy:
+            raise LoadError(ErrorCode.INVALID_PICKLE, "Please enter a valid pickle file path (mandatory)")
+        self.result.call_hierarchy = call_hierarchy
+        self.result.pickle_digest = sha.digest()
+
+    def loadSnapshot(self):
+        """Load a snapshot created by 'datagui --convert'."""
+
+        try:
+            snapshot = Snapshot(self.result.pickle_path)
+            call_hierarchy = snapshot.loadRoot(self.reportProgress)
+        except LoadCancelled:
+            raise
+        except Exception as e:
+            raise LoadError(ErrorCode.CANNOT_LOAD_PICKLE, "Unable to load snapshot file: " + str(e))
+        self.result.call_hierarchy = call_hierarchy
+        self.result.pickle_digest = snapshot.digest
+        self.result.is_snapshot = True
+
+    def loadSymbols(self):
+        self.setStage(1)
+        path = self.result.zip_path
+        if not os.path.isfile(path):
+            raise LoadError(ErrorCode.INVALID_ZIP, "Please enter a valid zip file path (mandatory)")
+        try:
+            datafs = DataFS(path, write=False)
+            symbol_index = loadSymbolIndex(datafs, path, lambda f, size: ProgressFile(f, size, self.reportProgress))
+        except LoadCancelled:
+            raise
+        except Exception as e:
+            raise LoadError(ErrorCode.CANNOT_LOAD_ZIP, "Unable to load zip file: " + str(e))
+        self.result.datafs = datafs
+        self.result.symbol_index = symbol_index
+
+    def loadCache(self):
+        """Load the navigation indexes of a previous run, if available."""
+
+        self.setStage(2)
+        try:
+            self.result.zip_digest = cache.zipDigest(self.result.zip_path)
+            navigation = cache.loadCache(self.result.pickle_path, self.result.pickle_digest, self.result.zip_digest,
+                                         lambda f, size: ProgressFile(f, size, self.reportProgress))
+        except LoadCancelled:
+            raise
+        except Exception as e:
+            debug(0, "[Loader] Ignoring unusable cache: %s", str(e))
+            return
+        if navigation is not None:
+            debug(1, "[Loader] Using cached indexes")
+            self.result.navigation = navigation
+
+    def loadIpInfo(self):
+        self.setStage(3)
+        datafs = self.result.datafs
+        try:
+            size = datafs.datafs.getinfo(os.path.join(datafs.cwd, IP_INFO_FILE), namespaces=['details']).size
+            with datafs.get_binfile(IP_INFO_FILE) as f:
+                unp = MyUnpickler(ProgressFile(f, size, self.reportProgress), encoding='latin1')
+                self.result.short_info_map = unp.load()
+        except LoadCancelled:
+            raise
+        except Exception as e:
+            raise LoadError(ErrorCode.CANNOT_LOAD_ZIP, "Unable to load zip file: " + str(e))
+
+        # Older zip files come without asm indexes; the GUI then searches the asm lines instead
+        asm_files = set(short_info.asm_file for short_info in self.result.short_info_map.values())
+        for asm_file in sorted(asm_files):
+            self.checkCancelled()
+            asm_index = loadAsmIndex(datafs, asm_file)
+            if asm_index is not None:
+                self.result.asm_indexes[asm_file] = asm_index
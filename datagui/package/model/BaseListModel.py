@@ -0,0 +1,111 @@
+"""
+Copyright (C) 2018 IAIK TU Graz (data@iaik.tugraz.at)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+@version 1.2
+
+"""
+
+from PyQt5.QtCore import QModelIndex
+
+from datagui.package.model.BaseTreeModel import BaseTreeModel
+from datagui.package.utils import LIST_CHUNK_SIZE
+
+
+class BaseListModel(BaseTreeModel):
+    """Flat list of items, which displays none_item while it is empty.
+
+    Lists are installed at once with setItems. Large lists can be split
+    into chunks, of which only the first one is inserted immediately. The
+    remaining chunks are inserted when the view asks for more rows.
+    """
+
+    def __init__(self, none_item):
+        super(BaseListModel, self).__init__()
+        self.items = []
+        self.pending = []  # Items which are not yet inserted, see fetchMore
+        self.none_item = none_item
+
+    # # # # # # # # # # # # #
+    # OVERLOADED FUNCTIONS  #
+    # # # # # # # # # # # # #
+
+    def index(self, row, column, parent):
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+
+        if len(self.items) == 0:
+            # We're empty. Display none_item
+            item = self.none_item
+        else:
+            item = self.items[row]
+
+        if item:
+            return self.createIndex(row, column, item)
+        else:
+            return QModelIndex()
+
+    def rowCount(self, parent):
+        if parent.isValid():
+            return 0
+        if len(self.items) == 0:
+            # We're empty. Display none_item
+            return 1
+        return len(self.items)
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and len(self.pending) > 0
+
+    def fetchMore(self, parent):
+        if not parent.isValid():
+            self.insertPending(LIST_CHUNK_SIZE)
+
+    # # # # # # # # #
+    # MY FUNCTIONS  #
+    # # # # # # # # #
+
+    def setItems(self, items, chunk_size=None):
+        """Replace all items with a single model reset.
+
+        Args:
+            items: List of the new items
+            chunk_size: If given, only insert this many items now and the rest on demand
+        """
+        self.beginResetModel()
+        if chunk_size and len(items) > chunk_size:
+            self.items = items[:chunk_size]
+            self.pending = items[chunk_size:]
+        else:
+            self.items = list(items)
+            self.pending = []
+        self.endResetModel()
+
+    def insertPending(self, count):
+        """Insert up to count pending items."""
+        count = min(count, len(self.pending))
+        if count <= 0:
+            return
+        row_count = len(self.items)
+        self.beginInsertRows(QModelIndex(), row_count, row_count + count - 1)
+        self.items.extend(self.pending[:count])
+        del self.pending[:count]
+        self.endInsertRows()
+
+    def getItemCount(self):
+        """Number of items including the pending ones."""
+        return len(self.items) + len(self.pending)
+
+    def clearList(self):
+        self.setItems([])
@@ -19,20 +19,27 @@ along with this program. If not, see <https://www.gnu.org/licenses/>.
 """
 
 from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QStandardItem
 
 from datagui.package.utils import CustomRole
 
 
-class BaseTreeItem(QStandardItem):
+class BaseTreeItem:
+    """Node of a tree model, referenced by the internal pointer of its model indexes.
+
+    The models only need the attributes below, so items are plain Python
+    objects with __slots__ instead of QStandardItems.
+    """
+    __slots__ = ('parent_item', 'name', 'obj', 'child_items', 'row_nr')
+
     def __init__(self, name, obj=None, parent=None):
-        super(BaseTreeItem, self).__init__()
         self.parent_item = parent
         self.name = name
         self.obj = obj
         self.child_items = []
+        self.row_nr = 0  # Position in parent_item.child_items, see appendChild
 
     def appendChild(self, item):
+        item.row_nr = len(self.child_items)
         self.child_items.append(item)
 
     def childCount(self):
@@ -53,6 +60,6 @@ class BaseTreeItem(QStandardItem):
 
     def row(self):
         if self.parent_item:
-            return self.parent_item.child_items.index(self)
+            return self.row_nr
 
         return 0
@@ -20,12 +20,16 @@ along with this program. If not, see <https://www.gnu.org/licenses/>.
 
 from PyQt5.QtCore import QAbstractItemModel, Qt, QModelIndex
 
+from datagui.package.traversal import iterPreOrder
+
 class BaseTreeModel(QAbstractItemModel):
     def __init__(self):
         self.root_item = None
         self.header = None
         self.headertooltip = None
+        self.item_ids = None  # item_ids[item.id] -> item, built on first lookup
         super(BaseTreeModel, self).__init__()
+        self.modelReset.connect(self.clearItemIds)
 
     # # # # # # # # # # # # #
     # OVERLOADED FUNCTIONS  #
@@ -72,3 +76,40 @@ class BaseTreeModel(QAbstractItemModel):
             return QModelIndex()
 
         return self.createIndex(parent_item.row(), 0, parent_item)
+
+    # # # # # # # # #
+    # MY FUNCTIONS  #
+    # # # # # # # # #
+
+    def iterItems(self):
+        """Iterate over all tree items in pre-order, starting with the root item."""
+
+        if self.root_item is None:
+            return
+        yield from iterPreOrder(self.root_item, lambda item: item.child_items)
+
+    def clearItemIds(self):
+        self.item_ids = None
+
+    def getItemById(self, item_id):
+        """Find a tree item by its id.
+
+        The id map is built on first use and dropped on model resets.
+
+        Returns:
+            The item or None if there is no item with this id.
+        """
+        if self.item_ids is None:
+            self.item_ids = {item.id: item for item in self.iterItems()}
+        return self.item_ids.get(item_id)
+
+    def getIndexById(self, item_id, column=0):
+        """Create the model index of the item with the given id.
+
+        Returns:
+            A QModelIndex or None if there is no such item below the root item.
+        """
+        item = self.getItemById(item_id)
+        if item is None or item is self.root_item:
+            return None
+        return self.createIndex(item.row(), column, item)
@@ -24,16 +24,19 @@ from datastub.utils import sorted_keys
 
 from datagui.package.model.BaseTreeItem import BaseTreeItem
 from datagui.package.model.BaseTreeModel import BaseTreeModel
-from datagui.package.utils import CustomRole, CustomType, getCtxName, LeakFlags, getIconById
+from datagui.package.annotations import AnnotationStore
+from datagui.package.traversal import walkTree, iterPreOrder
+from datagui.package.utils import CustomRole, CustomType, getCtxNames, LeakFlags, getIconById
 
 
 class CallHierarchyItem(BaseTreeItem):
-    id = -1
+    __slots__ = ('id', 'fetched')
+    last_id = -1
 
     def __init__(self, name, obj=None, parent=None):
         super(CallHierarchyItem, self).__init__(name, obj, parent)
-        self.id = CallHierarchyItem.id = CallHierarchyItem.id + 1
-        self.flag_id = LeakFlags.INFO;
+        self.id = CallHierarchyItem.last_id = CallHierarchyItem.last_id + 1
+        self.fetched = False  # True once the child items exist, see CallHierarchyModel.fetchChildren
         assert self.parent_item == parent
         #self.description = name
 
@@ -44,30 +47,380 @@ class CallHierarchyItem(BaseTreeItem):
         # Note: Does not copy child_items. Is this a problem??
         new_item = CallHierarchyItem(self.name, self.obj, self.parent_item)
         new_item.id = self.id
+        new_item.row_nr = self.row_nr
         assert(new_item.parent_item == self.parent_item)
         return new_item
 
+FLAG_SLOTS = LeakFlags.LEAK - LeakFlags.NONE + 1  # Leak flags from NONE to LEAK
+
+
+def getFlagBit(flag):
+    return 1 << (flag - LeakFlags.NONE)
+
+
+class FlagSummary:
+    """Number of data and cf leaks and maximum leakage per leak flag, plus a bit mask of the flags that occur.
+
+    Lists are indexed by flag - LeakFlags.NONE. Summaries do not depend on
+    the filter, filter() applies a filter mask to them.
+    """
+    __slots__ = ('mask', 'dataleaks', 'cfleaks', 'max_leaks')
+
+    def __init__(self):
+        self.mask = 0
+        self.dataleaks = [0] * FLAG_SLOTS
+        self.cfleaks = [0] * FLAG_SLOTS
+        self.max_leaks = [0.0] * FLAG_SLOTS
+
+    def copy(self):
+        summary = FlagSummary()
+        summary.mask = self.mask
+        summary.dataleaks = list(self.dataleaks)
+        summary.cfleaks = list(self.cfleaks)
+        summary.max_leaks = list(self.max_leaks)
+        return summary
+
+    def addLeak(self, flag, is_dataleak, max_leak_normalized):
+        slot = flag - LeakFlags.NONE
+        if is_dataleak:
+            self.dataleaks[slot] += 1
+        else:
+            self.cfleaks[slot] += 1
+        self.max_leaks[slot] = max(self.max_leaks[slot], max_leak_normalized)
+        self.mask |= 1 << slot
+
+    def add(self, other):
+        for slot in range(FLAG_SLOTS):
+            self.dataleaks[slot] += other.dataleaks[slot]
+            self.cfleaks[slot] += other.cfleaks[slot]
+            self.max_leaks[slot] = max(self.max_leaks[slot], other.max_leaks[slot])
+        self.mask |= other.mask
+
+    def updateMask(self):
+        self.mask = 0
+        for slot in range(FLAG_SLOTS):
+            if self.dataleaks[slot] or self.cfleaks[slot]:
+                self.mask |= 1 << slot
+
+    def filter(self, filter_mask):
+        """Summarize the leaks whose flag is in filter_mask.
+
+        Returns:
+            A tuple (data leak count, cf leak count, max. leakage, max. flag).
+        """
+        dataleaks = cfleaks = 0
+        max_leak_normalized = 0.0
+        max_flag = LeakFlags.NONE
+        mask = self.mask & filter_mask
+        slot = 0
+        while mask:
+            if mask & 1:
+                dataleaks += self.dataleaks[slot]
+                cfleaks += self.cfleaks[slot]
+                max_leak_normalized = max(max_leak_normalized, self.max_leaks[slot])
+                max_flag = slot + LeakFlags.NONE
+            mask >>= 1
+            slot += 1
+        return dataleaks, cfleaks, max_leak_normalized, max_flag
+
+
 class CallHierarchyModel(BaseTreeModel):
+    """Call hierarchy, whose items are created on demand.
+
+    Only the root item exists after setupData. The child items of a node
+    are created when a view expands it (fetchMore) or when a node is
+    looked up with getItem. Summaries are stored per CallHistory node, so
+    they also cover nodes without items.
+    """
 
     def __init__(self, call_hierarchy = None, leakfilter = None):
         super(CallHierarchyModel, self).__init__()
         self.root_item = None
         self.leakfilter = leakfilter
+        self.node_items = {}  # node_items[id(CallHistory)] -> CallHierarchyItem, for all created items
+        self.flag_summaries = {}  # flag_summaries[id(CallHistory)] -> see getFlagSummary
+        self.subtree_summaries = {}  # subtree_summaries[id(CallHistory)] -> see getSubtreeSummary
+        self.filter_mask = None  # See getFilterMask
+        self.annotations = AnnotationStore()  # Flags and comments of the leaks, see MainWindow.findIptoCallMappings
         if call_hierarchy is not None:
             assert isinstance(call_hierarchy, CallHistory)
             self.setupData(call_hierarchy)
 
-    def getFilteredLeaks(self, item):
-        call_hierarchy = item.data(CustomRole.Obj)
-        filtered_cf = list()
-        filtered_dl = list()
-        for l in call_hierarchy.cfleaks:
-            if self.leakfilter and self.leakfilter.isFilterActive(l.meta):
-                filtered_cf.append(l)
-        for l in call_hierarchy.dataleaks:
-            if self.leakfilter and self.leakfilter.isFilterActive(l.meta):
-                filtered_dl.append(l)
-        return (filtered_cf, filtered_dl)
+    def getFilterMask(self):
+        """Get the bit mask of the leak flags the filter lets through, see getFlagBit."""
+        if self.filter_mask is None:
+            self.filter_mask = 0
+            if self.leakfilter:
+                for flag in self.leakfilter.getActiveFlags():
+                    self.filter_mask |= getFlagBit(flag)
+        return self.filter_mask
+
+    def setFilterFlags(self, flags):
+        """Let the leaks with the given flags through the filter.
+
+        The summaries do not depend on the filter and no rows are added or
+        removed, so views only need to repaint their visible rows.
+        """
+        self.filter_mask = 0
+        for flag in flags:
+            self.filter_mask |= getFlagBit(flag)
+
+    def getFlagSummary(self, call_hierarchy):
+        """Get the FlagSummary of the leaks of a node, computed on first access."""
+        summary = self.flag_summaries.get(id(call_hierarchy))
+        if summary is None:
+            summary = FlagSummary()
+            for l in call_hierarchy.dataleaks:
+                summary.addLeak(l.meta.flag, True, l.status.max_leak_normalized())
+            for l in call_hierarchy.cfleaks:
+                summary.addLeak(l.meta.flag, False, l.status.max_leak_normalized())
+            self.flag_summaries[id(call_hierarchy)] = summary
+        return summary
+
+    def getSubtreeSummary(self, call_hierarchy):
+        """Get the FlagSummary of the leaks of a node and all its callees.
+
+        Missing summaries are computed for the whole tree at once.
+        """
+        summary = self.subtree_summaries.get(id(call_hierarchy))
+        if summary is None:
+            self.computeSubtreeSummaries(self.root_item.obj)
+            summary = self.subtree_summaries[id(call_hierarchy)]
+        return summary
+
+    def getAggregates(self, call_hierarchy):
+        """Get the summary of the filtered leaks of a node.
+
+        Returns:
+            A tuple (data leak count, cf leak count, max. leakage, max. flag).
+        """
+        return self.getFlagSummary(call_hierarchy).filter(self.getFilterMask())
+
+    def getSubtreeAggregates(self, call_hierarchy):
+        """Get the summary of the filtered leaks of a node and all its callees.
+
+        Returns:
+            A tuple (data leak count, cf leak count, max. leakage).
+        """
+        return self.getSubtreeSummary(call_hierarchy).filter(self.getFilterMask())[:3]
+
+    def hasFilteredLeaks(self, call_hierarchy):
+        """Check whether a node or one of its callees has leaks the filter lets through."""
+        return self.getSubtreeSummary(call_hierarchy).mask & self.getFilterMask() != 0
+
+    def computeSubtreeSummaries(self, call_hierarchy, refresh=False):
+        """Compute the subtree summaries below a node bottom-up.
+
+        Args:
+            call_hierarchy: Root of the subtree to compute
+            refresh: Also recompute the summaries of the single nodes
+        """
+        def computeNode(node):
+            if refresh:
+                self.flag_summaries.pop(id(node), None)
+            summary = self.getFlagSummary(node).copy()
+            for child in self.getChildNodes(node):
+                summary.add(self.subtree_summaries[id(child)])
+            self.subtree_summaries[id(node)] = summary
+
+        walkTree(call_hierarchy, self.getChildNodes, post=computeNode)
+
+    def propagateSummaryChange(self, call_hierarchy, old, new, notify=True):
+        """Update the subtree summaries from a node up to the root after a part of them changed.
+
+        Only the path to the root is visited, except for a decreased maximum
+        leakage, which requires a look at the siblings of the changed part.
+
+        Args:
+            call_hierarchy: First node whose subtree contains the change
+            old: Previous FlagSummary of the changed part
+            new: Updated FlagSummary of the changed part
+            notify: Emit dataChanged for each updated node
+        """
+        deltas = [(new.dataleaks[slot] - old.dataleaks[slot], new.cfleaks[slot] - old.cfleaks[slot])
+                  for slot in range(FLAG_SLOTS)]
+        old_max_leaks, new_max_leaks = old.max_leaks, new.max_leaks
+        node = call_hierarchy
+        while node is not None:
+            subtree = self.subtree_summaries.get(id(node))
+            if subtree is None:
+                # Everything above is recomputed on the next access anyway
+                return
+            max_leaks = list(subtree.max_leaks)
+            for slot, (dataleaks_delta, cfleaks_delta) in enumerate(deltas):
+                subtree.dataleaks[slot] += dataleaks_delta
+                subtree.cfleaks[slot] += cfleaks_delta
+                if new_max_leaks[slot] >= subtree.max_leaks[slot]:
+                    subtree.max_leaks[slot] = new_max_leaks[slot]
+                elif old_max_leaks[slot] >= subtree.max_leaks[slot]:
+                    subtree.max_leaks[slot] = self.getFlagSummary(node).max_leaks[slot]
+                    for child in self.getChildNodes(node):
+                        subtree.max_leaks[slot] = max(subtree.max_leaks[slot],
+                                                      self.subtree_summaries[id(child)].max_leaks[slot])
+            subtree.updateMask()
+            if max_leaks == subtree.max_leaks and not any(dataleaks_delta or cfleaks_delta
+                                                          for dataleaks_delta, cfleaks_delta in deltas):
+                return
+            if notify:
+                self.emitNodeChanged(node, 5, 7)
+            old_max_leaks, new_max_leaks = max_leaks, list(subtree.max_leaks)
+            node = node.parent
+
+    def updateNodes(self, nodes):
+        """Update the summaries after the flag of leaks of the given CallHistory nodes changed.
+
+        Costs O(depth) per node instead of recomputing the whole tree.
+        """
+        for node in nodes:
+            old = self.flag_summaries.pop(id(node), None)
+            new = self.getFlagSummary(node)
+            self.emitNodeChanged(node, 1, 4)
+            if old is not None:
+                self.propagateSummaryChange(node, old, new)
+
+    def refreshNodes(self, nodes):
+        """Update the summaries after the flags of leaks of many CallHistory nodes changed.
+
+        Unlike updateNodes, each changed node and each of its callers is
+        recomputed only once, bottom-up, which also keeps long call chains
+        linear. Views are not notified.
+
+        Args:
+            nodes: The changed CallHistory nodes
+        """
+        dirty = {}
+        for node in nodes:
+            self.flag_summaries.pop(id(node), None)
+            if not self.subtree_summaries:
+                # Everything is recomputed on the next access anyway
+                continue
+            while node is not None and id(node) not in dirty:
+                dirty[id(node)] = node
+                node = node.parent
+        # Number of dirty callees each dirty node has to wait for
+        pending = dict.fromkeys(dirty, 0)
+        for node in dirty.values():
+            if node.parent is not None:
+                pending[id(node.parent)] += 1
+        ready = [node for node in dirty.values() if pending[id(node)] == 0]
+        while ready:
+            node = ready.pop()
+            summary = self.getFlagSummary(node).copy()
+            for child in self.getChildNodes(node):
+                summary.add(self.subtree_summaries[id(child)])
+            self.subtree_summaries[id(node)] = summary
+            if node.parent is not None:
+                pending[id(node.parent)] -= 1
+                if pending[id(node.parent)] == 0:
+                    ready.append(node.parent)
+
+    def updateSubtree(self, call_hierarchy):
+        """Update the summaries after the flags of leaks below a node changed.
+
+        Recomputes the subtree of the node and propagates the change to the
+        root. Views are not notified, see emitItemsChanged.
+
+        Args:
+            call_hierarchy: Root of the changed subtree
+        """
+        subtree = self.subtree_summaries.get(id(call_hierarchy))
+        self.computeSubtreeSummaries(call_hierarchy, refresh=True)
+        if subtree is not None and call_hierarchy.parent is not None:
+            self.propagateSummaryChange(call_hierarchy.parent, subtree, self.subtree_summaries[id(call_hierarchy)],
+                                        notify=False)
+
+    def markLeaks(self, occurrences, flag_id, user_comment):
+        """Apply one flag and/or comment to many leak occurrences at once.
+
+        The annotation columns are written in one pass, the summaries of
+        the affected nodes are updated and views get a single notification.
+
+        Args:
+            occurrences: List of tuples (CallHistory, slot), see AnnotationStore.getOccurrences
+            flag_id: The flag to apply. Can be None to leave unchanged
+            user_comment: The comment to apply. Can be None to leave unchanged
+        """
+        slots = [slot for _, slot in occurrences]
+        if user_comment is not None:
+            self.annotations.setComments(slots, user_comment)
+        if flag_id is not None:
+            self.annotations.setFlags(slots, flag_id)
+            nodes = {id(node): node for node, _ in occurrences}
+            self.refreshNodes(nodes.values())
+            self.emitItemsChanged(self.node_items[node_id] for node_id in nodes if node_id in self.node_items)
+
+    def markSubtree(self, call_hierarchy, flag_id, user_comment):
+        """Apply one flag and/or comment to all leaks of a node and its callees, see markLeaks."""
+        slots = []
+        for node in self.iterNodes(call_hierarchy):
+            start, _, end = self.annotations.getNodeRange(node)
+            slots.extend(range(start, end))
+        if user_comment is not None:
+            self.annotations.setComments(slots, user_comment)
+        if flag_id is not None:
+            self.annotations.setFlags(slots, flag_id)
+            self.updateSubtree(call_hierarchy)
+            self.emitItemsChanged(self.getSubtreeItems(call_hierarchy))
+
+    def getSubtreeItems(self, call_hierarchy):
+        """Iterate over the created items of a node and its callees.
+
+        If the node has no item yet, only the item of its nearest displayed caller is returned.
+        """
+        node = call_hierarchy
+        while node is not None and id(node) not in self.node_items:
+            node = node.parent
+        if node is None:
+            return
+        item = self.node_items[id(node)]
+        if node is not call_hierarchy:
+            yield item
+        else:
+            yield from iterPreOrder(item, lambda item: item.child_items)
+
+    def emitItemsChanged(self, items):
+        """Notify views that the rows of items and their ancestors changed.
+
+        A single dataChanged is emitted if all rows share one parent item. Otherwise layoutChanged is
+        emitted once, because views handle one dataChanged per parent item much slower than a relayout.
+        """
+        ranges = {}  # ranges[id(parent item)] -> [parent item, first row, last row]
+        for item in items:
+            while item is not None and item is not self.root_item:
+                row = item.row()
+                parent_range = ranges.get(id(item.parent_item))
+                if parent_range is not None:
+                    parent_range[1] = min(parent_range[1], row)
+                    parent_range[2] = max(parent_range[2], row)
+                    # The ancestors were already added together with a sibling
+                    break
+                ranges[id(item.parent_item)] = [item.parent_item, row, row]
+                item = item.parent_item
+        if len(ranges) > 1:
+            # Rows neither move nor disappear, so persistent indexes stay valid
+            self.layoutAboutToBeChanged.emit()
+            self.layoutChanged.emit()
+            return
+        for parent_item, first_row, last_row in ranges.values():
+            self.dataChanged.emit(self.createIndex(first_row, 0, parent_item.child_items[first_row]),
+                                  self.createIndex(last_row, self.columnCount(None) - 1,
+                                                   parent_item.child_items[last_row]),
+                                  [Qt.DisplayRole, Qt.ToolTipRole, Qt.DecorationRole])
+
+    def emitNodeChanged(self, call_hierarchy, first_column, last_column):
+        item = self.node_items.get(id(call_hierarchy))
+        if item is not None and item is not self.root_item:
+            self.dataChanged.emit(self.createIndex(item.row(), first_column, item),
+                                  self.createIndex(item.row(), last_column, item),
+                                  [Qt.DisplayRole, Qt.ToolTipRole, Qt.DecorationRole])
+
+    @staticmethod
+    def formatCount(count):
+        return "" if count == 0 else str(count)
+
+    @staticmethod
+    def formatLeakage(max_leak_normalized):
+        return "%0.1f%%" % (max_leak_normalized * 100) if max_leak_normalized > 0.00 else ""
 
     # # # # # # # # # # # # #
     # OVERLOADED FUNCTIONS  #
@@ -77,36 +430,22 @@ class CallHierarchyModel(BaseTreeModel):
         if not index.isValid():
             return QVariant()
         item = index.internalPointer()
-        if role == Qt.DisplayRole or role == Qt.ToolTipRole or role == Qt.DecorationRole:
-            filtered_cf, filtered_dl = self.getFilteredLeaks(item)
-            filtered_all = list()
-            filtered_all.extend(filtered_cf)
-            filtered_all.extend(filtered_dl)
-            if role == Qt.DisplayRole or role == Qt.ToolTipRole:
-                if index.column() == 0:
-                    return item.data(Qt.DisplayRole)
-                elif index.column() == 1:
-                    dataleaks = len(filtered_dl)
-                    return "" if dataleaks == 0 else str(dataleaks)
-                elif index.column() == 2:
-                    cfleaks = len(filtered_cf)
-                    return "" if cfleaks == 0 else str(cfleaks)
-                elif index.column() == 3:
-                    txt = ""
-                    if len(filtered_all) > 0:
-                        max_leak_normalized = max( (l.status.max_leak_normalized() for l in filtered_all) )
-                        if max_leak_normalized > 0.00:
-                            txt = "%0.1f%%" % (max_leak_normalized * 100)
-                    return txt
-                else:
-                    return ""
-            elif role == Qt.DecorationRole:
-                if index.column() == 4:
-                    max_priority = LeakFlags.NONE
-                    for l in filtered_all:
-                        if max_priority < l.meta.flag:
-                            max_priority = l.meta.flag
-                    return getIconById(max_priority)
+        if role == Qt.DisplayRole or role == Qt.ToolTipRole:
+            if index.column() == 0:
+                return item.data(Qt.DisplayRole)
+            elif index.column() == 1 or index.column() == 2:
+                return self.formatCount(self.getAggregates(item.obj)[index.column() - 1])
+            elif index.column() == 3:
+                return self.formatLeakage(self.getAggregates(item.obj)[2])
+            elif index.column() == 5 or index.column() == 6:
+                return self.formatCount(self.getSubtreeAggregates(item.obj)[index.column() - 5])
+            elif index.column() == 7:
+                return self.formatLeakage(self.getSubtreeAggregates(item.obj)[2])
+            else:
+                return ""
+        elif role == Qt.DecorationRole:
+            if index.column() == 4:
+                return getIconById(self.getAggregates(item.obj)[3])
         elif role == CustomRole.Obj:
             item = index.internalPointer()
             return item.data(CustomRole.Obj)
@@ -145,37 +484,135 @@ class CallHierarchyModel(BaseTreeModel):
         else:
             parent_item = parent.internalPointer()
 
+        if parent_item is None:
+            return 0
         return len(parent_item.child_items)
 
+    def hasChildren(self, parent):
+        if parent.column() > 1:
+            return False
+
+        if not parent.isValid():
+            parent_item = self.root_item
+        else:
+            parent_item = parent.internalPointer()
+
+        if parent_item is None:
+            return False
+        if parent_item.fetched:
+            return len(parent_item.child_items) > 0
+        return len(parent_item.obj.children) > 0
+
+    def canFetchMore(self, parent):
+        item = parent.internalPointer() if parent.isValid() else self.root_item
+        return item is not None and not item.fetched
+
+    def fetchMore(self, parent):
+        item = parent.internalPointer() if parent.isValid() else self.root_item
+        if item is not None:
+            self.fetchChildren(item)
+
     def columnCount(self, parent):
-        return 5
+        return 8
 
     def headerData(self, section, orientation, role):
         if role == Qt.DisplayRole:
             if orientation == Qt.Horizontal:
-                return ["Call Hierarchy", "D", "CF", "leakage %", ""][section]
+                return ["Call Hierarchy", "D", "CF", "leakage %", "", "\u03a3 D", "\u03a3 CF", "\u03a3 leakage %"][section]
         elif role == Qt.ToolTipRole:
-            return ["Call stack information", "Filtered data differences (phase one)", "Filtered control-flow differences (phase one)", "Filtered max. leakage (phase two/three)", "Filtered Leaks"][section]
+            return ["Call stack information", "Filtered data differences (phase one)", "Filtered control-flow differences (phase one)", "Filtered max. leakage (phase two/three)", "Filtered Leaks",
+                    "Filtered data differences including all callees", "Filtered control-flow differences including all callees", "Filtered max. leakage including all callees"][section]
         return None
 
     # # # # # # # # #
     # MY FUNCTIONS  #
     # # # # # # # # #
 
-    def setupData(self, call_hierarchy, parent=None):
+    def setupData(self, call_hierarchy):
+        """Set the root of the call hierarchy. Items below the root are created on demand."""
+        self.node_items.clear()
+        self.flag_summaries.clear()
+        self.subtree_summaries.clear()
+        self.annotations = AnnotationStore()
         if call_hierarchy is None:
-            return None
+            self.root_item = None
+            return
+        self.root_item = CallHierarchyItem("Call Hierarchy", call_hierarchy)
+        self.node_items[id(call_hierarchy)] = self.root_item
+        # The model is being reset, so the top level items are created without notification
+        self.createChildItems(self.root_item, self.getChildNodes(call_hierarchy))
 
-        if call_hierarchy.parent is None:
-            self.root_item = CallHierarchyItem("Call Hierarchy", call_hierarchy)
+    def getChildNodes(self, call_hierarchy):
+        """Get the displayed children of a CallHistory node in display order."""
+        if call_hierarchy is self.root_item.obj:
+            # Only the first context of the root is displayed
             if len(call_hierarchy.children) > 0:
-                self.setupData(call_hierarchy.children[next(iter(call_hierarchy.children))], self.root_item)
-        else:
-            call_hierarchy_item = CallHierarchyItem("{}".format(getCtxName(call_hierarchy.ctxt.callee)),
-                                                    call_hierarchy, parent)
+                return [call_hierarchy.children[next(iter(call_hierarchy.children))]]
+            return []
+        return [call_hierarchy.children[k] for k in sorted_keys(call_hierarchy.children)]
+
+    def iterNodes(self, call_hierarchy=None):
+        """Iterate over all displayed CallHistory nodes in pre-order, without creating items.
+
+        Args:
+            call_hierarchy: First node, defaults to the root
+        """
+        if self.root_item is None:
+            return
+        yield from iterPreOrder(self.root_item.obj if call_hierarchy is None else call_hierarchy, self.getChildNodes)
+
+    def fetchChildren(self, item):
+        """Create the child items of item, if not done yet."""
+        if item.fetched:
+            return
+        nodes = self.getChildNodes(item.obj)
+        if len(nodes) == 0:
+            item.fetched = True
+            return
+        parent = QModelIndex() if item is self.root_item else self.createIndex(item.row(), 0, item)
+        self.beginInsertRows(parent, 0, len(nodes) - 1)
+        self.createChildItems(item, nodes)
+        self.endInsertRows()
 
-            parent.appendChild(call_hierarchy_item)
+    def createChildItems(self, item, nodes):
+        item.fetched = True
+        names = getCtxNames([node.ctxt.callee for node in nodes])
+        for node, name in zip(nodes, names):
+            child_item = CallHierarchyItem("{}".format(name), node, item)
+            item.appendChild(child_item)
+            self.node_items[id(node)] = child_item
+            if self.item_ids is not None:
+                self.item_ids[child_item.id] = child_item
 
-            parent = call_hierarchy_item
-            for k in sorted_keys(call_hierarchy.children):
-                self.setupData(call_hierarchy.children[k], parent)
+    def getItem(self, call_hierarchy):
+        """Get the item of a CallHistory node, creating it and its ancestors if necessary.
+
+        Returns:
+            The CallHierarchyItem or None if the node is not displayed.
+        """
+        path = []
+        node = call_hierarchy
+        item = self.node_items.get(id(node))
+        while item is None:
+            if node.parent is None:
+                return None
+            path.append(node)
+            node = node.parent
+            item = self.node_items.get(id(node))
+        for node in reversed(path):
+            self.fetchChildren(item)
+            item = self.node_items.get(id(node))
+            if item is None:
+                return None
+        return item
+
+    def getIndex(self, call_hierarchy, column=0):
+        """Get the index of a CallHistory node, see getItem.
+
+        Returns:
+            A QModelIndex or None if the node is not displayed.
+        """
+        item = self.getItem(call_hierarchy)
+        if item is None or item is self.root_item:
+            return None
+        return self.createIndex(item.row(), column, item)
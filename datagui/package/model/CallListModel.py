@@ -20,20 +20,20 @@ along with this program. If not, see <https://www.gnu.org/licenses/>.
 
 import copy
 
-from PyQt5.QtCore import QModelIndex, QVariant, Qt
-from PyQt5.QtGui import QStandardItem
+from PyQt5.QtCore import QVariant, Qt
+from datastub.leaks import CallHistory
 
 from datagui.package import utils
-from datagui.package.model.BaseTreeModel import BaseTreeModel
-from datagui.package.model.CallHierarchyModel import CallHierarchyItem
-from datagui.package.utils import CustomRole, CustomType, LeakFlags, getIconById
+from datagui.package.model.BaseListModel import BaseListModel
+from datagui.package.utils import CustomRole, CustomType, LeakFlags, getIconById, getCtxName
 
 
-class CallListItem(QStandardItem):
-    def __init__(self, name, call_item=None, leak=None, parent=None):
-        super(CallListItem, self).__init__()
+class CallListItem:
+    __slots__ = ('name', 'call_hierarchy', 'leak', 'parent_item')
+
+    def __init__(self, name, call_hierarchy=None, leak=None, parent=None):
         self.name = name
-        self.call_item = call_item
+        self.call_hierarchy = call_hierarchy
         self.leak = leak
         self.parent_item = parent
 
@@ -49,15 +49,13 @@ class CallListItem(QStandardItem):
     def parent(self):
         return self.parent_item
 
-class CallListModel(BaseTreeModel):
+class CallListModel(BaseListModel):
 
     def __init__(self):
-        super(CallListModel, self).__init__()
+        super(CallListModel, self).__init__(CallListItem("No leaks visible."))
         self.name = ""
-        self.items = []
         self.root_item = None
         self.parent = None
-        self.none_item = CallListItem("No leaks visible.")
 
     # # # # # # # # # # # # #
     # OVERLOADED FUNCTIONS  #
@@ -90,29 +88,6 @@ class CallListModel(BaseTreeModel):
                   return utils.getIconById(LeakFlags.INFO)
         return QVariant()
 
-    def index(self, row, column, parent):
-        if not self.hasIndex(row, column, parent):
-            return QModelIndex()
-
-        if len(self.items) == 0:
-            # We're empty. Display none_item
-            item = self.none_item
-        else:
-            item = self.items[row]
-
-        if item:
-            return self.createIndex(row, column, item)
-        else:
-            return QModelIndex()
-
-    def rowCount(self, parent):
-        if parent.column() > 0:
-            return 0
-        if len(self.items) == 0:
-            # We're empty. Display none_item
-            return 1
-        return len(self.items)
-
     def columnCount(self, parent):
         if parent.isValid():
             return 0
@@ -123,39 +98,33 @@ class CallListModel(BaseTreeModel):
     # MY FUNCTIONS  #
     # # # # # # # # #
 
-    def getCallPath(self, call_item):
-        rec_iterator = call_item
+    def getCallPath(self, call_hierarchy):
+        rec_iterator = call_hierarchy
 
         function_names = []
-        assert call_item.parent_item is not None
-        while rec_iterator.parent_item:
-            function_name = rec_iterator.name.split(" ")[-1].split("(")[0]
+        assert call_hierarchy.parent is not None
+        while rec_iterator.parent:
+            function_name = getCtxName(rec_iterator.ctxt.callee).split(" ")[-1].split("(")[0]
             function_names.insert(0, function_name)
-            rec_iterator = rec_iterator.parent_item
+            rec_iterator = rec_iterator.parent
         return '/'.join(function_names)
 
-    def appendItem(self, call_item, leak):
-        # Generate long path-prefixed name
-        assert isinstance(call_item, CallHierarchyItem)
-        call_path = self.getCallPath(call_item)
-        item = CallListItem(call_path, call_item, leak)
-
-        # Add item to list
-        parent = QModelIndex()
-        row_count = self.rowCount(parent)
-        self.beginInsertRows(parent, row_count, row_count + 1)
-        self.items.append(item)
-        self.endInsertRows()
-
-        # Set header of CallList. Since every leak yields the same name
-        # we can overwrite it for each new item
-        self.name = utils.leakToStr(leak)
-        self.root_item = CallListItem(self.name)
-        self.parent = self.root_item
-
-    def clearList(self):
-        parent = QModelIndex()
-        row_count = self.rowCount(parent)
-        self.beginRemoveRows(QModelIndex(), 0, row_count - 1)
-        self.items.clear()
-        self.endRemoveRows()
+    def setCalls(self, calls, chunk_size=None):
+        """Replace the list by the given call contexts of a leak.
+
+        Args:
+            calls: List of tuples (CallHistory, leak in this context)
+            chunk_size: See BaseListModel.setItems
+        """
+        items = []
+        for call_hierarchy, leak in calls:
+            # Generate long path-prefixed name
+            assert isinstance(call_hierarchy, CallHistory)
+            items.append(CallListItem(self.getCallPath(call_hierarchy), call_hierarchy, leak))
+
+        if len(calls) > 0:
+            # Set header of CallList. Every leak yields the same name
+            self.name = utils.leakToStr(calls[0][1])
+            self.root_item = CallListItem(self.name)
+            self.parent = self.root_item
+        self.setItems(items, chunk_size)
@@ -18,16 +18,16 @@ along with this program. If not, see <https://www.gnu.org/licenses/>.
 
 """
 
-from PyQt5.QtCore import QModelIndex, Qt, QVariant
-from PyQt5.QtGui import QStandardItem
+from PyQt5.QtCore import Qt, QVariant
 
-from datagui.package.model.BaseTreeModel import BaseTreeModel
+from datagui.package.model.BaseListModel import BaseListModel
 from datagui.package.utils import CustomRole, CustomType, getIconById
 
 
-class LeakItem(QStandardItem):
+class LeakItem:
+    __slots__ = ('name', 'leak', 'parent_item', 'high_prio_flag')
+
     def __init__(self, name, leak=None, parent=None):
-        super(LeakItem, self).__init__()
         self.name = name
         self.leak = leak
         self.parent_item = parent
@@ -40,12 +40,11 @@ class LeakItem(QStandardItem):
         return self.parent_item
 
 
-class LeakModel(BaseTreeModel):
+class LeakModel(BaseListModel):
     def __init__(self):
-        super(LeakModel, self).__init__()
+        super(LeakModel, self).__init__(LeakItem("No leaks to display", None))
         self.header = "Leaks"
-        self.none_item = LeakItem("No leaks to display", None)
-        self.items = []
+        self.ip_rows = {}  # ip_rows[ip] -> first row of a leak with this ip
 
     # # # # # # # # # # # # #
     # OVERLOADED FUNCTIONS  #
@@ -73,46 +72,49 @@ class LeakModel(BaseTreeModel):
             return getIconById(item.high_prio_flag)
         return QVariant()
 
-    def index(self, row, column, parent):
-        if not self.hasIndex(row, column, parent):
-            return QModelIndex()
-        if len(self.items) == 0:
-            # We're empty. Display none_item
-            item = self.none_item
-        else:
-            item = self.items[row]
-        if item:
-            return self.createIndex(row, column, item)
-        else:
-            return QModelIndex()
-
-    def rowCount(self, parent):
-        if parent.isValid():
-            return 0
-        if len(self.items) == 0:
-            # We're empty. Display none_item
-            return 1
-        return len(self.items)
-
     # # # # # # # # #
     # MY FUNCTIONS  #
     # # # # # # # # #
 
-    def appendItem(self, item):
-        assert isinstance(item, LeakItem)
-        parent = QModelIndex()
-        row_count = self.rowCount(parent)
-        self.beginInsertRows(parent, row_count, row_count + 1)
-        self.items.append(item)
-        self.endInsertRows()
-
-    def clearList(self):
-        parent = QModelIndex()
-        row_count = self.rowCount(parent)
-        self.beginRemoveRows(QModelIndex(), 0, row_count - 1)
-        self.items.clear()
-        self.endRemoveRows()
-
-    def updateFlag(self, index, flag_id):
-        self.items[index.row()].high_prio_flag = flag_id
-        self.dataChanged.emit(index, index, [Qt.DecorationRole])
+    def setItems(self, items, chunk_size=None):
+        self.ip_rows = {}
+        for row, item in enumerate(items):
+            assert isinstance(item, LeakItem)
+            if item.leak is not None and item.leak.ip not in self.ip_rows:
+                self.ip_rows[item.leak.ip] = row
+        super(LeakModel, self).setItems(items, chunk_size)
+
+    def getIndexByIp(self, ip):
+        """Get the index of the first leak with the given ip.
+
+        Pending items up to this leak are inserted first.
+
+        Returns:
+            A QModelIndex or None if no leak with this ip is listed.
+        """
+        row = self.ip_rows.get(ip)
+        if row is None:
+            return None
+        self.insertPending(row + 1 - len(self.items))
+        return self.createIndex(row, 0, self.items[row])
+
+    def getItem(self, row):
+        """Get an inserted or pending item."""
+        return self.items[row] if row < len(self.items) else self.pending[row - len(self.items)]
+
+    def updateFlags(self, flags):
+        """Update the flag icons of several leaks with a single dataChanged.
+
+        Args:
+            flags: Dict mapping leak ips to their new flag. Ips which are not listed are ignored
+        """
+        rows = []
+        for ip, flag_id in flags.items():
+            row = self.ip_rows.get(ip)
+            if row is not None:
+                self.getItem(row).high_prio_flag = flag_id
+                if row < len(self.items):
+                    rows.append(row)
+        if rows:
+            self.dataChanged.emit(self.createIndex(min(rows), 0, self.items[min(rows)]),
+                                  self.createIndex(max(rows), 0, self.items[max(rows)]), [Qt.DecorationRole])
@@ -27,11 +27,12 @@ from datagui.package.utils import CustomType, CustomRole
 
 
 class LibHierarchyItem(BaseTreeItem):
-    id = -1
+    __slots__ = ('id',)
+    last_id = -1
 
     def __init__(self, name, obj=None, parent=None):
         super(LibHierarchyItem, self).__init__(name, obj, parent)
-        self.id = LibHierarchyItem.id = LibHierarchyItem.id + 1
+        self.id = LibHierarchyItem.last_id = LibHierarchyItem.last_id + 1
 
     def type(self):
         return CustomType.LibHierarchyItem
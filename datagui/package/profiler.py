@@ -0,0 +1,196 @@
+"""
+Copyright (C) 2018 IAIK TU Graz (data@iaik.tugraz.at)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+@version 1.2
+
+"""
+
+import os
+import json
+import atexit
+import time
+import threading
+import tracemalloc
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from datagui.package.utils import debug, atomicWrite
+
+PROFILE_ENV = "DATAGUI_PROFILE"  # Enables profiling; value is the report path or "1" for the default path
+PROFILE_MEMORY_ENV = "DATAGUI_PROFILE_MEMORY"  # Set to "1" to also trace the peak memory of each stage
+DEFAULT_PROFILE_PATH = "datagui_profile.json"
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class _Stage:
+    """Measures a single execution of a named stage, see Profiler.stage."""
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.peak = 0
+
+    def __enter__(self):
+        self.profiler.enterStage(self)
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, *args):
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+        self.profiler.exitStage(self, wall, cpu)
+        return False
+
+
+class Profiler(QObject):
+    """Records wall time, CPU time and optionally peak memory of named stages.
+
+    Stages can be nested and can run in the loader thread. The report is
+    written as JSON once on exit. Profiling is disabled by default, in
+    which case stage() costs a single attribute check. Memory tracing
+    slows down all allocations and is therefore enabled separately.
+    """
+
+    recorded = pyqtSignal(str)  # Summary of a finished outermost stage, for the status bar
+
+    def __init__(self):
+        super(Profiler, self).__init__()
+        self.enabled = False
+        self.trace_memory = False
+        self.report_path = None
+        self.records = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.null_stage = _NullStage()
+
+    def enable(self, report_path=DEFAULT_PROFILE_PATH, trace_memory=False):
+        """Start profiling and write the report to report_path on exit.
+
+        Args:
+            report_path: Path of the JSON report
+            trace_memory: Also measure the peak memory of each stage with tracemalloc
+        """
+        if not self.enabled:
+            atexit.register(self.writeReport)
+        self.enabled = True
+        self.trace_memory = trace_memory
+        self.report_path = os.path.abspath(report_path)
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        debug(0, "[Profile] Writing profile to %s on exit", self.report_path)
+
+    def stage(self, name):
+        """Context manager measuring the enclosed code as stage name."""
+
+        if not self.enabled:
+            return self.null_stage
+        return _Stage(self, name)
+
+    def getStack(self):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def enterStage(self, stage):
+        stack = self.getStack()
+        if self.trace_memory:
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, tracemalloc.get_traced_memory()[1])
+            stage.start_memory = tracemalloc.get_traced_memory()[0]
+            self.resetPeak()
+        stack.append(stage)
+
+    def exitStage(self, stage, wall, cpu):
+        stack = self.getStack()
+        stack.pop()
+        record = {
+            'stage': stage.name,
+            'parent': stack[-1].name if stack else None,
+            'thread': threading.current_thread().name,
+            'wall_s': wall,
+            'cpu_s': cpu,
+        }
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            stage.peak = max(stage.peak, peak)
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, stage.peak)
+            record['peak_bytes'] = max(stage.peak - stage.start_memory, 0)
+            record['memory_delta_bytes'] = current - stage.start_memory
+        with self.lock:
+            self.records.append(record)
+        if not stack:
+            self.recorded.emit(self.formatRecord(record))
+
+    @staticmethod
+    def resetPeak():
+        # tracemalloc.reset_peak is only available from Python 3.9 on.
+        # Without it, peaks are measured since the start of profiling.
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+
+    @staticmethod
+    def formatRecord(record):
+        text = "Profile: {} {:.1f} ms wall, {:.1f} ms CPU".format(record['stage'], record['wall_s'] * 1000,
+                                                                  record['cpu_s'] * 1000)
+        if 'peak_bytes' in record:
+            text += ", peak {:.1f} MiB".format(record['peak_bytes'] / (1 << 20))
+        return text
+
+    def summary(self):
+        """Aggregate all records by stage name."""
+
+        stages = {}
+        with self.lock:
+            records = list(self.records)
+        for record in records:
+            entry = stages.setdefault(record['stage'], {'count': 0, 'wall_s': 0.0, 'cpu_s': 0.0,
+                                                        'max_wall_s': 0.0, 'max_peak_bytes': 0})
+            entry['count'] += 1
+            entry['wall_s'] += record['wall_s']
+            entry['cpu_s'] += record['cpu_s']
+            entry['max_wall_s'] = max(entry['max_wall_s'], record['wall_s'])
+            entry['max_peak_bytes'] = max(entry['max_peak_bytes'], record.get('peak_bytes', 0))
+        return stages, records
+
+    def writeReport(self):
+        """Write all records and their summary to the report."""
+
+        stages, records = self.summary()
+        try:
+            with atomicWrite(self.report_path, 'w') as f:
+                json.dump({'stages': stages, 'records': records}, f, indent=2, sort_keys=True)
+        except Exception as e:
+            debug(0, "[Profile] Unable to write %s: %s", (self.report_path, str(e)))
+
+
+profiler = Profiler()
+
+
+def enableFromEnvironment():
+    """Enable profiling if the environment variable DATAGUI_PROFILE is set, see also DATAGUI_PROFILE_MEMORY."""
+
+    value = os.environ.get(PROFILE_ENV)
+    if value:
+        profiler.enable(DEFAULT_PROFILE_PATH if value == "1" else value, os.environ.get(PROFILE_MEMORY_ENV) == "1")
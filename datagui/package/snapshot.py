@@ -0,0 +1,189 @@
+"""
+Copyright (C) 2018 IAIK TU Graz (data@iaik.tugraz.at)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+@version 1.2
+
+"""
+
+import os
+import pickle
+import struct
+import hashlib
+from array import array
+from datastub.export import loadpickle
+from datastub.leaks import CallHistory, Context
+
+from datagui.package.utils import debug, atomicWrite, packArrays, unpackArrays, unpackHeader
+
+# Snapshot layout:
+#   header
+#   one pickled record per call hierarchy node, in breadth-first order
+#   node table: parallel arrays with one entry per node (see _tables)
+# Children of a node are stored consecutively, such that the table only
+# needs the id of the first child and the number of children.
+
+SNAPSHOT_SUFFIX = ".snapshot"
+SNAPSHOT_MAGIC = b"DATASNAP"
+SNAPSHOT_VERSION = 1
+
+_header = struct.Struct("<8sIQQ20s")  # magic, version, number of nodes, offset of node table, digest
+_tables = (('offsets', 'Q'), ('lengths', 'Q'), ('callers', 'Q'), ('callees', 'Q'),
+           ('child_starts', 'Q'), ('child_counts', 'Q'))
+
+
+def isSnapshot(path):
+    """Check whether path is a snapshot file instead of a gzip pickle."""
+
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC
+    except OSError:
+        return False
+
+
+def getSnapshotPath(pickle_path):
+    root, ext = os.path.splitext(pickle_path)
+    return (root if ext == ".pickle" else pickle_path) + SNAPSHOT_SUFFIX
+
+
+def storeSnapshot(path, call_hierarchy):
+    """Write call_hierarchy as snapshot to path."""
+
+    nodes = [call_hierarchy]
+    keys = [None]
+    tables = {name: array(typecode) for name, typecode in _tables}
+    sha = hashlib.sha1()
+
+    with atomicWrite(path) as f:
+        f.write(b"\0" * _header.size)
+        offset = _header.size
+        i = 0
+        while i < len(nodes):
+            node = nodes[i]
+            tables['child_starts'].append(len(nodes))
+            tables['child_counts'].append(len(node.children))
+            for key, child in node.children.items():
+                nodes.append(child)
+                keys.append(key)
+
+            attrs = {name: value for name, value in node.__dict__.items() if name not in ('children', 'parent')}
+            record = pickle.dumps(attrs, protocol=pickle.HIGHEST_PROTOCOL)
+            f.write(record)
+            sha.update(record)
+            tables['offsets'].append(offset)
+            tables['lengths'].append(len(record))
+            tables['callers'].append(0 if keys[i] is None else keys[i].caller)
+            tables['callees'].append(0 if keys[i] is None else keys[i].callee)
+            offset += len(record)
+            i += 1
+
+        data = packArrays(tables[name] for name, _ in _tables)
+        f.write(data)
+        sha.update(data)
+
+        f.seek(0)
+        f.write(_header.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(nodes), offset, sha.digest()))
+    debug(1, "[Snapshot] Stored %d nodes in %s", (len(nodes), path))
+    return len(nodes)
+
+
+class Snapshot:
+    """Snapshot file, see storeSnapshot.
+
+    Opening only reads the header and the node table. The nodes are
+    loaded by loadRoot, which unpickles them one by one. This avoids
+    decompressing and the recursion of pickle on deep call hierarchies,
+    but the whole call hierarchy still ends up in memory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.f = open(path, 'rb')
+        try:
+            self.readTables()
+        except Exception:
+            self.close()
+            raise
+
+    def readTables(self):
+        fields = unpackHeader(_header, self.f.read(_header.size), SNAPSHOT_MAGIC, SNAPSHOT_VERSION)
+        if fields is None:
+            raise ValueError("Unsupported snapshot file " + self.path)
+        self.node_count, table_offset, self.digest = fields
+
+        self.f.seek(table_offset)
+        arrays, _ = unpackArrays(self.f.read(), 0, [typecode for _, typecode in _tables], self.node_count)
+        for (name, _), values in zip(_tables, arrays):
+            setattr(self, name, values)
+
+    def getContext(self, node_id):
+        return Context(self.callers[node_id], self.callees[node_id])
+
+    def loadNode(self, node_id, parent):
+        self.f.seek(self.offsets[node_id])
+        attrs = pickle.loads(self.f.read(self.lengths[node_id]))
+        node = CallHistory.__new__(CallHistory)
+        node.__dict__.update(attrs)
+        node.parent = parent
+        node.children = {}
+        return node
+
+    def loadRoot(self, callback=None):
+        """Load all nodes and close the snapshot.
+
+        Args:
+            callback: Optional callable receiving the fraction of loaded nodes
+
+        Returns:
+            The root CallHistory.
+        """
+        parents = [None] * self.node_count
+        try:
+            for node_id in range(self.node_count):
+                parent = parents[node_id]
+                node = self.loadNode(node_id, parent)
+                if parent is None:
+                    root = node
+                else:
+                    parent.children[self.getContext(node_id)] = node
+                first_child = self.child_starts[node_id]
+                for child_id in range(first_child, first_child + self.child_counts[node_id]):
+                    parents[child_id] = node
+                parents[node_id] = None
+                if callback:
+                    callback((node_id + 1) / self.node_count)
+        finally:
+            self.close()
+        return root
+
+    def close(self):
+        self.f.close()
+
+
+def convertPickle(pickle_path, snapshot_path=None):
+    """Convert a result pickle into a snapshot.
+
+    Returns:
+        The path of the snapshot.
+    """
+
+    if snapshot_path is None:
+        snapshot_path = getSnapshotPath(pickle_path)
+    call_hierarchy = loadpickle(pickle_path)
+    if not call_hierarchy:
+        raise IOError("Empty pickle file: " + pickle_path)
+    storeSnapshot(snapshot_path, call_hierarchy)
+    return snapshot_path
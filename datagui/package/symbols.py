@@ -0,0 +1,257 @@
+"""
+Copyright (C) 2018 IAIK TU Graz (data@iaik.tugraz.at)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+@version 1.2
+
+"""
+
+import os
+import struct
+import pickle
+import zipfile
+from array import array
+from bisect import bisect_right
+from datastub.SymbolInfo import SymbolInfo, Symbol, Image
+
+from datagui.package.utils import debug, atomicWrite, packArrays, unpackArrays, unpackHeader
+
+SYMBOL_CACHE_SUFFIX = ".symcache"
+SYMBOL_CACHE_MAGIC = b"DATASYMC"
+SYMBOL_CACHE_VERSION = 1
+
+_header = struct.Struct("<8sIIQI")  # magic, version, allsyms.txt CRC32, allsyms.txt size, number of symbols
+_typecodes = ('Q', 'Q', 'I', 'I', 'i', 'B')  # addrs, sizes, name ids, type ids, image ids, islibstart
+
+
+class SymbolIndex:
+    """Sorted symbol table of allsyms.txt, kept in parallel arrays.
+
+    Replaces the SortedCollection of datastub.SymbolInfo, which needs a
+    find_le and a list insert per symbol while parsing. The index only
+    provides the part of the SortedCollection interface SymbolInfo uses
+    for lookups, i.e., find_le and iteration. Symbol objects are only
+    created for symbols that are actually looked up.
+    """
+
+    def __init__(self):
+        self.addrs = array(_typecodes[0])
+        self.sizes = array(_typecodes[1])
+        self.name_ids = array(_typecodes[2])
+        self.type_ids = array(_typecodes[3])
+        self.img_ids = array(_typecodes[4])  # -1 if the symbol has no image
+        self.islibstart = array(_typecodes[5])
+        self.names = []  # names[name_id] -> tuple of symbol names
+        self.types = []  # types[type_id] -> symbol type
+        self.images = []  # images[img_id] -> Image
+        self.symbols = []  # symbols[i] -> Symbol or None if not created yet
+
+    def __len__(self):
+        return len(self.addrs)
+
+    @classmethod
+    def parse(cls, f):
+        """Parse allsyms.txt and sort the symbols once.
+
+        Symbols sharing an address are merged the same way
+        SymbolInfo.insert_update_symbol merges them.
+        """
+
+        images = []
+        entries = {}  # entries[addr] -> list of [size, type, names, img_id, islibstart], in the order of SymbolInfo.symbols
+        img_id = -1
+        line = f.readline().strip()
+        while line != "":
+            if line == "Image:":
+                imgname = f.readline().strip()
+                nextline = f.readline()
+                if "dynamic" in nextline:
+                    dynamic = True
+                    nextline = f.readline()
+                elif "static" in nextline:
+                    dynamic = False
+                    nextline = f.readline()
+                else:
+                    # Same assumption as SymbolInfo: first image is static, others are dynamic
+                    dynamic = len(images) > 0
+                lower, upper = [int(hx, 16) for hx in nextline.split(":")]
+                img_id = len(images)
+                images.append(Image(imgname, lower, upper, dynamic))
+                entries.setdefault(lower, []).insert(0, [upper - lower, '', [], img_id, 1])
+            else:
+                data = line.split(":")
+                if len(data) == 2:
+                    addr, name = data
+                    size = 0
+                    stype = "t"
+                else:
+                    assert len(data) == 4
+                    addr, size, name, stype = data
+                    size = int(size, 16)
+                addr = int(addr, 16)
+                entry = entries.get(addr)
+                if entry is not None:
+                    csym = entry[-1]
+                    if size > csym[0]:
+                        csym[0] = size
+                    csym[1] = stype
+                    if name and name not in csym[2]:
+                        csym[2].append(name)
+                    if csym[3] < 0 or img_id < 0:
+                        # Symbols before the first image have no image, see getSymbol
+                        assert csym[3] == img_id
+                    else:
+                        assert images[csym[3]] == images[img_id]
+                else:
+                    entries[addr] = [[size, stype, [name] if name else [], img_id, 0]]
+            line = f.readline().strip()
+
+        index = cls()
+        index.images = images
+        name_ids = {}
+        type_ids = {}
+        for addr in sorted(entries):
+            for size, stype, names, img_id, islibstart in entries[addr]:
+                names = tuple(names)
+                name_id = name_ids.get(names)
+                if name_id is None:
+                    name_id = name_ids[names] = len(index.names)
+                    index.names.append(names)
+                type_id = type_ids.get(stype)
+                if type_id is None:
+                    type_id = type_ids[stype] = len(index.types)
+                    index.types.append(stype)
+                index.addrs.append(addr)
+                index.sizes.append(size)
+                index.name_ids.append(name_id)
+                index.type_ids.append(type_id)
+                index.img_ids.append(img_id)
+                index.islibstart.append(islibstart)
+        index.symbols = [None] * len(index.addrs)
+        return index
+
+    def getSymbol(self, i):
+        sym = self.symbols[i]
+        if sym is None:
+            img_id = self.img_ids[i]
+            sym = Symbol(self.addrs[i], self.sizes[i], "", None if img_id < 0 else self.images[img_id],
+                         self.types[self.type_ids[i]], bool(self.islibstart[i]))
+            sym.name = list(self.names[self.name_ids[i]])
+            self.symbols[i] = sym
+        return sym
+
+    def find_le(self, addr):
+        """Return (addr, Symbol) of the last symbol at or below addr, like SortedCollection.find_le."""
+
+        i = bisect_right(self.addrs, addr)
+        if i:
+            return self.addrs[i - 1], self.getSymbol(i - 1)
+        raise ValueError('No item found with key at or below: %r' % (addr,))
+
+    def lookup(self, addr):
+        """Return the Symbol of addr or None, like SymbolInfo.lookup once the index is installed."""
+
+        i = bisect_right(self.addrs, addr)
+        return self.getSymbol(i - 1) if i else None
+
+    def __iter__(self):
+        for i in range(len(self.addrs)):
+            yield self.addrs[i], self.getSymbol(i)
+
+    def toBytes(self, crc, size):
+        images = [(img.name, img.lower, img.upper, img.dynamic) for img in self.images]
+        tables = pickle.dumps((self.names, self.types, images), protocol=pickle.HIGHEST_PROTOCOL)
+        return _header.pack(SYMBOL_CACHE_MAGIC, SYMBOL_CACHE_VERSION, crc, size, len(self.addrs)) + \
+            packArrays((self.addrs, self.sizes, self.name_ids, self.type_ids, self.img_ids, self.islibstart)) + tables
+
+    @classmethod
+    def fromBytes(cls, data, crc, size):
+        """Counterpart of toBytes.
+
+        Returns:
+            The SymbolIndex or None if data does not belong to an allsyms.txt with the given CRC32 and size.
+        """
+
+        fields = unpackHeader(_header, data, SYMBOL_CACHE_MAGIC, SYMBOL_CACHE_VERSION)
+        if fields is None:
+            return None
+        cached_crc, cached_size, count = fields
+        if cached_crc != crc or cached_size != size:
+            return None
+        index = cls()
+        arrays, offset = unpackArrays(data, _header.size, _typecodes, count)
+        index.addrs, index.sizes, index.name_ids, index.type_ids, index.img_ids, index.islibstart = arrays
+        index.names, index.types, images = pickle.loads(data[offset:])
+        index.images = [Image(*img) for img in images]
+        index.symbols = [None] * count
+        return index
+
+
+def installSymbolIndex(index):
+    """Make index the symbol table behind SymbolInfo.lookup.
+
+    Views look up symbols while they are painted, so this is only called on the GUI thread.
+    """
+
+    info = SymbolInfo.__new__(SymbolInfo)
+    info.images = index.images
+    info.symbols = index
+    SymbolInfo.instance = info
+
+
+def getSymbolCachePath(zip_path):
+    return zip_path + SYMBOL_CACHE_SUFFIX
+
+
+def loadSymbolIndex(datafs, zip_path, fileobj_wrapper=None):
+    """Load the symbol table of a framework.zip.
+
+    The parsed table is stored in a sidecar next to the zip file and is
+    reused as long as allsyms.txt does not change.
+
+    Args:
+        datafs: The opened framework.zip.
+        zip_path: Path of framework.zip.
+        fileobj_wrapper: Optional callable wrapping the allsyms.txt file object, e.g., for progress reports.
+
+    Returns:
+        The SymbolIndex.
+    """
+
+    member = os.path.join(datafs.cwd, "allsyms.txt").lstrip("/")
+    with zipfile.ZipFile(zip_path) as z:
+        info = z.getinfo(member)
+    crc, size = info.CRC, info.file_size
+
+    cache_path = getSymbolCachePath(zip_path)
+    if os.path.isfile(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                index = SymbolIndex.fromBytes(f.read(), crc, size)
+            if index is not None:
+                debug(1, "[Symbols] Using symbol cache %s", cache_path)
+                return index
+        except Exception as e:
+            debug(0, "[Symbols] Ignoring unusable symbol cache %s: %s", (cache_path, str(e)))
+
+    with datafs.get_file("allsyms.txt") as f:
+        index = SymbolIndex.parse(fileobj_wrapper(f, size) if fileobj_wrapper else f)
+
+    try:
+        with atomicWrite(cache_path) as f:
+            f.write(index.toBytes(crc, size))
+    except Exception as e:
+        debug(0, "[Symbols] Unable to write symbol cache %s: %s", (cache_path, str(e)))
+    return index
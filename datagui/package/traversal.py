@@ -0,0 +1,80 @@
+"""
+Copyright (C) 2018 IAIK TU Graz (data@iaik.tugraz.at)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+@version 1.2
+
+"""
+
+# Return values of the callbacks of walkTree
+SKIP = 1  # Do not visit the children of this node
+STOP = 2  # End the walk
+
+
+def walkTree(root, get_children, pre=None, post=None):
+    """Walk a tree depth-first with an explicit stack instead of recursion.
+
+    Args:
+        root: First node
+        get_children: Function returning the children of a node as list, in visiting order
+        pre: Optional function called for each node before its children. It may return SKIP or STOP
+        post: Optional function called for each node after its children, including skipped ones. It may return STOP
+
+    Returns:
+        False if a callback returned STOP, True otherwise.
+    """
+    if post is None:
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if pre is not None:
+                action = pre(node)
+                if action == STOP:
+                    return False
+                if action == SKIP:
+                    continue
+            stack.extend(reversed(get_children(node)))
+        return True
+
+    # Nodes are pushed twice, once to visit them and once more to finish them after their children
+    stack = [(root, False)]
+    while stack:
+        node, finish = stack.pop()
+        if not finish and pre is not None:
+            action = pre(node)
+            if action == STOP:
+                return False
+            finish = action == SKIP
+        if finish:
+            if post(node) == STOP:
+                return False
+            continue
+        stack.append((node, True))
+        stack.extend((child, False) for child in reversed(get_children(node)))
+    return True
+
+
+def iterPreOrder(root, get_children):
+    """Iterate over a tree in pre-order without recursion. Stop iterating to end the walk early.
+
+    Args:
+        root: First node
+        get_children: Function returning the children of a node as list, in visiting order
+    """
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(get_children(node)))
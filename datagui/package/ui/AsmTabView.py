@@ -88,6 +88,23 @@ class AsmTabView(ZoomTabView):
         editor.setCursorPosition(line_nr, 0)
         editor.setFocus()
 
+    def fillIndicator(self, editor, line_nr, indicator):
+        """Highlight the address within line line_nr.
+
+        Args:
+            indicator: Tuple (column, length) of the address taken from the
+                asm index, or the search string 'addr:' for zip files without
+                asm index.
+        """
+
+        if isinstance(indicator, tuple):
+            line_index, length = indicator
+        else:
+            line_index = editor.text(line_nr).find(indicator)
+            length = len(indicator) - 1
+        start_pos = editor.positionFromLineIndex(line_nr, line_index)
+        editor.SendScintilla(QsciScintilla.SCI_INDICATORFILLRANGE, start_pos, length)
+
     def marginLeftClick(self, margin_nr, line_nr, state):
         debug(5, "[ASM] marginLeftClick\n\tmargin_nr: %d, line_nr: %d, state: %d", (margin_nr, line_nr, state))
 
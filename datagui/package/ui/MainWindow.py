@@ -23,10 +23,11 @@ import datetime
 import fs
 
 from PyQt5.Qsci import QsciScintilla
-from PyQt5.QtCore import Qt, QVariant, QModelIndex, QItemSelectionModel, QSize
+from PyQt5.QtCore import Qt, QVariant, QModelIndex, QItemSelectionModel, QSize, QTimer
 from PyQt5.QtGui import QBrush, QColor, QIcon, QPalette, QFont
 from PyQt5.QtWidgets import QMainWindow, QFrame, QSplitter, QHBoxLayout, QAction, QApplication, QTabWidget, \
-    QTreeView, QMenu, QStackedWidget, QDialog, QFileDialog, QInputDialog, QStyle, QMessageBox, QHeaderView
+    QTreeView, QMenu, QStackedWidget, QDialog, QFileDialog, QInputDialog, QStyle, QMessageBox, QHeaderView, \
+    QProgressDialog
 from datastub.export import *
 from datastub.DataFS import *
 from datastub.IpInfoShort import *
@@ -35,17 +36,25 @@ from datastub.leaks import Library, FunctionLeak, DataLeak, CFLeak, CallHistory,
 from datastub.utils import sorted_keys
 
 from datagui import DATAGUI_VERSION
-from datagui.package import utils
+from datagui.package import cache, utils
+from datagui.package.autosave import AutosaveWriter, getAutosavePath, loadAutosave, removeAutosave
 from datagui.package.model.CallHierarchyModel import CallHierarchyModel, CallHierarchyItem
 from datagui.package.model.CallListModel import CallListModel, CallListItem
 from datagui.package.model.LeakModel import LeakModel, LeakItem
 from datagui.package.model.LibHierarchyModel import LibHierarchyModel, LibHierarchyItem
+from datagui.package.journal import Journal
+from datagui.package.loader import ResultLoader, pickleDigest
+from datagui.package.profiler import profiler
+from datagui.package.traversal import walkTree, iterPreOrder, SKIP
+from datagui.package.snapshot import storeSnapshot
+from datagui.package.symbols import installSymbolIndex
 from datagui.package.ui.AsmTabView import AsmTabView
 from datagui.package.ui.SourceTabView import SourceTabView
 from datagui.package.ui.SummaryTab import SummaryTab
 from datagui.package.utils import ErrorCode, CustomRole, IpInfo, info_map, LeakMetaInfo, ColorScheme, LeakFlags, debug, \
-    getCtxName, default_font_size, createIconButton, register_assert_handler, loadipinfo, leakToStr, getLogoIcon, \
-    getLogoIconPixmap, getResourceFile, registerFonts, getDefaultIconSize, getIconById, getIconTooltipById, getIconUnicodeById, getIconColorById
+    getCtxName, getCtxNames, default_font_size, createIconButton, register_assert_handler, loadipinfo, leakToStr, getLogoIcon, \
+    getLogoIconPixmap, getResourceFile, registerFonts, getDefaultIconSize, getIconById, getIconTooltipById, getIconUnicodeById, getIconColorById, LIST_CHUNK_SIZE, \
+    EXPAND_LEAKS
 
 mainWindow = None
 
@@ -54,8 +63,9 @@ def assert_handler(msg):
     if dump_path is None or dump_path == "":
         dump_path = "dump.pickle"
     dump_path += "." + str(datetime.datetime.now().time()) + ".autosave"
-    storepickle(dump_path, mainWindow.call_hierarchy)
-    debug(0, "Dumped pickle file to %s", (dump_path))
+    if mainWindow.call_hierarchy is not None:
+        storepickle(dump_path, mainWindow.call_hierarchy)
+        debug(0, "Dumped pickle file to %s", (dump_path))
     if mainWindow:
         mainWindow.askAssert(msg, dump_path)
 
@@ -66,14 +76,22 @@ class LeakFilter():
     def isFilterActive(self, leak_meta):
         return self.main.isFilterActive(leak_meta)
 
+    def getActiveFlags(self):
+        return self.main.getActiveFlags()
+
 class MainWindow(QMainWindow):
 
     def __init__(self):
         super(MainWindow, self).__init__()
         self.pickle_path = ""
+        self.pickle_is_snapshot = False
+        self.journal = None  # Journal of the changes saved since the pickle was written
+        self.autosave_writer = None  # AutosaveWriter while an autosave is written
+        self.autosave_timer = QTimer(self)
+        self.autosave_timer.timeout.connect(self.autosave)
         self.dialog_path = "."
         self.unsaved_changes = False
-        self.call_hierarchy = None # Only for assert_handler
+        self.call_hierarchy = None # None until the first files are loaded
         #~ self.leakFilter = LeakFilter()
 
         global mainWindow
@@ -83,36 +101,17 @@ class MainWindow(QMainWindow):
         registerFonts()
 
         if len(sys.argv) == 3:
-            self.pickle_path = sys.argv[1]
-            self.dialog_path = os.path.dirname(os.path.abspath(self.pickle_path))
-            try:
-                self.call_hierarchy = loadpickle(self.pickle_path)
-                if not self.call_hierarchy:
-                    raise FileNotFoundError()
-            except FileNotFoundError:
-                debug(0, "Please enter a valid pickle file path (mandatory)")
-                sys.exit(ErrorCode.INVALID_PICKLE)
-            except Exception as e:
-                debug(0, "Unable to load pickle file")
-                debug(1, "Exception: " + str(e))
-                sys.exit(ErrorCode.CANNOT_LOAD_PICKLE)
-
-            try:
-                utils.setupSymbolInfo(sys.argv[2])
-            except FileNotFoundError:
-                debug(0, "Please enter a valid zip file path (mandatory)")
-                sys.exit(ErrorCode.INVALID_ZIP)
-            except:
-                debug(0, "Unable to load zip file")
-                sys.exit(ErrorCode.CANNOT_LOAD_ZIP)
+            file_paths = (sys.argv[1], sys.argv[2])
+            self.dialog_path = os.path.dirname(os.path.abspath(file_paths[0]))
         else:
-            self.call_hierarchy = self.openFiles()
+            file_paths = self.openFiles()
 
-        if self.call_hierarchy is None:
+        if file_paths is None:
             debug(0, "Error opening pickle/zip file")
             sys.exit(ErrorCode.CANNOT_LOAD_PICKLE)
 
-        lib_hierarchy = self.call_hierarchy.flatten()
+        self.loader = None
+        self.progress_dialog = None
 
         self.main_view = QFrame(self)
         self.asm_tab = AsmTabView()
@@ -162,22 +161,134 @@ class MainWindow(QMainWindow):
         self.btn_filter_3.setChecked(True)
         # # # # #
         self.statusbar = self.statusBar()
+        profiler.recorded.connect(self.statusbar.showMessage)
         # # # # #
         self.setupMenu()
         self.setupUI()
-        self.setupCallTree(self.call_hierarchy)
-        self.setupLibTree(lib_hierarchy)
         self.setupLeakTree()
         self.setupCallListTree()
-        self.setupInfoMap(lib_hierarchy)
         self.setupEmptyTabs()
         self.setupHistoryButtons()
         self.setupConnections()
-        self.call_view.expandAll()
-        self.lib_view.expandAll()
         self.setupWindowInfo()
+        self.loadFiles(*file_paths)
         #
 
+    def loadFiles(self, pickle_file_path, zip_file_path):
+        """Load pickle and zip file in the background and show the loading progress.
+
+        The current views stay untouched until loading succeeded.
+        """
+
+        self.loader = ResultLoader(pickle_file_path, zip_file_path)
+        self.progress_dialog = QProgressDialog("Loading {}".format(pickle_file_path), "Cancel", 0, 100, self)
+        self.progress_dialog.setWindowTitle("Loading")
+        self.progress_dialog.setWindowModality(Qt.WindowModal)
+        self.progress_dialog.setMinimumDuration(500)
+        self.progress_dialog.setAutoClose(False)
+        self.progress_dialog.setAutoReset(False)
+        self.progress_dialog.canceled.connect(self.loader.cancel)
+        self.loader.progress.connect(self.updateLoadProgress)
+        self.loader.loaded.connect(self.filesLoaded)
+        self.loader.failed.connect(self.loadFailed)
+        self.loader.canceled.connect(self.loadCanceled)
+        self.loader.start()
+
+    def updateLoadProgress(self, stage, percent):
+        self.progress_dialog.setLabelText(stage + " ...")
+        self.progress_dialog.setValue(percent)
+        self.statusbar.showMessage("{} ({}%)".format(stage, percent))
+
+    def finishLoading(self):
+        self.loader.wait()
+        self.loader = None
+        self.progress_dialog.close()
+        self.progress_dialog = None
+
+    def loadFailed(self, error_code, msg):
+        debug(0, msg)
+        self.finishLoading()
+        if self.call_hierarchy is None:
+            QApplication.instance().exit(error_code)
+            return
+        self.statusbar.showMessage(msg)
+        QMessageBox.warning(self, "Error", msg)
+
+    def loadCanceled(self):
+        self.finishLoading()
+        if self.call_hierarchy is None:
+            debug(0, "Loading canceled")
+            QApplication.instance().exit(ErrorCode.CANCELED)
+            return
+        self.statusbar.showMessage("Loading canceled")
+
+    def filesLoaded(self, result):
+        """Hand the loaded data to the models and views in one step."""
+
+        self.waitForAutosave()
+
+        self.progress_dialog.setLabelText("Building views ...")
+        self.statusbar.showMessage("Building views")
+        QApplication.processEvents()
+
+        # Reset
+        self.leak_model.clearList()
+        self.call_list_model.clearList()
+        self.removeOldEditorTabs()
+        self.removeOldInfoTabs()
+        self.stacked_widget.hide()
+        utils.info_map.clear()
+        utils.asm_map.clear()
+        utils.src_map.clear()
+        if utils.datafs is not None:
+            utils.datafs.close()
+
+        # Setup
+        self.pickle_path = result.pickle_path
+        self.pickle_is_snapshot = result.is_snapshot
+        self.call_hierarchy = result.call_hierarchy
+        utils.datafs = result.datafs
+        installSymbolIndex(result.symbol_index)
+        self.call_model.beginResetModel()
+        self.lib_model.beginResetModel()
+        with profiler.stage("setupCallTree"):
+            self.setupCallTree(self.call_hierarchy)
+        self.setupLibTree(result.lib_hierarchy)
+        if result.navigation is not None:
+            with profiler.stage("restoreNavigation"):
+                self.restoreNavigation(result.lib_hierarchy, result.navigation)
+        else:
+            with profiler.stage("setupInfoMap"):
+                self.setupInfoMap(result.lib_hierarchy, result.short_info_map, result.asm_indexes)
+            with profiler.stage("storeCache"):
+                if cache.storeCache(result.pickle_path, result.pickle_digest, result.zip_digest,
+                                    self.exportNavigation()):
+                    debug(1, "Stored navigation cache for %s", result.pickle_path)
+        self.journal = Journal(result.pickle_path, result.pickle_digest)
+        with profiler.stage("replayJournal"):
+            journaled = self.journal.replay(self.call_model.annotations)
+        with profiler.stage("restoreAutosave"):
+            restored = loadAutosave(getAutosavePath(result.pickle_path), result.pickle_digest, self.journal.end or 0,
+                                    self.call_model.annotations)
+        self.call_model.endResetModel()
+        self.lib_model.endResetModel()
+        self.setupEmptyTabs()
+        self.setupHistoryButtons()
+        with profiler.stage("expandAll"):
+            self.expandCallTree()
+            self.lib_view.expandAll()
+        self.unsaved_changes = restored > 0
+        if utils.autosave_interval > 0:
+            self.autosave_timer.start(utils.autosave_interval * 1000)
+
+        self.finishLoading()
+        message = "Loaded {}".format(self.pickle_path)
+        if journaled > 0:
+            message += " and {} saved changes".format(journaled)
+        if restored > 0:
+            message += ", restored {} unsaved changes from autosave".format(restored)
+        self.statusbar.showMessage(message)
+
     def setupMenu(self):
         # # # # # #
         # ACTIONS #
@@ -225,13 +336,17 @@ class MainWindow(QMainWindow):
         save_file_act = QAction(QIcon(self.style().standardIcon(getattr(QStyle, "SP_DialogSaveButton"))),
                                 '&Save pickle', self)
         save_file_act.setShortcut('Ctrl+S')
-        save_file_act.setStatusTip('Save current file')
+        save_file_act.setStatusTip('Save changes to the journal of the current file')
         save_file_act.triggered.connect(self.saveExistingCallHierarchy)
         #
         save_as_file_act = QAction(QIcon(self.style().standardIcon(getattr(QStyle, "SP_DialogSaveButton"))),
                                    'Save pickle &As ...', self)
         save_as_file_act.setStatusTip('Save current file as ...')
         save_as_file_act.triggered.connect(self.saveCallHierarchy)
+        #
+        compact_file_act = QAction('&Compact journal into pickle', self)
+        compact_file_act.setStatusTip('Write all changes into the current file and remove its journal')
+        compact_file_act.triggered.connect(self.compactCallHierarchy)
 
         #
         font_inc_act = QAction('&Increase size', self)
@@ -253,6 +368,7 @@ class MainWindow(QMainWindow):
         file_menu.addAction(open_file_act)
         file_menu.addAction(save_file_act)
         file_menu.addAction(save_as_file_act)
+        file_menu.addAction(compact_file_act)
         file_menu.addAction(exit_act)
 
         self.view_menu = menu_bar.addMenu('&View')
@@ -289,6 +405,8 @@ class MainWindow(QMainWindow):
         debug(1, "About to close")
         if not self.askUnsavedChanges():
             evnt.ignore()
+            return
+        self.waitForAutosave()
 
     def setupUI(self):
         """Setup main layout for the user interface"""
@@ -328,6 +446,23 @@ class MainWindow(QMainWindow):
         self.call_view.header().setSectionResizeMode(QHeaderView.ResizeToContents)
         self.call_view.setContextMenuPolicy(Qt.CustomContextMenu)
 
+    def expandCallTree(self):
+        """Expand the call hierarchy as configured by utils.expand_depth."""
+        if utils.expand_depth == EXPAND_LEAKS:
+            root = self.call_model.root_item.obj
+
+            def expandLeaks(call_hierarchy):
+                # Expand nodes with leaks in the subtree of any of their children
+                if sum(self.call_model.getSubtreeAggregates(call_hierarchy)[:2]) == \
+                        sum(self.call_model.getAggregates(call_hierarchy)[:2]):
+                    return SKIP
+                if call_hierarchy is not root:
+                    self.call_view.expand(self.call_model.getIndex(call_hierarchy))
+
+            walkTree(root, self.call_model.getChildNodes, expandLeaks)
+        elif utils.expand_depth > 0:
+            self.call_view.expandToDepth(utils.expand_depth - 1)
+
     def setupLibTree(self, lib_hierarchy):
         self.lib_model.setRootItem(lib_hierarchy)
         self.lib_view.setModel(self.lib_model)
@@ -423,75 +558,154 @@ class MainWindow(QMainWindow):
 
         return src_tab_index
 
-    def setupInfoMap(self, lib_hierarchy):
-        """Setup package.utils.info_map and open asm/src tabs."""
+    def setupInfoMap(self, lib_hierarchy, short_info_map, asm_indexes):
+        """Create the lib items, setup package.utils.info_map and register asm/src files.
 
-        assert isinstance(lib_hierarchy, LibHierarchy)
+        Editors are not created here. Markers and indicators are only
+        recorded in the tab views and applied once a file gets opened.
+
+        Args:
+            lib_hierarchy: Flattened call hierarchy
+            short_info_map: IpInfoShort of each ip, from framework.zip
+            asm_indexes: AsmIndex of each asm file path, if available
+        """
 
-        with utils.datafs.get_binfile(IP_INFO_FILE) as f:
-            short_info_map = loadipinfo(f)
+        for bin_file_path, fl_entries in self.createLibItems(lib_hierarchy):
+            asm_file_path = bin_file_path + ".asm"
+            asm_file_index = self.asm_tab.registerFile(bin_file_path, asm_file_path)
+            asm_index = asm_indexes.get(asm_file_path)
+            for fl_entry in fl_entries:
+                addr = fl_entry[0]
+                if addr not in short_info_map:
+                    debug(0, "Cannot find addr in short_info_map")
+                    debug(0, "(Could be a wrong combination of pickle and zip file?)")
+                    sys.exit(ErrorCode.INVALID_COMB_OF_FILES)
+
+                short_info = short_info_map[addr]
+                assert isinstance(short_info, IpInfoShort)
+
+                if short_info.asm_line_nr >= 0:
+                    # Set asm marker and indicator
+                    local_ip = utils.getLocalIp(addr)
+                    position = asm_index.lookup(local_ip) if asm_index is not None else None
+                    if position is not None:
+                        indicator = (position[1], len(format(local_ip, 'x')))
+                    else:
+                        indicator = format(local_ip, 'x') + ":"
+                    self.asm_tab.setMarker(asm_file_index, addr, short_info.asm_line_nr, LeakFlags.INVESTIGATE)
+                    self.setAsmIndicator(addr, asm_file_index, short_info.asm_line_nr, indicator)
+
+                    # Set src marker and indicator
+                    src_file_index = -1
+                    src_line_nr = short_info.src_line_nr - 1  # QScintilla works zero-based
+                    if short_info.src_file is not None:
+                        src_file_index = self.src_tab.registerFile(short_info.src_file)
+                        self.src_tab.setMarker(src_file_index, addr, src_line_nr, LeakFlags.INVESTIGATE)
+                        self.setSrcIndicator(addr, src_file_index, src_line_nr)
+
+                    else:  # file not found
+                        debug(1, "Source file path missing: %s", short_info.src_file)
+
+                    ip_info = IpInfo(asm_file_index, short_info.asm_line_nr, src_file_index, src_line_nr,
+                                     fl_entry[1])
+
+                    utils.info_map[addr] = ip_info
+
+        self.findIptoCallMappings()
+        with profiler.stage("addMissingInformation"):
+            self.addMissingInformation(short_info_map)
+
+    def createLibItems(self, lib_hierarchy):
+        """Create the tree items of all libraries and their functions in the lib hierarchy.
+
+        Function items are only created for the first library of each binary.
+
+        Returns:
+            A list of tuples (binary path, ip_fl_tuples) of each library
+            with function items, see createLibFunctionItems.
+        """
+
+        assert isinstance(lib_hierarchy, LibHierarchy)
 
+        libs = []
+        bin_file_paths = set()
+        root_item = self.lib_model.root_item
         for ip in sorted_keys(lib_hierarchy.entries):
             lib = lib_hierarchy.entries[ip]
             assert isinstance(lib, Library)
             lib_name = lib.libentry.name.split('/')[-1]
-            lib_item = LibHierarchyItem("{}".format(lib_name), lib, self.lib_model.root_item)
-            self.lib_model.root_item.appendChild(lib_item)
+            lib_item = LibHierarchyItem("{}".format(lib_name), lib, root_item)
+            root_item.appendChild(lib_item)
             bin_file_path = lib.libentry.name
-            asm_file_path = bin_file_path + ".asm"
-            asm_tab_index = self.isFileAlreadyOpen(self.asm_tab, bin_file_path)
-            if asm_tab_index == -1:
-                asm_tab_index = self.addAsmTab(bin_file_path, asm_file_path)
-                fl_entries = self.createLibFunctionItems(lib, lib_item)  # tuple (ip, fl_item)
-                for fl_entry in fl_entries:
-                    addr = fl_entry[0]
-                    if addr not in short_info_map:
-                        debug(0, "Cannot find addr in short_info_map")
-                        debug(0, "(Could be a wrong combination of pickle and zip file?)")
-                        sys.exit(ErrorCode.INVALID_COMB_OF_FILES)
-
-                    short_info = short_info_map[addr]
-                    assert isinstance(short_info, IpInfoShort)
-
-                    if short_info.asm_line_nr >= 0:
-                        # Set asm marker and indicator
-                        search_str = format(utils.getLocalIp(addr), 'x') + ":"
-                        if asm_tab_index != -1:
-                            asm_marker_handle = self.asm_tab.widget(asm_tab_index).markerAdd(short_info.asm_line_nr,
-                                                                                             utils.LeakFlags.INVESTIGATE)
-                            asm_line_text = self.asm_tab.widget(asm_tab_index).text(short_info.asm_line_nr)
-                            self.setAsmIndicator(addr, asm_tab_index, short_info.asm_line_nr,
-                                                 asm_line_text.find(search_str), len(search_str) - 1)
-
-                        # Set src marker and indicator
-                        src_tab_index = -1
-                        src_marker_handle = -1
-                        src_line_nr = short_info.src_line_nr - 1  # QScintilla works zero-based
-                        if short_info.src_file is not None:
-                            src_tab_index = self.isFileAlreadyOpen(self.src_tab, short_info.src_file)
-                            if src_tab_index == -1:
-                                src_tab_index = self.addSrcTab(short_info.src_file)
-
-                            if src_tab_index != -1:
-                                src_marker_handle = self.src_tab.widget(src_tab_index).markerAdd(src_line_nr,
-                                                                                                 utils.LeakFlags.INVESTIGATE)
-                                src_line_text = self.src_tab.widget(src_tab_index).text(src_line_nr)
-                                start_pos = len(src_line_text) - len(src_line_text.lstrip())
-                                self.setSrcIndicator(addr, src_tab_index, src_line_nr, start_pos, 0)
-
-                        else:  # file not found
-                            debug(1, "Source file path missing: %s", short_info.src_file)
-
-                        ip_info = IpInfo(asm_tab_index, short_info.asm_line_nr, asm_marker_handle, src_tab_index,
-                                         src_line_nr, src_marker_handle, fl_entry[1])
-
-                        utils.info_map[addr] = ip_info
-
-                fl_entries.clear()
-
-        call_item = self.call_model.root_item  # type: CallHierarchyItem
-        self.findIptoCallMappings(call_item)
-        self.addMissingInformation(short_info_map)
+            if bin_file_path not in bin_file_paths:
+                bin_file_paths.add(bin_file_path)
+                libs.append((bin_file_path, self.createLibFunctionItems(lib, lib_item)))
+        return libs
+
+    def exportNavigation(self):
+        """Collect everything setupInfoMap derived from the pickle and zip file.
+
+        Tree items and call hierarchy nodes are stored by their position
+        in the lib/call tree, such that restoreNavigation can map them to
+        the rebuilt trees.
+
+        Returns:
+            The NavigationTables.
+        """
+
+        fl_positions = {}
+        for lib_item in self.lib_model.root_item.child_items:
+            for fl_item in lib_item.child_items:
+                fl_positions[id(fl_item)] = len(fl_positions)
+        call_positions = {id(node): pos for pos, node in enumerate(self.call_model.iterNodes())}
+
+        navigation = cache.NavigationTables()
+        for ip, ip_info in utils.info_map.items():
+            navigation['ips'].append(ip)
+            navigation['asm_file_indexes'].append(ip_info.asm_file_index)
+            navigation['asm_line_nrs'].append(ip_info.asm_line_nr)
+            navigation['src_file_indexes'].append(ip_info.src_file_index)
+            navigation['src_line_nrs'].append(ip_info.src_line_nr)
+            navigation['fl_positions'].append(-1 if ip_info.lib_tree_item is None
+                                              else fl_positions[id(ip_info.lib_tree_item)])
+            navigation['call_counts'].append(len(ip_info.call_histories))
+            navigation['call_positions'].extend(call_positions[id(node)] for node in ip_info.call_histories)
+
+        for prefix, tab, line_map in (('asm_', self.asm_tab, utils.asm_map), ('src_', self.src_tab, utils.src_map)):
+            tab.exportFiles(navigation, prefix)
+            for key, ip in line_map.items():
+                file_index, line_nr = key.split(":")  # see utils.createKey
+                navigation[prefix + 'map_files'].append(int(file_index))
+                navigation[prefix + 'map_lines'].append(int(line_nr))
+                navigation[prefix + 'map_ips'].append(ip)
+        return navigation
+
+    def restoreNavigation(self, lib_hierarchy, navigation):
+        """Counterpart of setupInfoMap, using the output of exportNavigation instead of the ip info."""
+
+        self.createLibItems(lib_hierarchy)
+        fl_items = [fl_item for lib_item in self.lib_model.root_item.child_items for fl_item in lib_item.child_items]
+
+        call_nodes = list(self.call_model.iterNodes())
+        call_positions = iter(navigation['call_positions'])
+        for ip, asm_file_index, asm_line_nr, src_file_index, src_line_nr, fl_position, call_count in zip(
+                navigation['ips'], navigation['asm_file_indexes'], navigation['asm_line_nrs'],
+                navigation['src_file_indexes'], navigation['src_line_nrs'], navigation['fl_positions'],
+                navigation['call_counts']):
+            lib_tree_item = None if fl_position == -1 else fl_items[fl_position]
+            ip_info = IpInfo(asm_file_index, asm_line_nr, src_file_index, src_line_nr, lib_tree_item)
+            ip_info.call_histories = [call_nodes[next(call_positions)] for _ in range(call_count)]
+            utils.info_map[ip] = ip_info
+
+        for prefix, tab, line_map in (('asm_', self.asm_tab, utils.asm_map), ('src_', self.src_tab, utils.src_map)):
+            tab.importFiles(navigation, prefix)
+            for file_index, line_nr, ip in zip(navigation[prefix + 'map_files'], navigation[prefix + 'map_lines'],
+                                               navigation[prefix + 'map_ips']):
+                line_map[utils.createKey(file_index, line_nr)] = ip
+
+        # Leak meta information is part of the pickle, not of the cache
+        for call_hierarchy in call_nodes:
+            self.call_model.annotations.addNode(call_hierarchy)
 
     def addMissingInformation(self, short_info_map):
         """Add missing function ip's to package.utils.info_map to enable GOTO Caller/Callee mechanism."""
@@ -501,29 +715,28 @@ class MainWindow(QMainWindow):
                 short_entry = short_info_map[ip]
                 src_line_nr = short_entry.src_line_nr - 1  # QScintilla works zero-based
                 bin_file_path = short_entry.asm_file.rstrip(".asm")
-                asm_tab_index = self.isFileAlreadyOpen(self.asm_tab, bin_file_path)
-                if asm_tab_index == -1:
-                    asm_tab_index = self.addAsmTab(bin_file_path, short_entry.asm_file)
-                if asm_tab_index != -1:
-                    self.asm_tab.widget(asm_tab_index).markerAdd(short_entry.asm_line_nr,
-                                                                 LeakFlags.RIGHT_ARROW)
-                src_tab_index = -1
+                asm_file_index = self.asm_tab.registerFile(bin_file_path, short_entry.asm_file)
+                self.asm_tab.setMarker(asm_file_index, ip, short_entry.asm_line_nr, LeakFlags.RIGHT_ARROW)
+                src_file_index = -1
                 if short_entry.src_file is not None:
-                    src_tab_index = self.isFileAlreadyOpen(self.src_tab, short_entry.src_file)
-                    if src_tab_index == -1:
-                        src_tab_index = self.addSrcTab(short_entry.src_file)
-                    if src_tab_index != -1:
-                        self.src_tab.widget(src_tab_index).markerAdd(src_line_nr,
-                                                                     LeakFlags.RIGHT_ARROW)
-                ip_info = IpInfo(asm_tab_index, short_entry.asm_line_nr, -1, src_tab_index,
-                                 src_line_nr, -1, None)
+                    src_file_index = self.src_tab.registerFile(short_entry.src_file)
+                    self.src_tab.setMarker(src_file_index, ip, src_line_nr, LeakFlags.RIGHT_ARROW)
+                ip_info = IpInfo(asm_file_index, short_entry.asm_line_nr, src_file_index, src_line_nr, None)
                 utils.info_map[ip] = ip_info
 
     def updateFilter(self):
-        #self.collapseCallHierarchy()
-        self.refreshCurrentLeak()
+        with profiler.stage("updateFilter"):
+            self.call_model.setFilterFlags(self.getActiveFlags())
+            self.call_view.viewport().update()
+            self.refreshCurrentLeak()
         debug(1, "Update filter")
 
+    def getActiveFlags(self):
+        """Get the leak flags, whose filter button is checked."""
+        buttons = ((self.btn_filter_0, LeakFlags.NOLEAK), (self.btn_filter_1, LeakFlags.INVESTIGATE),
+                   (self.btn_filter_2, LeakFlags.LEAK), (self.btn_filter_3, LeakFlags.DONTCARE))
+        return [flag for button, flag in buttons if button.isChecked()]
+
     def isFilterActive(self, leak_meta):
         assert isinstance(leak_meta, LeakMetaInfo)
         leak_flags = leak_meta.flag
@@ -539,35 +752,30 @@ class MainWindow(QMainWindow):
             debug(0, "Invalid leak flag %s", (str(leak_flags)))
             return False
 
-    def findIptoCallMappings(self, call_item):
-        """ Search call hierarchy recursively to find the correct contexts for the leaks.
-
-        Args:
-            call_item: Root item of the call hierarchy
-        """
-        assert isinstance(call_item, CallHierarchyItem)
-        for k in sorted_keys(call_item.obj.dataleaks):
-            dl = call_item.obj.dataleaks[k]
-            ip = dl.ip
+    def findIptoCallMappings(self):
+        """ Search the call hierarchy to find the correct contexts for the leaks."""
+        for call_hierarchy in self.call_model.iterNodes():
+            for k in sorted_keys(call_hierarchy.dataleaks):
+                dl = call_hierarchy.dataleaks[k]
+                ip = dl.ip
 
-            if dl.meta is None:
-                dl.meta = LeakMetaInfo()
+                if dl.meta is None:
+                    dl.meta = LeakMetaInfo()
 
-            if ip in utils.info_map:
-                utils.info_map[ip].call_tree_items.append(call_item)
+                if ip in utils.info_map:
+                    utils.info_map[ip].call_histories.append(call_hierarchy)
 
-        for k in sorted_keys(call_item.obj.cfleaks):
-            cf = call_item.obj.cfleaks[k]
-            ip = cf.ip
+            for k in sorted_keys(call_hierarchy.cfleaks):
+                cf = call_hierarchy.cfleaks[k]
+                ip = cf.ip
 
-            if cf.meta is None:
-                cf.meta = LeakMetaInfo()
+                if cf.meta is None:
+                    cf.meta = LeakMetaInfo()
 
-            if ip in utils.info_map:
-                utils.info_map[ip].call_tree_items.append(call_item)
+                if ip in utils.info_map:
+                    utils.info_map[ip].call_histories.append(call_hierarchy)
 
-        for child_item in call_item.child_items:  # type: CallHierarchyItem
-            self.findIptoCallMappings(child_item)
+            self.call_model.annotations.addNode(call_hierarchy)
 
     def setupWindowInfo(self):
         self.setWindowTitle('DATA - Differential Address Trace Analysis ' + DATAGUI_VERSION)
@@ -591,9 +799,11 @@ class MainWindow(QMainWindow):
         assert isinstance(lib, Library)
 
         ip_fl_tuples = []
-        for j in sorted_keys(lib.entries):
+        fl_keys = sorted_keys(lib.entries)
+        fl_names = getCtxNames([lib.entries[j].fentry for j in fl_keys])
+        for j, fl_name in zip(fl_keys, fl_names):
             fl = lib.entries[j]
-            fl_item = LibHierarchyItem("{}".format(getCtxName(fl.fentry)), fl, parent_item)
+            fl_item = LibHierarchyItem("{}".format(fl_name), fl, parent_item)
             parent_item.appendChild(fl_item)
 
             assert isinstance(fl, FunctionLeak)
@@ -670,24 +880,6 @@ class MainWindow(QMainWindow):
         if not self.call_view.isVisible() and not self.lib_view.isVisible() and not self.leak_view.isVisible():
             self.view_splitter.hide()
 
-    def isFileAlreadyOpen(self, tab_widget, file_path):
-        """Check if any tab of the given widget already contains the content of file_path.
-
-        Args:
-            tab_widget: QTabTwidget object, either asm_tab or src_tab.
-            file_path: Path to be checked.
-
-        Returns:
-            The tab index if the file is already present, -1 otherwise.
-        """
-        tab_index = -1
-        for i in range(tab_widget.count()):
-            if file_path == tab_widget.tabToolTip(i):
-                tab_index = i
-                break
-
-        return tab_index
-
     def showCallViewContextMenu(self, pos):
         menu = QMenu("CallView Context Menu")
 
@@ -793,7 +985,7 @@ class MainWindow(QMainWindow):
             debug(1, "[markAllCallViewUserComment] Canceled...")
 
     def asmIndicatorClicked(self, line_nr, line_index, pressed_key):
-        map_key = utils.createKey(self.asm_tab.currentIndex(), line_nr)
+        map_key = utils.createKey(self.asm_tab.getFileIndex(self.asm_tab.currentIndex()), line_nr)
         leak_ip = utils.asm_map[map_key]
         debug(5, "[ASM] Indicator clicked in line '%s', index '%s', value '%s'",
               (line_nr, line_index, str(hex(leak_ip))))
@@ -805,7 +997,7 @@ class MainWindow(QMainWindow):
             self.handleLeakSelection(leak)
 
     def srcIndicatorClicked(self, line_nr, line_index, pressed_key):
-        map_key = utils.createKey(self.src_tab.currentIndex(), line_nr)
+        map_key = utils.createKey(self.src_tab.getFileIndex(self.src_tab.currentIndex()), line_nr)
         leak_ip = utils.src_map[map_key]
         debug(5, "[SRC] Indicator clicked in line '%d', index '%d', value '%s'",
               (line_nr, line_index, str(hex(leak_ip))))
@@ -816,73 +1008,61 @@ class MainWindow(QMainWindow):
         if leak is not None and not isinstance(leak, QVariant):
             self.handleLeakSelection(leak)
 
-    def setAsmIndicator(self, addr, asm_tab_index, line_nr, line_index, end_pos):
-        asm_editor = self.asm_tab.widget(asm_tab_index)
-        asm_editor.SendScintilla(QsciScintilla.SCI_SETINDICATORCURRENT, 0)
-        start_pos = asm_editor.positionFromLineIndex(line_nr, line_index)
-        asm_editor.SendScintilla(QsciScintilla.SCI_INDICATORFILLRANGE, start_pos, end_pos)
-        key = utils.createKey(asm_tab_index, line_nr)
+    def setAsmIndicator(self, addr, asm_file_index, line_nr, indicator):
+        self.asm_tab.addIndicator(asm_file_index, line_nr, indicator)
+        key = utils.createKey(asm_file_index, line_nr)
         utils.asm_map[key] = addr
 
-    def setSrcIndicator(self, addr, src_tab_index, line_nr, line_index, end_pos):
-        src_editor = self.src_tab.widget(src_tab_index)
-        src_editor.SendScintilla(QsciScintilla.SCI_SETINDICATORCURRENT, 0)
-        start_pos = src_editor.positionFromLineIndex(line_nr, line_index)
-        end_pos = src_editor.lineLength(line_nr) - line_index
-        src_editor.SendScintilla(QsciScintilla.SCI_INDICATORFILLRANGE, start_pos, end_pos)
-        key = utils.createKey(src_tab_index, line_nr)
+    def setSrcIndicator(self, addr, src_file_index, line_nr):
+        self.src_tab.addIndicator(src_file_index, line_nr)
+        key = utils.createKey(src_file_index, line_nr)
         utils.src_map[key] = addr
 
+    def openAsmFile(self, asm_file_index):
+        """Return the tab index of an asm file and create its editor on first use."""
+
+        return self.asm_tab.openFile(asm_file_index, lambda entry: self.addAsmTab(entry.file_path, entry.load_path))
+
+    def openSrcFile(self, src_file_index):
+        """Return the tab index of a source file and create its editor on first use."""
+
+        return self.src_tab.openFile(src_file_index, lambda entry: self.addSrcTab(entry.load_path))
+
     def callClicked(self, call_index):
         if not call_index.isValid():
             debug(1, "[CallView] Clicked: invalid index")
             return
 
-        call_hierarchy = self.call_model.data(call_index, CustomRole.Obj)
-        self.coming_from_call_view = True
-        self.createLeakList(call_hierarchy)
-        self.goToCallee()
-        self.setColorScheme(ColorScheme.CALL)
-        self.call_view.setFocus()
+        with profiler.stage("callClicked"):
+            call_hierarchy = self.call_model.data(call_index, CustomRole.Obj)
+            self.coming_from_call_view = True
+            self.createLeakList(call_hierarchy)
+            self.goToCallee()
+            self.setColorScheme(ColorScheme.CALL)
+            self.call_view.setFocus()
 
-    def collapseCallHierarchyRecursive(self, call_item, parent_index = None):
-        """ Search call hierarchy recursively to find the correct contexts for the leaks.
+    def collapseCallHierarchy(self):
+        """Collapse all call hierarchy items without active leaks in their subtree.
 
-        Args:
-            call_item: Root item of the call hierarchy
+        Items with active leaks are expanded again if they were expanded
+        before, i.e. their children were fetched. The expansion states are
+        applied in one batch, followed by a single layout of the view.
         """
-        has_active_leaks = False
-        assert isinstance(call_item, CallHierarchyItem)
-        for k in sorted_keys(call_item.obj.dataleaks):
-            dl = call_item.obj.dataleaks[k]
-            assert isinstance(dl.meta, LeakMetaInfo)
-            if self.isFilterActive(dl.meta):
-                has_active_leaks = True
-                break
-        for k in sorted_keys(call_item.obj.cfleaks):
-            cf = call_item.obj.cfleaks[k]
-            assert isinstance(cf.meta, LeakMetaInfo)
-            if self.isFilterActive(cf.meta):
-                has_active_leaks = True
-                break
-
-        index = self.findCallItemIndex(call_item.id, parent_index)
-
-        for child_item in call_item.child_items:  # type: CallHierarchyItem
-            res = self.collapseCallHierarchyRecursive(child_item, index)
-            has_active_leaks = has_active_leaks or res
-        if index is not None:
-            if has_active_leaks:
-                self.call_view.expand(index)
-            else:
+        if self.call_model.root_item is None:
+            return
+        self.call_view.setUpdatesEnabled(False)
+        # With a pending layout, QTreeView only records the expansion states
+        self.call_view.scheduleDelayedItemsLayout()
+        for call_item in list(self.call_model.node_items.values()):
+            if call_item is self.call_model.root_item:
+                continue
+            index = self.call_model.createIndex(call_item.row(), 0, call_item)
+            if not self.call_model.hasFilteredLeaks(call_item.obj):
                 self.call_view.collapse(index)
-
-        return has_active_leaks
-
-    def collapseCallHierarchy(self):
-        # collapse call hierarchy for all hierarchy items that do not have active leaks
-        # That is, their leaks are filtered
-        self.collapseCallHierarchyRecursive(self.call_model.root_item)
+            elif call_item.fetched:
+                self.call_view.expand(index)
+        self.call_view.executeDelayedItemsLayout()
+        self.call_view.setUpdatesEnabled(True)
 
     def setColorScheme(self, scheme):
         pal = QPalette()
@@ -916,16 +1096,17 @@ class MainWindow(QMainWindow):
             self.leak_model.header = "Library Hierarchy Leaks"
             self.leak_model.headertooltip = "List all leaks of the selected library element"
 
-        self.leak_model.clearList()
+        leak_items = []
         for k in sorted_keys(obj.dataleaks):
             dl = obj.dataleaks[k]
-            self.addLeakItem(obj, dl)
+            self.addLeakItem(leak_items, obj, dl)
         for j in sorted_keys(obj.cfleaks):
             cf = obj.cfleaks[j]
-            self.addLeakItem(obj, cf)
+            self.addLeakItem(leak_items, obj, cf)
+        self.leak_model.setItems(leak_items, LIST_CHUNK_SIZE)
 
-    def addLeakItem(self, obj, leak):
-        """Add single leak item to leak model."""
+    def addLeakItem(self, leak_items, obj, leak):
+        """Add single leak item to the list of leak items."""
         meta = leak.meta
         if meta is not None:
             # This only applies when coming from CallHierarchy
@@ -936,15 +1117,12 @@ class MainWindow(QMainWindow):
         leak_item = LeakItem(utils.leakToStr(leak), leak)
         # When coming from LibHierarchy, all leaks are displayed, but if filtered, the high_prio_flag might become empty
         leak_item.high_prio_flag = self.getMaxPriority(obj, leak)
-        ip_info = info_map[leak.ip]
-        self.updateMarginSymbol(ip_info, leak_item.high_prio_flag)
-        self.leak_model.appendItem(leak_item)
+        self.updateMarginSymbol(leak.ip, leak_item.high_prio_flag)
+        leak_items.append(leak_item)
 
-    def createCallList(self, selected_leak, call_tree_items):
-        self.call_list_model.clearList()
-        for item in call_tree_items:
-            assert isinstance(item, CallHierarchyItem)
-            call_hierarchy = item.obj
+    def createCallList(self, selected_leak, call_histories):
+        calls = []
+        for call_hierarchy in call_histories:
             assert isinstance(call_hierarchy, CallHistory)
             if isinstance(selected_leak, DataLeak):
                 dl = call_hierarchy.dataleaks[selected_leak]
@@ -953,7 +1131,7 @@ class MainWindow(QMainWindow):
                 if not self.isFilterActive(meta):
                     debug(3, "Filtering data leak %x", (dl.ip))
                     continue
-                self.call_list_model.appendItem(item, dl)
+                calls.append((call_hierarchy, dl))
             elif isinstance(selected_leak, CFLeak):
                 cf = call_hierarchy.cfleaks[selected_leak]
                 meta = cf.meta
@@ -961,10 +1139,11 @@ class MainWindow(QMainWindow):
                 if not self.isFilterActive(meta):
                     debug(3, "Filtering data leak %x", (cf.ip))
                     continue
-                self.call_list_model.appendItem(item, cf)
+                calls.append((call_hierarchy, cf))
             else:
                 assert False
                 return
+        self.call_list_model.setCalls(calls, LIST_CHUNK_SIZE)
         self.stacked_widget.setCurrentIndex(1)
         self.stacked_widget.show()
 
@@ -983,11 +1162,8 @@ class MainWindow(QMainWindow):
         if isinstance(obj, CallHistory):
             return leak.meta.flag
         elif isinstance(obj, FunctionLeak):
-            call_items = info_map[leak.ip].call_tree_items
-
             max_priority = LeakFlags.FILTER
-            for tree_item in call_items:
-                call_hierarchy = tree_item.obj
+            for call_hierarchy in info_map[leak.ip].call_histories:
                 call_leak = None
                 if isinstance(leak, DataLeak):
                     call_leak = call_hierarchy.dataleaks[leak]
@@ -1023,27 +1199,28 @@ class MainWindow(QMainWindow):
             debug(1, "[LeakView] Clicked: invalid index")
             return
 
-        leak = self.leak_model.data(leak_index, CustomRole.Leak)
-        if not isinstance(leak, QVariant):
-            debug(1, "[LeakView] Clicked: %s: %s", ("DataLeak" if isinstance(leak, DataLeak) else "CFLeak",
-                                                    hex(utils.getLocalIp(leak.ip))))
-        if isinstance(leak, Leak):
-            self.recordPrevNextEntry(leak)
-            self.handleLeakSelection(leak)
-        self.leak_view.setFocus()
+        with profiler.stage("leakClicked"):
+            leak = self.leak_model.data(leak_index, CustomRole.Leak)
+            if not isinstance(leak, QVariant):
+                debug(1, "[LeakView] Clicked: %s: %s", ("DataLeak" if isinstance(leak, DataLeak) else "CFLeak",
+                                                        hex(utils.getLocalIp(leak.ip))))
+            if isinstance(leak, Leak):
+                self.recordPrevNextEntry(leak)
+                self.handleLeakSelection(leak)
+            self.leak_view.setFocus()
 
     def recordPrevNextEntry(self, leak):
         leak_idx = None
         if self.coming_from_call_view:
             # Since we only record the leak IP, we in addition need to store the index
-            # of our leak within ip_info.call_tree_items
+            # of our leak within ip_info.call_histories
             call_index = self.call_view.selectionModel().currentIndex()
             assert call_index.isValid()
             call_hierarchy = self.call_model.data(call_index, CustomRole.Obj)
             assert isinstance(call_hierarchy, CallHistory)
             ip_info = info_map[leak.ip]
-            for index in range(0, len(ip_info.call_tree_items)):
-                if ip_info.call_tree_items[index].obj == call_hierarchy:
+            for index in range(0, len(ip_info.call_histories)):
+                if ip_info.call_histories[index] is call_hierarchy:
                     leak_idx = index
                     break
             if leak_idx is None:
@@ -1057,23 +1234,28 @@ class MainWindow(QMainWindow):
     def adjustEditors(self, ip_info):
         """Switch asm/src tab and jump to editor lines containing the leak."""
 
-        if ip_info.asm_tab_index != -1:
-            self.asm_tab.setCurrentIndex(ip_info.asm_tab_index)
-            self.asm_tab.jumpToLine(ip_info.asm_tab_index, ip_info.asm_line_nr)
+        asm_tab_index = -1
+        if ip_info.asm_file_index != -1:
+            asm_tab_index = self.openAsmFile(ip_info.asm_file_index)
+        if asm_tab_index != -1:
+            self.asm_tab.setCurrentIndex(asm_tab_index)
+            self.asm_tab.jumpToLine(asm_tab_index, ip_info.asm_line_nr)
         else:
             self.asm_tab.setCurrentIndex(self.asm_tab.empty_tab_index)
 
-        if ip_info.src_tab_index != -1:
-            self.src_tab.setCurrentIndex(ip_info.src_tab_index)
-            self.src_tab.jumpToLineNumber(ip_info.src_tab_index, ip_info.src_line_nr)
+        src_tab_index = -1
+        if ip_info.src_file_index != -1:
+            src_tab_index = self.openSrcFile(ip_info.src_file_index)
+        if src_tab_index != -1:
+            self.src_tab.setCurrentIndex(src_tab_index)
+            self.src_tab.jumpToLineNumber(src_tab_index, ip_info.src_line_nr)
         else:
             self.src_tab.setCurrentIndex(self.src_tab.empty_tab_index)
 
     def selectLibItem(self, lib_item_id):
-        index_list = self.lib_model.match(self.lib_model.index(0, 0, QModelIndex()), CustomRole.Id,
-                                          lib_item_id, 1, Qt.MatchRecursive)
-        if len(index_list) > 0:
-            self.lib_view.setCurrentIndex(index_list[0])
+        index = self.lib_model.getIndexById(lib_item_id)
+        if index is not None:
+            self.lib_view.setCurrentIndex(index)
 
     def callListClicked(self, list_index):
         if not list_index.isValid():
@@ -1087,9 +1269,9 @@ class MainWindow(QMainWindow):
             return
         assert isinstance(item, CallListItem)
         self.coming_from_call_view = True
-        self.selectCallItem(item.call_item.id)
+        self.selectCallItem(item.call_hierarchy)
         # Re-create leak list to ensure coming_from_call_view = True
-        self.createLeakList(item.call_item.obj)
+        self.createLeakList(item.call_hierarchy)
         # This leak needs to be that of CallView, not of LibView, in order to contain leak.meta
         leak = self.selectLeakItem(ip)
         if leak is None:
@@ -1102,34 +1284,16 @@ class MainWindow(QMainWindow):
             self.setColorScheme(ColorScheme.BOTH)
             self.recordPrevNextEntry(leak)
 
-    def findCallItemIndex(self, call_item_id, start_index = None):
-        if start_index is None:
-            start_index = self.call_model.index(0, 0, QModelIndex())
-        index_list = self.call_model.match(start_index, # start
-                                           CustomRole.Id, # role
-                                           call_item_id, # value
-                                           1, # hits
-                                           Qt.MatchRecursive)
-        if len(index_list) > 0:
-            return index_list[0]
-        else:
-            return None
-
-    def selectCallItem(self, call_item_id, start_index = None):
-        if start_index is None:
-            start_index = self.call_model.index(0, 0, QModelIndex())
-        index_list = self.call_model.match(start_index,
-                                           CustomRole.Id,
-                                           call_item_id, 1, Qt.MatchRecursive)
-        if len(index_list) > 0:
-            self.call_view.selectionModel().setCurrentIndex(index_list[0], QItemSelectionModel.ClearAndSelect)
+    def selectCallItem(self, call_hierarchy):
+        index = self.call_model.getIndex(call_hierarchy)
+        if index is not None:
+            self.call_view.selectionModel().setCurrentIndex(index, QItemSelectionModel.ClearAndSelect)
 
     def selectLeakItem(self, leak_ip):
-        index_list = self.leak_model.match(self.leak_model.index(0, 0, QModelIndex()), CustomRole.Ip,
-                                           leak_ip, 1, Qt.MatchRecursive)
-        if len(index_list) > 0:
-            self.leak_view.selectionModel().setCurrentIndex(index_list[0], QItemSelectionModel.ClearAndSelect)
-            return self.leak_model.data(index_list[0], CustomRole.Leak)
+        index = self.leak_model.getIndexByIp(leak_ip)
+        if index is not None:
+            self.leak_view.selectionModel().setCurrentIndex(index, QItemSelectionModel.ClearAndSelect)
+            return self.leak_model.data(index, CustomRole.Leak)
         else:
             return None
 
@@ -1169,6 +1333,9 @@ class MainWindow(QMainWindow):
         while self.src_tab.count() > 0:
             self.src_tab.removeTab(0)
 
+        self.asm_tab.resetFiles()
+        self.src_tab.resetFiles()
+
     def goToCaller(self):
         call_index = self.call_view.selectionModel().currentIndex()
         if not call_index.isValid():
@@ -1199,68 +1366,47 @@ class MainWindow(QMainWindow):
             self.src_tab.setCurrentIndex(self.src_empty_tab_index)
 
     def markAll(self, flag_id, user_comment, call_view):
-        if call_view:
-            call_index = self.call_view.selectionModel().currentIndex()
-            item = self.call_model.data(call_index, CustomRole.CurrentItem)
-        else:
-            lib_index = self.lib_view.selectionModel().currentIndex()
-            item = self.lib_model.data(lib_index, CustomRole.CurrentItem)
-        self.markAllRecursive(flag_id, user_comment, item)
-        self.refreshCurrentLeak()
-
-    def markAllRecursive(self, flag_id, user_comment, item):
-        """ Modify all leaks recursively.
+        """ Modify all leaks of the selected item and its children.
 
         Args:
             flag_id: The flag to apply to all leaks. Can be None to leave unchanged
             user_comment: The comments to apply to all leaks. Can be None to leave unchanged
+            call_view: Whether to use the selection of the call hierarchy or of the library hierarchy
         """
-        def markLeaks(element):
-            for k in item.obj.dataleaks:
-                dl = item.obj.dataleaks[k]
-                assert isinstance(dl.meta, LeakMetaInfo)
-                self.markLeak(dl, flag_id, user_comment)
-            for k in item.obj.cfleaks:
-                cf = item.obj.cfleaks[k]
-                assert isinstance(cf.meta, LeakMetaInfo)
-                self.markLeak(cf, flag_id, user_comment)
-
-        if isinstance(item, CallHierarchyItem):
-            markLeaks(item)
-            for child_item in item.child_items:  # type: CallHierarchyItem
-                res = self.markAllRecursive(flag_id, user_comment, child_item)
-        elif isinstance(item, LibHierarchyItem):
-            if isinstance(item.obj, FunctionLeak):
-                # We cannot use leaks within FunctionLeak directly, since they are not mapped back to the CallHierarchy.
-                # Search the global map instead
-                libleaks = []
-                for k in item.obj.dataleaks:
-                    dl = item.obj.dataleaks[k]
-                    libleaks.append(dl)
-                for k in item.obj.cfleaks:
-                    cf = item.obj.cfleaks[k]
-                    libleaks.append(cf)
-                for leak in libleaks:
-                    assert leak.ip in utils.info_map
-                    ip_info = info_map[leak.ip]  # type: IpInfo
-                    for item in ip_info.call_tree_items:
-                        assert isinstance(item, CallHierarchyItem)
-                        call_hierarchy = item.obj
-                        assert isinstance(call_hierarchy, CallHistory)
-                        if isinstance(leak, DataLeak):
-                            self.markLeak(call_hierarchy.dataleaks[leak], flag_id, user_comment)
-                        elif isinstance(leak, CFLeak):
-                            self.markLeak(call_hierarchy.cfleaks[leak], flag_id, user_comment)
-            for child_item in item.child_items:  # type: LibHierarchyItem
-                res = self.markAllRecursive(flag_id, user_comment, child_item)
-        else:
-            debug(0, "[markAllRecursive] Invalid item type: %s" % type(item))
+        with profiler.stage("markAll"):
+            if call_view:
+                call_index = self.call_view.selectionModel().currentIndex()
+                item = self.call_model.data(call_index, CustomRole.CurrentItem)
+            else:
+                lib_index = self.lib_view.selectionModel().currentIndex()
+                item = self.lib_model.data(lib_index, CustomRole.CurrentItem)
+            if isinstance(item, CallHierarchyItem):
+                # Also covers callees without items
+                self.call_model.markSubtree(item.obj, flag_id, user_comment)
+            elif isinstance(item, LibHierarchyItem):
+                self.call_model.markLeaks(self.getLibOccurrences(item), flag_id, user_comment)
+            else:
+                debug(0, "[markAll] Invalid item type: %s" % type(item))
+                return
+            self.notifyUnsavedChanges()
+            self.refreshCurrentLeak()
+
+    def getLibOccurrences(self, lib_item):
+        """ Collect the occurrences of the leaks of a library hierarchy item and its children in the call hierarchy.
 
-    def markLeak(self, leak, flag_id, user_comment):
-        if flag_id is not None:
-            leak.meta.flag = flag_id
-        if user_comment is not None:
-            leak.meta.comment = user_comment
+        Returns:
+            A list of tuples (CallHistory, slot), see AnnotationStore.getOccurrences
+        """
+        occurrences = []
+        for item in iterPreOrder(lib_item, lambda item: item.child_items):
+            if not isinstance(item.obj, FunctionLeak):
+                continue
+            # We cannot use leaks within FunctionLeak directly, since they are not mapped back to the CallHierarchy.
+            # Use the reverse index of the annotation store instead
+            for leaks in (item.obj.dataleaks, item.obj.cfleaks):
+                for k in leaks:
+                    occurrences.extend(self.call_model.annotations.getOccurrences(leaks[k]))
+        return occurrences
 
     def handleLeakSelection(self, leak):
         """Display views correctly after leak selection.
@@ -1284,9 +1430,8 @@ class MainWindow(QMainWindow):
                 self.setColorScheme(ColorScheme.BOTH)
 
             else:
-                if len(ip_info.call_tree_items) == 1:
-                    call_item = ip_info.call_tree_items[0]
-                    call_hierarchy = call_item.obj
+                if len(ip_info.call_histories) == 1:
+                    call_hierarchy = ip_info.call_histories[0]
                     # Use leak object from CallHierarchy, which holds the correct meta data
                     call_leak = None
                     if isinstance(leak, DataLeak):
@@ -1294,17 +1439,17 @@ class MainWindow(QMainWindow):
                     elif isinstance(leak, CFLeak):
                         call_leak = call_hierarchy.cfleaks[leak]
 
-                    self.selectCallItem(call_item.id)
+                    self.selectCallItem(call_hierarchy)
                     self.selectLibItem(ip_info.lib_tree_item.id)
                     self.setupInfoBox(call_leak)
                     self.adjustEditors(ip_info)
                     self.setColorScheme(ColorScheme.BOTH)
 
-                elif len(ip_info.call_tree_items) > 1:
-                    # It might happen that the no. call_tree_items is > 1 but all are filtered.
+                elif len(ip_info.call_histories) > 1:
+                    # It might happen that the no. call_histories is > 1 but all are filtered.
                     self.selectLibItem(ip_info.lib_tree_item.id)
                     self.setColorScheme(ColorScheme.LIB)
-                    self.createCallList(leak, ip_info.call_tree_items)
+                    self.createCallList(leak, ip_info.call_histories)
 
     def restoreLeakSelection(self, stack_info):
         self.coming_from_call_view = stack_info.coming_from_call_view
@@ -1317,22 +1462,18 @@ class MainWindow(QMainWindow):
             # Prepare call view as if we clicked there.
             # This is necessary for synchronization!
             leak_idx = stack_info.leak_idx
-            self.selectCallItem(ip_info.call_tree_items[leak_idx].id)
+            self.selectCallItem(ip_info.call_histories[leak_idx])
             # Prepare Leak list
-            self.createLeakList(ip_info.call_tree_items[leak_idx].obj)
+            self.createLeakList(ip_info.call_histories[leak_idx])
         # Now select the correct leak
         leak = self.selectLeakItem(stack_info.leak_ip)
         self.handleLeakSelection(leak)
 
     def updateFlagIcon(self, leak_ip, flag_id):
-        index_list = self.leak_model.match(self.leak_model.index(0, 0, QModelIndex()), CustomRole.Ip,
-                                           leak_ip, 1, Qt.MatchRecursive)
+        self.leak_model.updateFlags({leak_ip: flag_id})
 
-        if len(index_list) > 0:
-            self.leak_model.updateFlag(index_list[0], flag_id)
-
-        ip_info = info_map[leak_ip]
-        self.updateMarginSymbol(ip_info, flag_id)
+        self.call_model.updateNodes(info_map[leak_ip].call_histories)
+        self.updateMarginSymbol(leak_ip, flag_id)
 
     def notifyUnsavedChanges(self):
         self.statusbar.showMessage('Editing')
@@ -1342,16 +1483,13 @@ class MainWindow(QMainWindow):
         self.statusbar.showMessage("Saved {}".format(self.pickle_path))
         self.unsaved_changes = False
 
-    def updateMarginSymbol(self, ip_info, flag_id):
-        if ip_info.asm_tab_index != -1:
-            self.asm_tab.widget(ip_info.asm_tab_index).markerDeleteHandle(ip_info.asm_marker_handle)
-            ip_info.asm_marker_handle = \
-                self.asm_tab.widget(ip_info.asm_tab_index).markerAdd(ip_info.asm_line_nr, flag_id)
+    def updateMarginSymbol(self, ip, flag_id):
+        ip_info = info_map[ip]
+        if ip_info.asm_file_index != -1:
+            self.asm_tab.setMarker(ip_info.asm_file_index, ip, ip_info.asm_line_nr, flag_id)
 
-        if ip_info.src_tab_index != -1:
-            self.src_tab.widget(ip_info.src_tab_index).markerDeleteHandle(ip_info.src_marker_handle)
-            ip_info.src_marker_handle = \
-                self.src_tab.widget(ip_info.src_tab_index).markerAdd(ip_info.src_line_nr, flag_id)
+        if ip_info.src_file_index != -1:
+            self.src_tab.setMarker(ip_info.src_file_index, ip, ip_info.src_line_nr, flag_id)
 
     def closeGUI(self):
         if not self.askUnsavedChanges():
@@ -1359,7 +1497,11 @@ class MainWindow(QMainWindow):
         QApplication.instance().quit()
 
     def openFiles(self):
-        """Show file dialogs to open pickle and zip files."""
+        """Show file dialogs to select pickle and zip files.
+
+        Returns:
+            A tuple (pickle_file_path, zip_file_path), None if no valid files were selected.
+        """
 
         pickle_file_path = self.getPickleFileFromDialog()
         if pickle_file_path is None:
@@ -1371,39 +1513,18 @@ class MainWindow(QMainWindow):
             debug(0, "Please select a valid zip file (mandatory)")
             return None
 
-        # Load pickle
-        self.pickle_path = pickle_file_path
-        call_hierarchy = loadpickle(pickle_file_path)
-
-        # Load zip file
-        utils.resetSymbolInfo()
-        utils.setupSymbolInfo(zip_file_path)
-        return call_hierarchy
+        return pickle_file_path, zip_file_path
 
     def reopenFiles(self):
+        """Show file dialogs and replace all views with the content of the selected files."""
+
         if not self.askUnsavedChanges():
             return
 
-        self.call_hierarchy = self.openFiles()
-        if self.call_hierarchy is None:
+        file_paths = self.openFiles()
+        if file_paths is None:
             return
-        lib_hierarchy = self.call_hierarchy.flatten()
-
-        """Reset all views and show file dialogs to open pickle and zip files."""
-
-        # Reset
-        self.leak_model.clearList()
-        self.removeOldEditorTabs()
-        self.stacked_widget.hide()
-
-        # Setup
-        self.setupCallTree(self.call_hierarchy)
-        self.setupLibTree(lib_hierarchy)
-        self.setupInfoMap(lib_hierarchy)
-        self.setupEmptyTabs()
-        self.setupHistoryButtons()
-        self.call_view.expandAll()
-        self.lib_view.expandAll()
+        self.loadFiles(*file_paths)
 
     def askUnsavedChanges(self):
         if not self.unsaved_changes:
@@ -1420,7 +1541,7 @@ class MainWindow(QMainWindow):
             self.saveExistingCallHierarchy()
             return True
         elif retval & QMessageBox.No > 0:
-            # Do nothing
+            self.discardAutosave()
             return True
         elif retval & QMessageBox.Cancel > 0:
             debug(1, "User aborted action due to unsaved changes")
@@ -1456,7 +1577,7 @@ class MainWindow(QMainWindow):
     def getPickleFileFromDialog(self):
         """Show file dialog to open pickle file and return the pickle content."""
 
-        file_info = self.showOpenDialog("Open pickle file", "Pickle Files (*.pickle)", self.dialog_path)
+        file_info = self.showOpenDialog("Open pickle file", "Pickle Files (*.pickle *.snapshot)", self.dialog_path)
         abs_file_path = file_info[0]
         if abs_file_path:
             self.dialog_path = os.path.dirname(os.path.abspath(abs_file_path))
@@ -1478,15 +1599,34 @@ class MainWindow(QMainWindow):
             return None
 
     def saveExistingCallHierarchy(self):
-        """Overwrite the currently opened pickle file."""
+        """Append the changes to the journal of the currently opened pickle file."""
 
         if self.pickle_path:
-            debug(1, "[PICKLE_S] Overwrite: %s", self.pickle_path)
-            storepickle(self.pickle_path, self.call_model.root_item.obj)
+            debug(1, "[PICKLE_S] Append to journal: %s", self.journal.path)
+            try:
+                with profiler.stage("saveJournal"):
+                    self.journal.append(self.call_model.annotations)
+            except OSError as e:
+                debug(0, "[PICKLE_S] Unable to write journal %s: %s", (self.journal.path, str(e)))
+                self.statusbar.showMessage("Unable to save {}".format(self.journal.path))
+                return
+            self.discardAutosave()
             self.notifySaved()
         else:
             debug(1, "[PICKLE_S] Empty pickle path")
 
+    def compactCallHierarchy(self):
+        """Overwrite the currently opened pickle file with all changes and remove its journal."""
+
+        if self.pickle_path:
+            debug(1, "[PICKLE_S] Compact: %s", self.pickle_path)
+            with profiler.stage("compactJournal"):
+                stored = self.storeCallHierarchy(self.pickle_path, self.pickle_is_snapshot)
+            if stored:
+                self.notifySaved()
+        else:
+            debug(1, "[PICKLE_S] Empty pickle path")
+
     def saveCallHierarchy(self):
         """Save current call hierarchy into a new pickle file."""
 
@@ -1494,13 +1634,78 @@ class MainWindow(QMainWindow):
         abs_file_path = file_info[0]
         if abs_file_path:
             debug(1, "[PICKLE_S] Save as: %s", abs_file_path)
-            self.pickle_path = abs_file_path
-            self.dialog_path = os.path.dirname(os.path.abspath(self.pickle_path))
-            storepickle(abs_file_path, self.call_model.root_item.obj)
-            self.notifySaved()
+            if self.storeCallHierarchy(abs_file_path, False):
+                self.pickle_path = abs_file_path
+                self.pickle_is_snapshot = False
+                self.dialog_path = os.path.dirname(os.path.abspath(self.pickle_path))
+                self.notifySaved()
         else:
             debug(1, "[PICKLE_S] No file Selected")
 
+    def storeCallHierarchy(self, path, as_snapshot):
+        """Write the whole call hierarchy to path and start an empty journal for it.
+
+        The journal of the previously written file stays valid for that file.
+
+        Returns:
+            True if the file was written.
+        """
+
+        try:
+            if as_snapshot:
+                storeSnapshot(path, self.call_model.root_item.obj)
+            else:
+                storepickle(path, self.call_model.root_item.obj)
+            journal = Journal(path, pickleDigest(path))
+            journal.remove()
+        except (OSError, RecursionError) as e:
+            debug(0, "[PICKLE_S] Unable to write %s: %s", (path, str(e)))
+            self.statusbar.showMessage("Unable to save {}".format(path))
+            return False
+        self.journal = journal
+        # All changes are part of the file now
+        self.call_model.annotations.takeChanges()
+        self.discardAutosave()
+        return True
+
+    def autosave(self):
+        """Write the unsaved changes next to the current pickle, without blocking the GUI.
+
+        Only a copy of the annotation columns is taken here, the records are
+        packed and written by an AutosaveWriter. Saving removes the autosave.
+        """
+
+        annotations = self.call_model.annotations
+        if self.autosave_writer is not None or self.journal is None or not annotations.changes:
+            return
+        with profiler.stage("autosave"):
+            self.autosave_writer = AutosaveWriter(getAutosavePath(self.pickle_path), self.journal.pickle_digest,
+                                                  self.journal.end or 0, annotations.copy())
+            self.autosave_writer.failed.connect(self.autosaveFailed)
+            self.autosave_writer.finished.connect(self.waitForAutosave)
+            self.autosave_writer.start()
+
+    def waitForAutosave(self):
+        """Wait until a running autosave is written."""
+
+        if self.autosave_writer is not None:
+            self.autosave_writer.wait()
+            self.autosave_writer = None
+
+    def autosaveFailed(self, msg):
+        """Tell the user that the unsaved changes are not backed up."""
+
+        self.statusbar.showMessage("Autosave failed: {}".format(msg))
+
+    def discardAutosave(self):
+        """Remove the autosave of the current pickle, e.g., after saving."""
+
+        self.waitForAutosave()
+        try:
+            removeAutosave(getAutosavePath(self.pickle_path))
+        except OSError as e:
+            debug(0, "[Autosave] Unable to remove autosave: %s", str(e))
+
     def showOpenDialog(self, window_title, file_format="All Files (*)", current_dir="."):
         file_info = QFileDialog.getOpenFileName(self, window_title, current_dir, file_format)
         return file_info
@@ -98,6 +98,15 @@ class SourceTabView(ZoomTabView):
         editor = self.widget(tab_index)
         editor.setCursorPosition(line_nr, 0)
 
+    def fillIndicator(self, editor, line_nr, indicator):
+        """Highlight line line_nr without its leading whitespace."""
+
+        line_text = editor.text(line_nr)
+        line_index = len(line_text) - len(line_text.lstrip())
+        start_pos = editor.positionFromLineIndex(line_nr, line_index)
+        end_pos = editor.lineLength(line_nr) - line_index
+        editor.SendScintilla(QsciScintilla.SCI_INDICATORFILLRANGE, start_pos, end_pos)
+
     def marginLeftClick(self, margin_nr, line_nr, state):
         debug(5, "[SRC] marginLeftClick\n\tmargin_nr: %d, line_nr: %d, state: %d", (margin_nr, line_nr, state))
 
@@ -23,7 +23,24 @@ from PyQt5.QtCore import QSize, Qt
 from PyQt5.QtGui import QColor, QFont, QFontMetrics
 from PyQt5.QtWidgets import QTabWidget, QFrame
 
-from datagui.package.utils import LeakFlags, getIconById, debug, default_font_size
+from datagui.package.utils import LeakFlags, getIconById, debug, default_font_size, clearIconCache
+
+class FileEntry:
+    """Bookkeeping for a single asm or source file of a ZoomTabView.
+
+    The editor of a file is only created once it is needed. Until then,
+    all markers and indicators are only recorded here and applied when
+    the editor gets attached.
+    """
+
+    def __init__(self, file_path, load_path):
+        self.file_path = file_path
+        self.load_path = load_path
+        self.tab_index = -1
+        self.available = True
+        self.markers = {}  # markers[key] -> [line_nr, flag_id, marker_handle]
+        self.indicators = {}  # indicators[line_nr] -> indicator information of the subclass
+
 
 class ZoomTabView(QTabWidget):
 
@@ -32,6 +49,160 @@ class ZoomTabView(QTabWidget):
         self.zoomlevel = 0
         self.zoomlevel_min = -10
         self.zoomlevel_max = 30
+        self.resetFiles()
+
+    # # # # # # # # #
+    # FILE REGISTRY #
+    # # # # # # # # #
+
+    def resetFiles(self):
+        self.files = []  # files[file_index] -> FileEntry
+        self.file_indices = {}  # file_indices[file_path] -> file_index
+        self.tab_files = {}  # tab_files[tab_index] -> file_index
+
+    def exportFiles(self, navigation, prefix):
+        """Add the registered files with their markers and indicators to the tables of navigation.
+
+        Args:
+            navigation: NavigationTables
+            prefix: Prefix of the table names of this view, e.g., 'asm_'
+        """
+
+        for file_index, entry in enumerate(self.files):
+            navigation[prefix + 'paths'].append(navigation.addString(entry.file_path))
+            navigation[prefix + 'load_paths'].append(navigation.addString(entry.load_path))
+            for key, (line_nr, flag_id, _) in entry.markers.items():
+                navigation[prefix + 'marker_files'].append(file_index)
+                navigation[prefix + 'marker_keys'].append(key)
+                navigation[prefix + 'marker_lines'].append(line_nr)
+                navigation[prefix + 'marker_flags'].append(flag_id)
+            for line_nr, indicator in entry.indicators.items():
+                # Indicators are None, a tuple (column, length) or a string
+                column, length, text_id = -1, -1, -1
+                if isinstance(indicator, tuple):
+                    column, length = indicator
+                elif indicator is not None:
+                    text_id = navigation.addString(indicator)
+                navigation[prefix + 'indicator_files'].append(file_index)
+                navigation[prefix + 'indicator_lines'].append(line_nr)
+                navigation[prefix + 'indicator_columns'].append(column)
+                navigation[prefix + 'indicator_lengths'].append(length)
+                navigation[prefix + 'indicator_texts'].append(text_id)
+
+    def importFiles(self, navigation, prefix):
+        """Replace the file registry with the files exported to navigation, see exportFiles."""
+
+        self.resetFiles()
+        for path_id, load_path_id in zip(navigation[prefix + 'paths'], navigation[prefix + 'load_paths']):
+            self.registerFile(navigation.getString(path_id), navigation.getString(load_path_id))
+        for file_index, key, line_nr, flag_id in zip(navigation[prefix + 'marker_files'],
+                                                     navigation[prefix + 'marker_keys'],
+                                                     navigation[prefix + 'marker_lines'],
+                                                     navigation[prefix + 'marker_flags']):
+            self.files[file_index].markers[key] = [line_nr, flag_id, -1]
+        for file_index, line_nr, column, length, text_id in zip(navigation[prefix + 'indicator_files'],
+                                                                navigation[prefix + 'indicator_lines'],
+                                                                navigation[prefix + 'indicator_columns'],
+                                                                navigation[prefix + 'indicator_lengths'],
+                                                                navigation[prefix + 'indicator_texts']):
+            if text_id != -1:
+                indicator = navigation.getString(text_id)
+            elif column != -1:
+                indicator = (column, length)
+            else:
+                indicator = None
+            self.files[file_index].indicators[line_nr] = indicator
+
+    def findFile(self, file_path):
+        """Return the file index of file_path, or -1 if it is not registered."""
+
+        return self.file_indices.get(file_path, -1)
+
+    def registerFile(self, file_path, load_path=None):
+        """Register file_path without opening an editor for it.
+
+        Args:
+            file_path: Path identifying the file, also used as tab tooltip.
+            load_path: Path to load the editor content from. Defaults to file_path.
+
+        Returns:
+            The file index of file_path.
+        """
+
+        file_index = self.findFile(file_path)
+        if file_index == -1:
+            file_index = len(self.files)
+            self.files.append(FileEntry(file_path, file_path if load_path is None else load_path))
+            self.file_indices[file_path] = file_index
+        return file_index
+
+    def getFileIndex(self, tab_index):
+        """Return the file index shown in tab_index, or -1 for tabs without a file."""
+
+        return self.tab_files.get(tab_index, -1)
+
+    def openFile(self, file_index, create_tab):
+        """Return the tab index of file_index and create its editor on first use.
+
+        Args:
+            file_index: Index returned by registerFile.
+            create_tab: Callable that gets the FileEntry and returns the index
+                        of a newly created editor tab, or -1 on failure.
+
+        Returns:
+            The tab index if the file is available, -1 otherwise.
+        """
+
+        entry = self.files[file_index]
+        if entry.tab_index == -1 and entry.available:
+            tab_index = create_tab(entry)
+            if tab_index == -1:
+                entry.available = False
+            else:
+                self.attachEditor(file_index, tab_index)
+        return entry.tab_index
+
+    def attachEditor(self, file_index, tab_index):
+        """Apply all recorded markers and indicators to a newly created editor."""
+
+        entry = self.files[file_index]
+        entry.tab_index = tab_index
+        self.tab_files[tab_index] = file_index
+        editor = self.widget(tab_index)
+        for marker in entry.markers.values():
+            marker[2] = editor.markerAdd(marker[0], marker[1])
+        editor.SendScintilla(QsciScintilla.SCI_SETINDICATORCURRENT, 0)
+        for line_nr, indicator in entry.indicators.items():
+            self.fillIndicator(editor, line_nr, indicator)
+        self.syncEditorScaling(editor)
+
+    def setMarker(self, file_index, key, line_nr, flag_id):
+        """Set or replace the margin marker identified by key."""
+
+        entry = self.files[file_index]
+        marker = entry.markers.get(key)
+        handle = -1
+        if entry.tab_index != -1:
+            editor = self.widget(entry.tab_index)
+            if marker is not None:
+                editor.markerDeleteHandle(marker[2])
+            handle = editor.markerAdd(line_nr, flag_id)
+        entry.markers[key] = [line_nr, flag_id, handle]
+
+    def addIndicator(self, file_index, line_nr, indicator=None):
+        entry = self.files[file_index]
+        entry.indicators[line_nr] = indicator
+        if entry.tab_index != -1:
+            editor = self.widget(entry.tab_index)
+            editor.SendScintilla(QsciScintilla.SCI_SETINDICATORCURRENT, 0)
+            self.fillIndicator(editor, line_nr, indicator)
+
+    def fillIndicator(self, editor, line_nr, indicator):
+        raise NotImplementedError()
+
+    # # # # #
+    # ZOOM  #
+    # # # # #
 
     def scaleAllTabs(self, increment = 0):
         self.zoomlevel = int(self.zoomlevel + increment)
@@ -42,19 +213,21 @@ class ZoomTabView(QTabWidget):
         self.syncTabScalingToZoomlevel()
 
     def syncTabScalingToZoomlevel(self):
-        current = self.currentIndex()
-        for i in range(self.count() - 1):
-            editor = self.widget(i)
-            # SCI_SETZOOM doesn't seem to work properly for negative numbers,
-            # so we use SCI_ZOOMIN/SCI_ZOOMOUT.
-            while editor.SendScintilla(QsciScintilla.SCI_GETZOOM) > self.zoomlevel:
-                editor.SendScintilla(QsciScintilla.SCI_ZOOMOUT)
-            while editor.SendScintilla(QsciScintilla.SCI_GETZOOM) < self.zoomlevel:
-                editor.SendScintilla(QsciScintilla.SCI_ZOOMIN)
-            self.recomputeMarkers(editor)
+        clearIconCache()
+        for tab_index in self.tab_files:
+            self.syncEditorScaling(self.widget(tab_index))
+
+    def syncEditorScaling(self, editor):
+        # SCI_SETZOOM doesn't seem to work properly for negative numbers,
+        # so we use SCI_ZOOMIN/SCI_ZOOMOUT.
+        while editor.SendScintilla(QsciScintilla.SCI_GETZOOM) > self.zoomlevel:
+            editor.SendScintilla(QsciScintilla.SCI_ZOOMOUT)
+        while editor.SendScintilla(QsciScintilla.SCI_GETZOOM) < self.zoomlevel:
+            editor.SendScintilla(QsciScintilla.SCI_ZOOMIN)
+        self.recomputeMarkers(editor)
 
     def wheelEvent(self, qwheelevent):
-        if self.currentIndex() == self.count() - 1:
+        if self.getFileIndex(self.currentIndex()) == -1:
             # Don't scroll on No-File tab
             return
         self.zoomlevel = self.currentWidget().SendScintilla(QsciScintilla.SCI_GETZOOM)
@@ -22,9 +22,13 @@ import sys
 import os
 import traceback
 import datetime
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
 from pkg_resources import resource_filename
 from PyQt5.QtCore import Qt, QSize, QRect
-from PyQt5.QtGui import QStandardItem, QPixmap, QColor, QPainter, QBrush, QIcon, QFontDatabase, QFont, QFontMetrics
+from PyQt5.QtGui import QStandardItem, QPixmap, QColor, QPainter, QBrush, QIcon, QFontDatabase, QFont, QFontMetrics, \
+    QGuiApplication
 from PyQt5.QtWidgets import QPushButton, QWidget, QStyle, QLabel
 from datastub.DataFS import DataFS
 from datastub.SymbolInfo import SymbolInfo
@@ -34,8 +38,8 @@ from datastub.leaks import DataLeak, CFLeak, Leak
 datafs = None
 
 info_map = {}  # info_map[ip] -> IpInfo
-asm_map = {}  # asm_map[asm_tab_idx:line_nr] -> global ip
-src_map = {}  # src_map[src_tab_idx:line_nr] -> global ip
+asm_map = {}  # asm_map[asm_file_idx:line_nr] -> global ip
+src_map = {}  # src_map[src_file_idx:line_nr] -> global ip
 
 leak_stack = []
 stack_index = -1
@@ -44,6 +48,14 @@ debug_level = 0
 
 default_font_size = 12
 
+icon_cache = {}  # icon_cache[(flag_id, height, device pixel ratio, default_font_size)] -> QPixmap
+
+SYMBOL_CACHE_SIZE = 1 << 16  # Maximum number of ips in the symbolization cache
+EXPAND_LEAKS = -1  # Expand all paths of the call hierarchy leading to active leaks
+expand_depth = 3  # Levels of the call hierarchy expanded on startup, or EXPAND_LEAKS
+LIST_CHUNK_SIZE = 1000  # Rows of the leak and call lists which are inserted at once
+autosave_interval = 300  # Seconds between autosaves of unsaved changes, 0 disables autosaving
+
 def loadipinfo(pfile):
     unp = MyUnpickler(pfile, encoding='latin1')
     return unp.load()
@@ -112,6 +124,92 @@ def debug(level, fstr, values=()):
         sys.stdout.flush()
 
 
+@contextmanager
+def atomicWrite(path, mode='wb', sync=False):
+    """Open a temporary file, which replaces path once the with block completes.
+
+    Readers of path see either the previous or the complete new content.
+    If the with block fails, the temporary file is removed and path is
+    left unchanged.
+
+    Args:
+        path: The file to write
+        mode: Mode to open the temporary file with
+        sync: Flush the file to disk before replacing path
+    """
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, mode) as f:
+            yield f
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def unpackHeader(header, data, magic, version):
+    """Unpack a file header, whose first fields are a magic and a version.
+
+    Args:
+        header: struct.Struct of the header
+        data: Bytes starting with the header
+
+    Returns:
+        The fields after magic and version, None if data is too short or has another magic or version.
+    """
+    if len(data) < header.size:
+        return None
+    fields = header.unpack_from(data, 0)
+    if fields[0] != magic or fields[1] != version:
+        return None
+    return fields[2:]
+
+
+def packArrays(arrays):
+    """Concatenate the content of arrays in little endian byte order, see unpackArrays."""
+
+    data = []
+    for values in arrays:
+        if sys.byteorder != 'little':
+            values = array(values.typecode, values)
+            values.byteswap()
+        data.append(values.tobytes())
+    return b"".join(data)
+
+
+def unpackArrays(data, offset, typecodes, count):
+    """Counterpart of packArrays for arrays of the same length.
+
+    Args:
+        data: Bytes containing the packed arrays
+        offset: Offset of the first array in data
+        typecodes: Typecode of each array
+        count: Number of entries of each array
+
+    Returns:
+        A tuple (list of arrays, offset after the last array).
+
+    Raises:
+        ValueError: data ends before the last array.
+    """
+    arrays = []
+    for typecode in typecodes:
+        values = array(typecode)
+        end = offset + count * values.itemsize
+        if end > len(data):
+            raise ValueError("Truncated array data")
+        values.frombytes(data[offset:end])
+        if sys.byteorder != 'little':
+            values.byteswap()
+        arrays.append(values)
+        offset = end
+    return arrays, offset
+
+
 class ErrorCode:
     INVALID_PICKLE = -1
     CANNOT_LOAD_PICKLE = -2
@@ -119,6 +217,7 @@ class ErrorCode:
     CANNOT_LOAD_ZIP = -4
     INVALID_COMB_OF_FILES = -5
     ASSERT = -6
+    CANCELED = -7
 
 def createKey(tab_index, line_nr):
     """Return dictionary key: 'tab_index:line_nr'"""
@@ -144,30 +243,29 @@ class CustomType:
 
 
 class IpInfo:
-    """Class to store information about global instruction pointers (ip)."""
+    """Class to store information about global instruction pointers (ip).
 
-    def __init__(self, asm_tab_index, asm_line_nr, asm_marker_handle, src_tab_index, src_line_nr, src_marker_handle,
-                 lib_tree_item):
-        self.asm_tab_index = asm_tab_index
+    The file indices refer to the file registry of the asm/src tab views,
+    not to tab indices. Editor tabs are only created on demand.
+    """
+
+    def __init__(self, asm_file_index, asm_line_nr, src_file_index, src_line_nr, lib_tree_item):
+        self.asm_file_index = asm_file_index
         self.asm_line_nr = asm_line_nr
-        self.asm_marker_handle = asm_marker_handle
-        self.src_tab_index = src_tab_index
+        self.src_file_index = src_file_index
         self.src_line_nr = src_line_nr
-        self.src_marker_handle = src_marker_handle
         self.lib_tree_item = lib_tree_item
-        self.call_tree_items = []
+        self.call_histories = []  # CallHistory nodes in which this ip leaks
         self.meta = LeakMetaInfo()
 
     def __str__(self):
         strings = ["IpInfo:",
-                   "\tasm_tab_index:\t\t{}".format(self.asm_tab_index),
+                   "\tasm_file_index:\t\t{}".format(self.asm_file_index),
                    "\tasm_line_nr:\t\t{}".format(self.asm_line_nr),
-                   "\tasm_marker_handle:\t{}".format(self.asm_marker_handle),
-                   "\tsrc_tab_index:\t\t{}".format(self.src_tab_index),
+                   "\tsrc_file_index:\t\t{}".format(self.src_file_index),
                    "\tsrc_line_nr:\t\t{}".format(self.src_line_nr),
-                   "\tsrc_marker_handle:\t{}".format(self.src_marker_handle),
                    "\tlib_tree_item:\t\t{}".format(self.lib_tree_item),
-                   "\tcall_tree_items:\t{}".format(self.call_tree_items),
+                   "\tcall_histories:\t{}".format(self.call_histories),
                    "\tmeta:\t{}".format(self.meta)]
 
         return "\n".join(strings)
@@ -178,22 +276,97 @@ def setupSymbolInfo(file_path):
     datafs = DataFS(file_path, write=False)
     with datafs.get_file("allsyms.txt") as f:
         SymbolInfo.open(f)
+    symbol_cache.clear()
 
 
 def resetSymbolInfo():
     SymbolInfo.close()
+    symbol_cache.clear()
+
+
+class SymbolCache:
+    """Bounded LRU cache of symbolized ips.
+
+    Each entry holds the local ip and the context name of an ip, both
+    derived from a single SymbolInfo.lookup. The cache belongs to one
+    SymbolInfo instance and is cleared as soon as another instance is
+    opened, e.g., when the loader replaces the symbols of a session.
+    """
+
+    def __init__(self, max_size=SYMBOL_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()  # entries[ip] -> (local_ip, ctx_name)
+        self.owner = None  # SymbolInfo.instance the entries were computed with
+
+    def clear(self):
+        self.entries.clear()
+        self.owner = None
+
+    def checkOwner(self):
+        if self.owner is not SymbolInfo.instance:
+            self.entries.clear()
+            self.owner = SymbolInfo.instance
+
+    def get(self, ip):
+        self.checkOwner()
+        entry = self.entries.get(ip)
+        if entry is not None:
+            self.entries.move_to_end(ip)
+            return entry
+        entry = symbolize(ip)
+        self.insert(ip, entry)
+        return entry
+
+    def getAll(self, ips):
+        """Batch version of get, each distinct ip is resolved at most once."""
+
+        self.checkOwner()
+        resolved = {}
+        for ip in sorted(set(ips)):
+            entry = self.entries.get(ip)
+            if entry is None:
+                entry = symbolize(ip)
+                self.insert(ip, entry)
+            else:
+                self.entries.move_to_end(ip)
+            resolved[ip] = entry
+        return [resolved[ip] for ip in ips]
+
+    def insert(self, ip, entry):
+        self.entries[ip] = entry
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+
+symbol_cache = SymbolCache()
+
+
+def symbolize(ip):
+    """Uncached symbolization of ip.
+
+    Returns:
+        A tuple (local_ip, ctx_name), see getLocalIp and getCtxName.
+    """
+
+    if not SymbolInfo.isopen():
+        return ip, hex(ip)
+    sym = SymbolInfo.lookup(ip)  # Type: SymbolInfo
+    if sym is None:
+        return ip, hex(ip)
+
+    local_ip = ip
+    name = ""
+    if sym.img is not None and sym.img.dynamic:
+        local_ip = ip - sym.img.lower
+        name += "(+%x)" % local_ip
+    name += " %s(%s)" % (sym.getname(), sym.type)
+    return local_ip, name
 
 
 def getLocalIp(ip):
     """Find local ip using SymbolInfo."""
 
-    if SymbolInfo.isopen():
-        sym = SymbolInfo.lookup(ip)  # Type: SymbolInfo
-
-        if sym is not None:
-            if sym.img.dynamic:
-                return ip - sym.img.lower
-    return ip
+    return symbol_cache.get(ip)[0]
 
 def leakToStr(leak):
     if isinstance(leak, DataLeak):
@@ -220,20 +393,17 @@ def getCtxName(ip):
         A string containing the context name, or the hex presentation
         of the ip of no SymbolInfo is available.
     """
-    if SymbolInfo.isopen():
-        sym = SymbolInfo.lookup(ip)  # Type: SymbolInfo
 
-        if sym is not None:
-            name = ""
-            if sym.img is not None and sym.img.dynamic:
-                name += "(+%x)" % (ip - sym.img.lower)
+    return symbol_cache.get(ip)[1]
 
-            name += " %s(%s)" % (sym.getname(), sym.type)
-            return name
-        else:
-            return hex(ip)
-    else:
-        return hex(ip)
+def getCtxNames(ips):
+    """Batch version of getCtxName.
+
+    Returns:
+        A list with the context name of each ip in ips.
+    """
+
+    return [ctx_name for _, ctx_name in symbol_cache.getAll(ips)]
 
 
 class LeakFlags:
@@ -248,9 +418,51 @@ class LeakFlags:
     LEFT_ARROW = 5
 
 class LeakMetaInfo:
+    """Flag and comment of a leak.
+
+    Once added to an AnnotationStore, flag and comment are stored in the
+    columns of the store. Pickles only contain flag and comment, as before.
+    """
+
     def __init__(self):
-        self.flag = LeakFlags.INVESTIGATE
-        self.comment = ""
+        self.store = None  # AnnotationStore holding flag and comment, see AnnotationStore.addMeta
+        self.slot = -1
+        self.local_flag = LeakFlags.INVESTIGATE
+        self.local_comment = ""
+
+    @property
+    def flag(self):
+        if self.store is None:
+            return self.local_flag
+        return self.store.getFlag(self.slot)
+
+    @flag.setter
+    def flag(self, flag):
+        if self.store is None:
+            self.local_flag = flag
+        else:
+            self.store.setFlag(self.slot, flag)
+
+    @property
+    def comment(self):
+        if self.store is None:
+            return self.local_comment
+        return self.store.getComment(self.slot)
+
+    @comment.setter
+    def comment(self, comment):
+        if self.store is None:
+            self.local_comment = comment
+        else:
+            self.store.setComment(self.slot, comment)
+
+    def __getstate__(self):
+        return {'flag': self.flag, 'comment': self.comment}
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.local_flag = state.get('flag', LeakFlags.INVESTIGATE)
+        self.local_comment = state.get('comment', "")
 
     def __str__(self):
         string = "Flag: " + str(self.flag) + ", "
@@ -299,8 +511,18 @@ def getIconColorById(flag_id):
     return colors[flag_id]
 
 def getIconById(flag_id, height = None):
-    if not height:
-        height = getDefaultIconSize().height()
+    """Return the flag icon as QPixmap of the given height.
+
+    Icons are rendered once and shared via icon_cache, see clearIconCache.
+    """
+    # Icons of the default height are stored with height None, which saves measuring the default font
+    key = (flag_id, height or None, QGuiApplication.instance().devicePixelRatio(), default_font_size)
+    pix = icon_cache.get(key)
+    if pix is None:
+        pix = icon_cache[key] = renderIcon(flag_id, height or getDefaultIconSize().height())
+    return pix
+
+def renderIcon(flag_id, height):
     unscaled_size = getDefaultIconSize()
     pix = QPixmap(QSize(height, height))
     pix.fill(QColor("transparent"))
@@ -314,6 +536,10 @@ def getIconById(flag_id, height = None):
     painter.end()
     return pix
 
+def clearIconCache():
+    """Drop all rendered icons, e.g. after the font size or the zoom level changed."""
+    icon_cache.clear()
+
 def getLogoIcon():
     icon = QIcon()
     icon.addFile(getResourcePath('icons', 'window_icon.png'))